@@ -50,6 +50,12 @@ export function getConfig(): SystemConfig {
           name: "sentence-transformers/all-MiniLM-L6-v2",
           dimensions: 384,
         },
+        // in-process, export the model with lib/shared/onnx-models/export.py
+        {
+          provider: "onnx",
+          name: "sentence-transformers/all-MiniLM-L6-v2",
+          dimensions: 384,
+        },
         {
           provider: "bedrock",
           name: "amazon.titan-embed-text-v1",
@@ -112,6 +112,15 @@ const embeddingModels = [
   },
 ];
 
+// run in-process, the models are exported with lib/shared/onnx-models/export.py
+const onnxEmbeddingModels = [
+  {
+    provider: "onnx",
+    name: "sentence-transformers/all-MiniLM-L6-v2",
+    dimensions: 384,
+  },
+];
+
 /**
  * Main entry point
  */
@@ -165,6 +174,9 @@ const embeddingModels = [
         options.ragsToEnable.pop("kendra");
       }
       options.embeddings = config.rag.embeddingsModels.map((m: any) => m.name);
+      options.onnxEmbeddings = (config.rag.embeddingsModels ?? []).some(
+        (m: any) => m.provider === "onnx"
+      );
       options.defaultEmbedding = (config.rag.embeddingsModels ?? []).filter(
         (m: any) => m.default
       )[0].name;
@@ -568,6 +580,20 @@ async function processCreateOptions(options: any): Promise<void> {
       },
       initial: options.ragsToEnable || [],
     },
+    {
+      type: "confirm",
+      name: "onnxEmbeddings",
+      message:
+        "Do you want to run embeddings models in-process with ONNX (export them with lib/shared/onnx-models/export.py)",
+      initial: options.onnxEmbeddings || false,
+      skip(): boolean {
+        const ragsToEnable = (this as any).state.answers.ragsToEnable ?? [];
+        return (
+          !(this as any).state.answers.enableRag ||
+          !(ragsToEnable.includes("aurora") || ragsToEnable.includes("opensearch"))
+        );
+      },
+    },
     {
       type: "confirm",
       name: "kendraEnterprise",
@@ -770,7 +796,10 @@ async function processCreateOptions(options: any): Promise<void> {
     name: "cross-encoder/ms-marco-MiniLM-L-12-v2",
     default: true,
   };
-  config.rag.embeddingsModels = embeddingModels;
+  config.rag.embeddingsModels = [
+    ...embeddingModels,
+    ...(answers.onnxEmbeddings ? onnxEmbeddingModels : []),
+  ];
   config.rag.embeddingsModels.forEach((m: any) => {
     if (m.name === models.defaultEmbedding) {
       m.default = true;
@@ -306,6 +306,7 @@ def _convert_document(document: dict):
         "path": document["path"],
         "sizeInBytes": document.get("size_in_bytes", None),
         "vectors": document.get("vectors", None),
+        "suppressedChunks": document.get("suppressed_chunks", None),
         "subDocuments": document.get("sub_documents", None),
         "errors": document.get("errors", None),
         "createdAt": document["created_at"],
@@ -43,6 +43,6 @@ def embeddings(input: dict):
     )
 
     return [
-        {"vector": v, "passage": request.passages[idx]}
+        {"vector": v.tolist(), "passage": request.passages[idx]}
         for idx, v in enumerate(ret_value)
     ]
\ No newline at end of file
@@ -1,5 +1,6 @@
 import genai_core.semantic_search
 from pydantic import BaseModel
+from typing import Optional
 from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.event_handler.appsync import Router
 
@@ -8,9 +9,24 @@ router = Router()
 logger = Logger()
 
 
+class SemanticSearchFilter(BaseModel):
+    documentId: Optional[list[str]] = None
+    documentType: Optional[list[str]] = None
+    documentSubType: Optional[list[str]] = None
+    pathPrefix: Optional[str] = None
+    rssFeedId: Optional[list[str]] = None
+    createdAfter: Optional[str] = None
+    createdBefore: Optional[str] = None
+
+
 class SemanticSearchRequest(BaseModel):
     workspaceId: str
     query: str
+    efSearch: Optional[int] = None
+    probes: Optional[int] = None
+    filters: Optional[SemanticSearchFilter] = None
+    retrievalMode: Optional[str] = None
+    retrievalDocuments: Optional[int] = None
 
 
 @router.resolver(field_name="performSemanticSearch")
@@ -27,12 +43,34 @@ def semantic_search(input: dict):
         query=request.query,
         limit=25,
         full_response=True,
+        ef_search=request.efSearch,
+        probes=request.probes,
+        filters=_get_filters(request.filters),
+        retrieval_mode=request.retrievalMode,
+        retrieval_documents=request.retrievalDocuments,
     )
     result = _convert_semantic_search_result(request.workspaceId, result)
 
     return result
 
 
+def _get_filters(request: Optional[SemanticSearchFilter]):
+    if request is None:
+        return None
+
+    filters = {
+        "document_id": request.documentId,
+        "document_type": request.documentType,
+        "document_sub_type": request.documentSubType,
+        "path_prefix": request.pathPrefix,
+        "rss_feed_id": request.rssFeedId,
+        "created_after": request.createdAfter,
+        "created_before": request.createdBefore,
+    }
+
+    return {key: value for key, value in filters.items() if value is not None}
+
+
 def _convert_semantic_search_result(workspace_id: str, result: dict):
     vector_search_items = result.get("vector_search_items")
     keyword_search_items = result.get("keyword_search_items")
@@ -57,6 +95,7 @@ def _convert_semantic_search_result(workspace_id: str, result: dict):
         "detectedLanguages": result.get("detected_languages"),
         "items": items,
         "vectorSearchMetric": result.get("vector_search_metric"),
+        "retrievalMode": result.get("retrieval_mode"),
         "vectorSearchItems": vector_search_items,
         "keywordSearchItems": keyword_search_items,
     }
@@ -80,6 +119,7 @@ def _convert_semantic_search_item(item: dict):
         "contentComplement": item["content_complement"],
         "vectorSearchScore": item.get("vector_search_score", 0),
         "keywordSearchScore": item.get("keyword_search_score"),
+        "fusionScore": item.get("fusion_score"),
         "score": item["score"],
     }
 
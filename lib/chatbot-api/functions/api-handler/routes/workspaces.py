@@ -4,6 +4,7 @@ import genai_core.kendra
 import genai_core.parameters
 import genai_core.workspaces
 from pydantic import BaseModel
+from typing import Optional
 from aws_lambda_powertools import Logger, Tracer
 from aws_lambda_powertools.event_handler.appsync import Router
 
@@ -33,6 +34,20 @@ class CreateWorkspaceAuroraRequest(BaseModel):
     chunkSize: int
     chunkOverlap: int
     createdBy: str
+    vectorStorage: Optional[str] = "full"
+    vectorDimensions: Optional[int] = None
+    deduplication: Optional[bool] = False
+    indexType: Optional[str] = "ivfflat"
+    indexLists: Optional[int] = None
+    indexProbes: Optional[int] = None
+    indexM: Optional[int] = None
+    indexEfConstruction: Optional[int] = None
+    indexEfSearch: Optional[int] = None
+    hybridFusion: Optional[str] = "rrf"
+    hybridFusionWeight: Optional[float] = 0.5
+    tableLayout: Optional[str] = "table"
+    retrievalMode: Optional[str] = "chunks"
+    retrievalDocuments: Optional[int] = None
 
 
 class CreateWorkspaceOpenSearchRequest(BaseModel):
@@ -48,6 +63,21 @@ class CreateWorkspaceOpenSearchRequest(BaseModel):
     chunkSize: int
     chunkOverlap: int
     createdBy: str
+    vectorStorage: Optional[str] = "full"
+    vectorDimensions: Optional[int] = None
+    deduplication: Optional[bool] = False
+    retrievalMode: Optional[str] = "chunks"
+    retrievalDocuments: Optional[int] = None
+
+
+class UpdateWorkspaceIndexRequest(BaseModel):
+    workspaceId: str
+    indexType: Optional[str] = None
+    indexLists: Optional[int] = None
+    indexProbes: Optional[int] = None
+    indexM: Optional[int] = None
+    indexEfConstruction: Optional[int] = None
+    indexEfSearch: Optional[int] = None
 
 
 class CreateWorkspaceKendraRequest(BaseModel):
@@ -98,6 +128,23 @@ def create_aurora_workspace(input: dict):
     return ret_value
 
 
+@router.resolver(field_name="updateWorkspaceIndex")
+@tracer.capture_method
+def update_workspace_index(input: dict):
+    request = UpdateWorkspaceIndexRequest(**input)
+    workspace = genai_core.workspaces.update_workspace_index(
+        request.workspaceId,
+        index_type=request.indexType,
+        index_lists=request.indexLists,
+        index_probes=request.indexProbes,
+        index_m=request.indexM,
+        index_ef_construction=request.indexEfConstruction,
+        index_ef_search=request.indexEfSearch,
+    )
+
+    return _convert_workspace(workspace)
+
+
 @router.resolver(field_name="createOpenSearchWorkspace")
 @tracer.capture_method
 def create_open_search_workspace(input: dict):
@@ -164,7 +211,9 @@ def _create_workspace_aurora(request: CreateWorkspaceAuroraRequest, config: dict
     if request.metric not in ["inner", "cosine", "l2"]:
         raise genai_core.types.CommonError("Invalid metric")
 
-    if request.chunkingStrategy not in ["recursive"]:
+    if request.chunkingStrategy not in [
+        value.value for value in genai_core.types.ChunkingStrategy
+    ]:
         raise genai_core.types.CommonError("Invalid chunking strategy")
 
     if request.chunkSize < 100 or request.chunkSize > 10000:
@@ -189,10 +238,46 @@ def _create_workspace_aurora(request: CreateWorkspaceAuroraRequest, config: dict
             chunk_size=request.chunkSize,
             chunk_overlap=request.chunkOverlap,
             created_by=request.createdBy,
+            vector_storage=request.vectorStorage or "full",
+            vector_dimensions=request.vectorDimensions,
+            deduplication=bool(request.deduplication),
+            hybrid_fusion=request.hybridFusion or "rrf",
+            hybrid_fusion_weight=(
+                0.5
+                if request.hybridFusionWeight is None
+                else request.hybridFusionWeight
+            ),
+            table_layout=request.tableLayout or "table",
+            **_get_index_options(request),
+            **_get_retrieval_options(request),
         )
     )
 
 
+def _get_index_options(request: CreateWorkspaceAuroraRequest):
+    # unset options keep the defaults of create_workspace_aurora
+    index_options = {
+        "index_type": request.indexType or "ivfflat",
+        "index_lists": request.indexLists,
+        "index_probes": request.indexProbes,
+        "index_m": request.indexM,
+        "index_ef_construction": request.indexEfConstruction,
+        "index_ef_search": request.indexEfSearch,
+    }
+
+    return {key: value for key, value in index_options.items() if value is not None}
+
+
+def _get_retrieval_options(request):
+    # unset options keep the defaults of the create functions
+    retrieval_options = {
+        "retrieval_mode": request.retrievalMode or "chunks",
+        "retrieval_documents": request.retrievalDocuments,
+    }
+
+    return {key: value for key, value in retrieval_options.items() if value is not None}
+
+
 def _create_workspace_open_search(
     request: CreateWorkspaceOpenSearchRequest, config: dict
 ):
@@ -238,7 +323,9 @@ def _create_workspace_open_search(
     if len(request.languages) == 0 or len(request.languages) > 3:
         raise genai_core.types.CommonError("Invalid languages")
 
-    if request.chunkingStrategy not in ["recursive"]:
+    if request.chunkingStrategy not in [
+        value.value for value in genai_core.types.ChunkingStrategy
+    ]:
         raise genai_core.types.CommonError("Invalid chunking strategy")
 
     if request.chunkSize < 100 or request.chunkSize > 10000:
@@ -261,6 +348,10 @@ def _create_workspace_open_search(
             chunk_size=request.chunkSize,
             chunk_overlap=request.chunkOverlap,
             created_by=request.createdBy,
+            vector_storage=request.vectorStorage or "full",
+            vector_dimensions=request.vectorDimensions,
+            deduplication=bool(request.deduplication),
+            **_get_retrieval_options(request),
         )
     )
 
@@ -315,9 +406,24 @@ def _convert_workspace(workspace: dict):
         "metric": workspace.get("metric"),
         "index": workspace.get("has_index"),
         "hybridSearch": workspace.get("hybrid_search"),
+        "hybridFusion": workspace.get("hybrid_fusion"),
+        "hybridFusionWeight": workspace.get("hybrid_fusion_weight"),
+        "tableLayout": workspace.get("table_layout"),
+        "retrievalMode": workspace.get("retrieval_mode"),
+        "retrievalDocuments": workspace.get("retrieval_documents"),
         "chunkingStrategy": workspace.get("chunking_strategy"),
         "chunkSize": workspace.get("chunk_size"),
         "chunkOverlap": workspace.get("chunk_overlap"),
+        "vectorStorage": workspace.get("vector_storage"),
+        "vectorDimensions": workspace.get("vector_dimensions"),
+        "deduplication": workspace.get("deduplication", False),
+        "indexType": workspace.get("index_type"),
+        "indexLists": workspace.get("index_lists"),
+        "indexProbes": workspace.get("index_probes"),
+        "indexM": workspace.get("index_m"),
+        "indexEfConstruction": workspace.get("index_ef_construction"),
+        "indexEfSearch": workspace.get("index_ef_search"),
+        "indexStatus": workspace.get("index_status"),
         "vectors": workspace.get("vectors", 0),
         "documents": workspace.get("documents", 0),
         "aossEngine": workspace.get("aoss_engine"),
@@ -68,8 +68,13 @@ export class ApiResolvers extends Construct {
           UPLOAD_BUCKET_NAME: props.ragEngines?.uploadBucket?.bucketName ?? "",
           PROCESSING_BUCKET_NAME:
             props.ragEngines?.processingBucket?.bucketName ?? "",
+          ONNX_MODELS_BUCKET_NAME:
+            props.ragEngines?.processingBucket?.bucketName ?? "",
           AURORA_DB_SECRET_ID: props.ragEngines?.auroraPgVector?.database
             ?.secret?.secretArn as string,
+          AURORA_READER_ENDPOINT:
+            props.ragEngines?.auroraPgVector?.database?.clusterReadEndpoint
+              .hostname ?? "",
           WORKSPACES_TABLE_NAME:
             props.ragEngines?.workspacesTable.tableName ?? "",
           WORKSPACES_BY_OBJECT_TYPE_INDEX_NAME:
@@ -88,6 +93,9 @@ export class ApiResolvers extends Construct {
           CREATE_AURORA_WORKSPACE_WORKFLOW_ARN:
             props.ragEngines?.auroraPgVector?.createAuroraWorkspaceWorkflow
               ?.stateMachineArn ?? "",
+          AURORA_INDEX_MAINTENANCE_FUNCTION:
+            props.ragEngines?.auroraPgVector?.indexMaintenanceFunction
+              ?.functionArn ?? "",
           CREATE_OPEN_SEARCH_WORKSPACE_WORKFLOW_ARN:
             props.ragEngines?.openSearchVector
               ?.createOpenSearchWorkspaceWorkflow?.stateMachineArn ?? "",
@@ -137,6 +145,9 @@ export class ApiResolvers extends Construct {
         props.ragEngines.auroraPgVector.createAuroraWorkspaceWorkflow.grantStartExecution(
           apiHandler
         );
+        props.ragEngines.auroraPgVector.indexMaintenanceFunction.grantInvoke(
+          apiHandler
+        );
       }
 
       if (props.ragEngines?.openSearchVector) {
@@ -56,12 +56,17 @@ export class LangChainInterface extends Construct {
           props.ragEngines?.workspacesByObjectTypeIndexName ?? "",
         AURORA_DB_SECRET_ID: props.ragEngines?.auroraPgVector?.database?.secret
           ?.secretArn as string,
+        AURORA_READER_ENDPOINT:
+          props.ragEngines?.auroraPgVector?.database?.clusterReadEndpoint
+            .hostname ?? "",
         SAGEMAKER_RAG_MODELS_ENDPOINT:
           props.ragEngines?.sageMakerRagModels?.model.endpoint
             ?.attrEndpointName ?? "",
         OPEN_SEARCH_COLLECTION_ENDPOINT:
           props.ragEngines?.openSearchVector?.openSearchCollectionEndpoint ??
           "",
+        ONNX_MODELS_BUCKET_NAME:
+          props.ragEngines?.processingBucket?.bucketName ?? "",
         DEFAULT_KENDRA_INDEX_ID:
           props.ragEngines?.kendraRetrieval?.kendraIndex?.attrId ?? "",
         DEFAULT_KENDRA_INDEX_NAME:
@@ -124,6 +129,11 @@ export class LangChainInterface extends Construct {
     if (props.ragEngines) {
       props.ragEngines.workspacesTable.grantReadWriteData(requestHandler);
       props.ragEngines.documentsTable.grantReadWriteData(requestHandler);
+      // the ONNX embeddings models are downloaded on first use
+      props.ragEngines.processingBucket.grantRead(
+        requestHandler,
+        "onnx-models/*"
+      );
     }
 
     if (props.ragEngines?.sageMakerRagModels) {
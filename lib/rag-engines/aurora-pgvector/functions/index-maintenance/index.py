@@ -0,0 +1,68 @@
+import genai_core.workspaces
+import genai_core.aurora.maintenance
+from datetime import datetime
+from botocore.exceptions import ClientError
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.utilities.typing import LambdaContext
+
+logger = Logger()
+
+# an index rebuild is not started with less time left
+MIN_REMAINING_TIME_IN_MILLIS = 5 * 60 * 1000
+
+
+@logger.inject_lambda_context(log_event=True)
+def lambda_handler(event, context: LambdaContext):
+    workspaces = genai_core.workspaces.list_engine_workspaces("aurora")
+    if event.get("workspace_id"):
+        # invoked by an index update of the API
+        workspaces = [
+            item for item in workspaces if item["workspace_id"] == event["workspace_id"]
+        ]
+
+    # index updates, then the workspaces not reached by the previous runs
+    workspaces.sort(
+        key=lambda item: (
+            item.get("index_status") != "updating",
+            item.get("maintenance_checked_at", ""),
+        )
+    )
+
+    maintained = 0
+    for workspace in workspaces:
+        if context.get_remaining_time_in_millis() < MIN_REMAINING_TIME_IN_MILLIS:
+            logger.info("Stopping, the next run continues with the rest")
+            break
+
+        workspace_id = workspace["workspace_id"]
+        if workspace["status"] != "ready":
+            continue
+
+        try:
+            values = genai_core.aurora.maintenance.maintain_workspace(workspace)
+            if values is None:
+                continue
+            values["maintenance_error"] = None
+        except Exception as error:
+            # one failing workspace does not block the others
+            logger.exception(f"Maintenance of workspace {workspace_id} failed")
+            timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+            values = {
+                "maintenance_checked_at": timestamp,
+                "maintenance_error": str(error),
+            }
+            if workspace.get("index_status") == "updating":
+                # the options stay the current ones, the update can be retried
+                values["index_status"] = "error"
+                values["index_update"] = None
+
+        try:
+            genai_core.workspaces.set_maintenance(workspace_id, values)
+        except ClientError as error:
+            if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+        logger.info(f"Maintained workspace {workspace_id}", extra=values)
+        maintained += 1
+
+    return {"ok": True, "maintained": maintained}
@@ -0,0 +1,55 @@
+import genai_core.workspaces
+import genai_core.aurora.layout
+import genai_core.aurora.partitions
+from aws_lambda_powertools import Logger
+from aws_lambda_powertools.utilities.typing import LambdaContext
+
+logger = Logger()
+
+# a large table is not copied with less time left
+MIN_REMAINING_TIME_IN_MILLIS = 5 * 60 * 1000
+
+
+@logger.inject_lambda_context(log_event=True)
+def lambda_handler(event, context: LambdaContext):
+    """Moves the workspaces with a table of their own to the shared tables,
+    the ones in workspace_ids or all of them. Invoked by hand, runs return
+    the workspaces left for the next one."""
+    workspace_ids = event.get("workspace_ids")
+    if workspace_ids:
+        workspaces = [
+            genai_core.workspaces.get_workspace(workspace_id)
+            for workspace_id in workspace_ids
+        ]
+    else:
+        workspaces = genai_core.workspaces.list_engine_workspaces("aurora")
+
+    workspaces = [
+        workspace
+        for workspace in workspaces
+        if workspace
+        and workspace["engine"] == "aurora"
+        and workspace["status"] == "ready"
+        and not genai_core.aurora.layout.is_partitioned(workspace)
+    ]
+
+    migrated = []
+    for workspace in workspaces:
+        if context.get_remaining_time_in_millis() < MIN_REMAINING_TIME_IN_MILLIS:
+            logger.info("Stopping, the next run continues with the rest")
+            break
+
+        workspace_id = workspace["workspace_id"]
+        values = genai_core.aurora.partitions.migrate_workspace_table(workspace)
+        genai_core.workspaces.set_maintenance(workspace_id, values)
+
+        logger.info(f"Migrated workspace {workspace_id}", extra=values)
+        migrated.append(workspace_id)
+
+    remaining = [
+        workspace["workspace_id"]
+        for workspace in workspaces
+        if workspace["workspace_id"] not in migrated
+    ]
+
+    return {"ok": True, "migrated": migrated, "remaining": remaining}
@@ -35,8 +35,13 @@ def lambda_handler(event, context: LambdaContext):
         cur = dbconn.cursor()
 
         cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+        # an engine upgrade ships a newer pgvector, installed ones keep theirs
+        cur.execute("ALTER EXTENSION vector UPDATE;")
         register_vector(dbconn)
 
+        cur.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector';")
+        logger.info(f"pgvector version: {cur.fetchone()[0]}")
+
         cur.execute("SELECT typname FROM pg_type WHERE typname = 'vector';")
         rows = cur.fetchall()
 
@@ -0,0 +1,109 @@
+import * as path from "path";
+import * as cdk from "aws-cdk-lib";
+import { Construct } from "constructs";
+import { SystemConfig } from "../../shared/types";
+import { Shared } from "../../shared";
+import { RagDynamoDBTables } from "../rag-dynamodb-tables";
+import * as events from "aws-cdk-lib/aws-events";
+import * as targets from "aws-cdk-lib/aws-events-targets";
+import * as lambda from "aws-cdk-lib/aws-lambda";
+import * as logs from "aws-cdk-lib/aws-logs";
+import * as rds from "aws-cdk-lib/aws-rds";
+
+export interface AuroraIndexMaintenanceProps {
+  readonly config: SystemConfig;
+  readonly shared: Shared;
+  readonly ragDynamoDBTables: RagDynamoDBTables;
+  readonly dbCluster: rds.DatabaseCluster;
+}
+
+export class AuroraIndexMaintenance extends Construct {
+  public readonly maintenanceFunction: lambda.Function;
+  public readonly migrationFunction: lambda.Function;
+
+  constructor(
+    scope: Construct,
+    id: string,
+    props: AuroraIndexMaintenanceProps
+  ) {
+    super(scope, id);
+
+    const maintenanceFunction = new lambda.Function(
+      this,
+      "IndexMaintenanceFunction",
+      {
+        vpc: props.shared.vpc,
+        description:
+          "Vacuums Aurora workspace tables and rebuilds IVFFlat indexes that no longer fit the table size",
+        code: props.shared.sharedCode.bundleWithLambdaAsset(
+          path.join(__dirname, "./functions/index-maintenance")
+        ),
+        runtime: props.shared.pythonRuntime,
+        architecture: props.shared.lambdaArchitecture,
+        handler: "index.lambda_handler",
+        layers: [props.shared.powerToolsLayer, props.shared.commonLayer],
+        timeout: cdk.Duration.minutes(15),
+        // runs never overlap, a rebuild can take the whole run
+        reservedConcurrentExecutions: 1,
+        logRetention: logs.RetentionDays.ONE_WEEK,
+        environment: {
+          ...props.shared.defaultEnvironmentVariables,
+          AURORA_DB_SECRET_ID: props.dbCluster.secret?.secretArn as string,
+          WORKSPACES_TABLE_NAME:
+            props.ragDynamoDBTables.workspacesTable.tableName,
+          WORKSPACES_BY_OBJECT_TYPE_INDEX_NAME:
+            props.ragDynamoDBTables.workspacesByObjectTypeIndexName,
+        },
+      }
+    );
+
+    props.dbCluster.secret?.grantRead(maintenanceFunction);
+    props.dbCluster.connections.allowDefaultPortFrom(maintenanceFunction);
+    props.ragDynamoDBTables.workspacesTable.grantReadWriteData(
+      maintenanceFunction
+    );
+
+    new events.Rule(this, "IndexMaintenanceSchedule", {
+      schedule: events.Schedule.rate(cdk.Duration.hours(1)),
+      targets: [new targets.LambdaFunction(maintenanceFunction)],
+    });
+
+    // invoked by hand with an optional list of workspace_ids
+    const migrationFunction = new lambda.Function(
+      this,
+      "MigrateWorkspacesFunction",
+      {
+        vpc: props.shared.vpc,
+        description:
+          "Moves Aurora workspaces with a table of their own to the shared partitioned chunk tables",
+        code: props.shared.sharedCode.bundleWithLambdaAsset(
+          path.join(__dirname, "./functions/migrate-workspaces")
+        ),
+        runtime: props.shared.pythonRuntime,
+        architecture: props.shared.lambdaArchitecture,
+        handler: "index.lambda_handler",
+        layers: [props.shared.powerToolsLayer, props.shared.commonLayer],
+        timeout: cdk.Duration.minutes(15),
+        reservedConcurrentExecutions: 1,
+        logRetention: logs.RetentionDays.ONE_WEEK,
+        environment: {
+          ...props.shared.defaultEnvironmentVariables,
+          AURORA_DB_SECRET_ID: props.dbCluster.secret?.secretArn as string,
+          WORKSPACES_TABLE_NAME:
+            props.ragDynamoDBTables.workspacesTable.tableName,
+          WORKSPACES_BY_OBJECT_TYPE_INDEX_NAME:
+            props.ragDynamoDBTables.workspacesByObjectTypeIndexName,
+        },
+      }
+    );
+
+    props.dbCluster.secret?.grantRead(migrationFunction);
+    props.dbCluster.connections.allowDefaultPortFrom(migrationFunction);
+    props.ragDynamoDBTables.workspacesTable.grantReadWriteData(
+      migrationFunction
+    );
+
+    this.maintenanceFunction = maintenanceFunction;
+    this.migrationFunction = migrationFunction;
+  }
+}
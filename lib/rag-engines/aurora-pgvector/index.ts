@@ -4,6 +4,7 @@ import { Construct } from "constructs";
 import { SystemConfig } from "../../shared/types";
 import { Shared } from "../../shared";
 import { CreateAuroraWorkspace } from "./create-aurora-workspace";
+import { AuroraIndexMaintenance } from "./index-maintenance";
 import { RagDynamoDBTables } from "../rag-dynamodb-tables";
 import * as ec2 from "aws-cdk-lib/aws-ec2";
 import * as lambda from "aws-cdk-lib/aws-lambda";
@@ -22,16 +23,27 @@ export interface AuroraPgVectorProps {
 export class AuroraPgVector extends Construct {
   readonly database: rds.DatabaseCluster;
   public readonly createAuroraWorkspaceWorkflow: sfn.StateMachine;
+  public readonly indexMaintenanceFunction: lambda.Function;
 
   constructor(scope: Construct, id: string, props: AuroraPgVectorProps) {
     super(scope, id);
 
+    // pgvector 0.7.0, hnsw indexes, halfvec and binary_quantize
+    const engineVersion = rds.AuroraPostgresEngineVersion.VER_15_7;
     const dbCluster = new rds.DatabaseCluster(this, "AuroraDatabase", {
       engine: rds.DatabaseClusterEngine.auroraPostgres({
-        version: rds.AuroraPostgresEngineVersion.VER_15_3,
+        version: engineVersion,
       }),
       removalPolicy: cdk.RemovalPolicy.DESTROY,
       writer: rds.ClusterInstance.serverlessV2("ServerlessInstance"),
+      readers: Array.from(
+        { length: props.config.rag.engines.aurora.readers ?? 0 },
+        (_, idx) =>
+          rds.ClusterInstance.serverlessV2(`ServerlessReader${idx + 1}`, {
+            // searches do not wait for the writer load to scale the readers
+            scaleWithWriter: false,
+          })
+      ),
       vpc: props.shared.vpc,
       vpcSubnets: { subnetType: ec2.SubnetType.PRIVATE_ISOLATED },
       iamAuthentication: true,
@@ -77,6 +89,8 @@ export class AuroraPgVector extends Construct {
         serviceToken: databaseSetupProvider.serviceToken,
         properties: {
           AURORA_DB_SECRET_ID: dbCluster.secret?.secretArn as string,
+          // updates the extension after an engine upgrade
+          ENGINE_VERSION: engineVersion.auroraPostgresFullVersion,
         },
       }
     );
@@ -94,8 +108,20 @@ export class AuroraPgVector extends Construct {
       }
     );
 
+    const indexMaintenance = new AuroraIndexMaintenance(
+      this,
+      "AuroraIndexMaintenance",
+      {
+        config: props.config,
+        shared: props.shared,
+        dbCluster: dbCluster,
+        ragDynamoDBTables: props.ragDynamoDBTables,
+      }
+    );
+
     this.database = dbCluster;
     this.createAuroraWorkspaceWorkflow = createWorkflow.stateMachine;
+    this.indexMaintenanceFunction = indexMaintenance.maintenanceFunction;
 
     /**
      * CDK NAG suppression
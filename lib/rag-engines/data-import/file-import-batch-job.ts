@@ -85,6 +85,7 @@ export class FileImportBatchJob extends Construct {
           AURORA_DB_SECRET_ID: props.auroraDatabase?.secret
             ?.secretArn as string,
           PROCESSING_BUCKET_NAME: props.processingBucket.bucketName,
+          ONNX_MODELS_BUCKET_NAME: props.processingBucket.bucketName,
           WORKSPACES_TABLE_NAME:
             props.ragDynamoDBTables.workspacesTable.tableName,
           WORKSPACES_BY_OBJECT_TYPE_INDEX_NAME:
@@ -93,6 +94,10 @@ export class FileImportBatchJob extends Construct {
             props.ragDynamoDBTables.documentsTable.tableName ?? "",
           DOCUMENTS_BY_COMPOUND_KEY_INDEX_NAME:
             props.ragDynamoDBTables.documentsByCompoundKeyIndexName ?? "",
+          EMBEDDINGS_CACHE_TABLE_NAME:
+            props.ragDynamoDBTables.embeddingsCacheTable.tableName,
+          CHUNK_SIGNATURES_TABLE_NAME:
+            props.ragDynamoDBTables.chunkSignaturesTable.tableName,
           SAGEMAKER_RAG_MODELS_ENDPOINT:
             props.sageMakerRagModelsEndpoint?.attrEndpointName ?? "",
           OPEN_SEARCH_COLLECTION_ENDPOINT:
@@ -129,6 +134,12 @@ export class FileImportBatchJob extends Construct {
     props.ragDynamoDBTables.documentsTable.grantReadWriteData(
       fileImportJobRole
     );
+    props.ragDynamoDBTables.embeddingsCacheTable.grantReadWriteData(
+      fileImportJobRole
+    );
+    props.ragDynamoDBTables.chunkSignaturesTable.grantReadWriteData(
+      fileImportJobRole
+    );
 
     if (props.auroraDatabase) {
       props.auroraDatabase.secret?.grantRead(fileImportJobRole);
@@ -85,6 +85,7 @@ export class WebCrawlerBatchJob extends Construct {
           AURORA_DB_SECRET_ID: props.auroraDatabase?.secret
             ?.secretArn as string,
           PROCESSING_BUCKET_NAME: props.processingBucket.bucketName,
+          ONNX_MODELS_BUCKET_NAME: props.processingBucket.bucketName,
           WORKSPACES_TABLE_NAME:
             props.ragDynamoDBTables.workspacesTable.tableName,
           WORKSPACES_BY_OBJECT_TYPE_INDEX_NAME:
@@ -93,6 +94,10 @@ export class WebCrawlerBatchJob extends Construct {
             props.ragDynamoDBTables.documentsTable.tableName ?? "",
           DOCUMENTS_BY_COMPOUND_KEY_INDEX_NAME:
             props.ragDynamoDBTables.documentsByCompoundKeyIndexName ?? "",
+          EMBEDDINGS_CACHE_TABLE_NAME:
+            props.ragDynamoDBTables.embeddingsCacheTable.tableName,
+          CHUNK_SIGNATURES_TABLE_NAME:
+            props.ragDynamoDBTables.chunkSignaturesTable.tableName,
           SAGEMAKER_RAG_MODELS_ENDPOINT:
             props.sageMakerRagModelsEndpoint?.attrEndpointName ?? "",
           OPEN_SEARCH_COLLECTION_ENDPOINT:
@@ -128,6 +133,12 @@ export class WebCrawlerBatchJob extends Construct {
     props.ragDynamoDBTables.documentsTable.grantReadWriteData(
       webCrawlerJobRole
     );
+    props.ragDynamoDBTables.embeddingsCacheTable.grantReadWriteData(
+      webCrawlerJobRole
+    );
+    props.ragDynamoDBTables.chunkSignaturesTable.grantReadWriteData(
+      webCrawlerJobRole
+    );
 
     if (props.auroraDatabase) {
       props.auroraDatabase.secret?.grantRead(webCrawlerJobRole);
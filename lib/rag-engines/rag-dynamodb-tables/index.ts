@@ -5,6 +5,8 @@ import { Construct } from "constructs";
 export class RagDynamoDBTables extends Construct {
   public readonly workspacesTable: dynamodb.Table;
   public readonly documentsTable: dynamodb.Table;
+  public readonly embeddingsCacheTable: dynamodb.Table;
+  public readonly chunkSignaturesTable: dynamodb.Table;
   public readonly workspacesByObjectTypeIndexName: string =
     "by_object_type_idx";
   public readonly documentsByCompoundKeyIndexName: string =
@@ -80,7 +82,34 @@ export class RagDynamoDBTables extends Construct {
       },
     });
 
+    const embeddingsCacheTable = new dynamodb.Table(this, "EmbeddingsCache", {
+      partitionKey: {
+        name: "cache_key",
+        type: dynamodb.AttributeType.STRING,
+      },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      encryption: dynamodb.TableEncryption.AWS_MANAGED,
+      timeToLiveAttribute: "expires_at",
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+
+    const chunkSignaturesTable = new dynamodb.Table(this, "ChunkSignatures", {
+      partitionKey: {
+        name: "workspace_id",
+        type: dynamodb.AttributeType.STRING,
+      },
+      sortKey: {
+        name: "signature_key",
+        type: dynamodb.AttributeType.STRING,
+      },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      encryption: dynamodb.TableEncryption.AWS_MANAGED,
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+
     this.workspacesTable = workspacesTable;
     this.documentsTable = documentsTable;
+    this.embeddingsCacheTable = embeddingsCacheTable;
+    this.chunkSignaturesTable = chunkSignaturesTable;
   }
 }
@@ -61,6 +61,8 @@ export class DeleteWorkspace extends Construct {
             props.ragDynamoDBTables?.documentsByCompoundKeyIndexName ?? "",
           DOCUMENTS_BY_STATUS_INDEX:
             props.ragDynamoDBTables.documentsByStatusIndexName ?? "",
+          CHUNK_SIGNATURES_TABLE_NAME:
+            props.ragDynamoDBTables.chunkSignaturesTable.tableName,
           DEFAULT_KENDRA_S3_DATA_SOURCE_BUCKET_NAME:
             props.kendraRetrieval?.kendraS3DataSourceBucket?.bucketName ?? "",
           OPEN_SEARCH_COLLECTION_ENDPOINT:
@@ -107,6 +109,9 @@ export class DeleteWorkspace extends Construct {
     );
     props.ragDynamoDBTables.workspacesTable.grantReadWriteData(deleteFunction);
     props.ragDynamoDBTables.documentsTable.grantReadWriteData(deleteFunction);
+    props.ragDynamoDBTables.chunkSignaturesTable.grantReadWriteData(
+      deleteFunction
+    );
 
     const handleError = new tasks.DynamoUpdateItem(this, "HandleError", {
       table: props.ragDynamoDBTables.workspacesTable,
@@ -0,0 +1,142 @@
+"""
+Compares the recall and the latency of the documents retrieval mode of a
+workspace to the chunks mode. Runs with the environment variables and the
+AWS credentials of the API handler, one query per line.
+
+python retrieval_comparison.py --workspace-id <id> --queries queries.txt
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from typing import List, Optional
+
+sys.path.append(
+    os.path.join(os.path.dirname(__file__), "..", "layers", "python-sdk", "python")
+)
+
+import genai_core.semantic_search
+from genai_core.types import CommonError, RetrievalMode
+
+LATENCY_PERCENTILES = [50, 90, 99]
+
+
+def compare_retrieval(
+    workspace_id: str,
+    queries: List[str],
+    limit: int = 5,
+    retrieval_documents: Optional[int] = None,
+    filters: Optional[dict] = None,
+) -> dict:
+    """Runs every query in the chunks and the documents retrieval modes of a
+    workspace. The recall of the documents mode is measured against the
+    chunks mode, for the vector search candidates and the top limit results.
+    Latencies are of the whole search, the embeddings and the ranking are
+    the same in both modes so the difference is the retrieval."""
+    if not queries:
+        raise CommonError("No queries to compare")
+
+    modes = [RetrievalMode.CHUNKS.value, RetrievalMode.DOCUMENTS.value]
+    latencies = {mode: [] for mode in modes}
+    vector_recalls = []
+    item_recalls = []
+
+    # connections, prepared statements and caches are warmed up first
+    for mode in modes:
+        _search(workspace_id, queries[0], limit, mode, retrieval_documents, filters)
+
+    for idx, query in enumerate(queries):
+        results = {}
+        # alternated so neither mode always runs on warmer caches
+        for mode in modes if idx % 2 == 0 else reversed(modes):
+            start = time.perf_counter()
+            results[mode] = _search(
+                workspace_id, query, limit, mode, retrieval_documents, filters
+            )
+            latencies[mode].append((time.perf_counter() - start) * 1000)
+
+        chunks, documents = results[modes[0]], results[modes[1]]
+        if documents.get("retrieval_mode") != RetrievalMode.DOCUMENTS.value:
+            raise CommonError("The workspace has no document centroids to search")
+
+        for key, recalls in [
+            ("vector_search_items", vector_recalls),
+            ("items", item_recalls),
+        ]:
+            recall = _get_recall(chunks.get(key) or [], documents.get(key) or [])
+            if recall is not None:
+                recalls.append(recall)
+
+    return {
+        "workspace_id": workspace_id,
+        "queries": len(queries),
+        "limit": limit,
+        "retrieval_documents": retrieval_documents,
+        "vector_search_recall": _mean(vector_recalls),
+        "items_recall": _mean(item_recalls),
+        "latency_ms": {mode: _get_percentiles(latencies[mode]) for mode in modes},
+    }
+
+
+def _search(
+    workspace_id: str,
+    query: str,
+    limit: int,
+    retrieval_mode: str,
+    retrieval_documents: Optional[int],
+    filters: Optional[dict],
+):
+    return genai_core.semantic_search.semantic_search(
+        workspace_id,
+        query,
+        limit=limit,
+        full_response=True,
+        filters=filters,
+        retrieval_mode=retrieval_mode,
+        retrieval_documents=retrieval_documents,
+    )
+
+
+def _get_recall(expected: List[dict], found: List[dict]) -> Optional[float]:
+    expected_ids = set(str(item["chunk_id"]) for item in expected)
+    if not expected_ids:
+        return None
+
+    found_ids = set(str(item["chunk_id"]) for item in found)
+
+    return len(expected_ids & found_ids) / len(expected_ids)
+
+
+def _get_percentiles(values: List[float]) -> dict:
+    return {
+        f"p{percentile}": round(float(np.percentile(values, percentile)), 1)
+        for percentile in LATENCY_PERCENTILES
+    }
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    return round(float(np.mean(values)), 4) if values else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workspace-id", required=True)
+    parser.add_argument("--queries", required=True, help="file, - for stdin")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--documents", type=int, default=None)
+    args = parser.parse_args()
+
+    source = sys.stdin if args.queries == "-" else open(args.queries)
+    with source:
+        queries = [line.strip() for line in source if line.strip()]
+
+    result = compare_retrieval(
+        args.workspace_id,
+        queries,
+        limit=args.limit,
+        retrieval_documents=args.documents,
+    )
+    print(json.dumps(result, indent=2))
@@ -0,0 +1,88 @@
+"""
+Measures the throughput of LangChain's RecursiveCharacterTextSplitter and of
+genai_core.utils.text_splitter in MB/s, on a generated text of paragraphs,
+lines and words or on a file.
+
+python text_splitter_benchmark.py --size-mb 6.8 --chunk-size 1000 --chunk-overlap 200
+python text_splitter_benchmark.py --file document.txt
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+sys.path.append(
+    os.path.join(os.path.dirname(__file__), "..", "layers", "python-sdk", "python")
+)
+
+from genai_core.utils.text_splitter import split_text
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing"]
+
+
+def get_text(size: int, seed: int) -> str:
+    rng = random.Random(seed)
+    paragraphs = []
+    length = 0
+    while length < size:
+        lines = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 20)))
+            for _ in range(rng.randint(1, 8))
+        ]
+        paragraph = "\n".join(lines)
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+
+    return "\n\n".join(paragraphs)
+
+
+def measure(name: str, split, text: str, repeat: int) -> list:
+    size_mb = len(text.encode("utf-8")) / 1024 / 1024
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = split(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    print(f"{name}: {len(chunks)} chunks, {size_mb / best:.1f} MB/s")
+
+    return chunks
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file")
+    parser.add_argument("--size-mb", type=float, default=6.8)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as file:
+            text = file.read()
+    else:
+        text = get_text(int(args.size_mb * 1024 * 1024), args.seed)
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        length_function=len,
+    )
+
+    expected = measure("langchain", splitter.split_text, text, args.repeat)
+    found = measure(
+        "native",
+        lambda value: split_text(value, args.chunk_size, args.chunk_overlap),
+        text,
+        args.repeat,
+    )
+
+    if expected != found:
+        print("The chunks differ")
+        sys.exit(1)
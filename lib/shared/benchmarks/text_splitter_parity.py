@@ -0,0 +1,61 @@
+"""
+Checks that genai_core.utils.text_splitter produces the same chunks as
+LangChain's RecursiveCharacterTextSplitter, the splitter it replaced, on
+random texts with mixed separators, chunk sizes and overlaps.
+
+python text_splitter_parity.py --cases 3000 --seed 1
+"""
+
+import os
+import sys
+import random
+import argparse
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+sys.path.append(
+    os.path.join(os.path.dirname(__file__), "..", "layers", "python-sdk", "python")
+)
+
+from genai_core.utils.text_splitter import split_text
+
+ALPHABET = ["a", "b", "c", "d", " ", " ", "\n", "\n\n", ".", "\x00", "é"]
+
+
+def get_text(rng: random.Random) -> str:
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 2000)))
+
+
+def check_parity(cases: int, seed: int) -> int:
+    rng = random.Random(seed)
+    failures = 0
+    for case in range(cases):
+        text = get_text(rng)
+        chunk_size = rng.randint(2, 120)
+        chunk_overlap = rng.randint(0, chunk_size - 1)
+
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len
+        )
+        expected = splitter.split_text(text)
+        found = split_text(text, chunk_size, chunk_overlap)
+
+        if expected != found:
+            failures += 1
+            print(
+                f"Case {case} differs: chunk_size {chunk_size}, "
+                f"chunk_overlap {chunk_overlap}, text {text!r}"
+            )
+
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    failures = check_parity(args.cases, args.seed)
+    print(f"{args.cases - failures} of {args.cases} cases match LangChain")
+
+    sys.exit(1 if failures else 0)
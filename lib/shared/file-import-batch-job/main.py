@@ -5,6 +5,9 @@ import genai_core.chunks
 import genai_core.documents
 import genai_core.workspaces
 import genai_core.aurora.create
+import genai_core.deduplication
+import genai_core.embeddings_cache
+import genai_core.sagemaker_endpoint
 from langchain.document_loaders import S3FileLoader
 
 WORKSPACE_ID = os.environ.get("WORKSPACE_ID")
@@ -58,6 +61,9 @@ def main():
             )
 
         add_chunks(workspace, document, content)
+        print(f"Embeddings cache: {genai_core.embeddings_cache.get_stats()}")
+        print(f"Near duplicates: {genai_core.deduplication.get_stats()}")
+        print(f"SageMaker latency: {genai_core.sagemaker_endpoint.get_latency_stats()}")
     except Exception as error:
         genai_core.documents.set_status(WORKSPACE_ID, DOCUMENT_ID, "error")
         print(error)
@@ -65,7 +71,7 @@ def main():
 
 
 def add_chunks(workspace: dict, document: dict, content: str):
-    chunks = genai_core.chunks.split_content(workspace, content)
+    chunks = genai_core.chunks.iter_split_content(workspace, content)
 
     genai_core.chunks.add_chunks(
         workspace=workspace,
@@ -74,6 +80,7 @@ def add_chunks(workspace: dict, document: dict, content: str):
         chunks=chunks,
         chunk_complements=None,
         replace=True,
+        incremental=True,
     )
 
 
@@ -0,0 +1,175 @@
+import psycopg2.extras
+import numpy as np
+from psycopg2 import sql
+from typing import Optional
+from genai_core.aurora.connection import AuroraConnection
+from genai_core.aurora.layout import get_chunks_table
+from genai_core.aurora.utils import format_vector
+from genai_core.document_centroids import get_document_centroids
+
+# Representative vectors of the documents of every workspace. A workspace
+# has about one per DOCUMENT_CENTROID_CHUNKS chunks, they are scanned
+# exactly so the column needs no dimensions and no vector index.
+DOCUMENT_CENTROIDS_TABLE = "document_centroids"
+
+_centroid_table_exists = False
+
+
+def create_centroid_table(cursor):
+    """Creates the document centroids table if it does not exist."""
+    global _centroid_table_exists
+
+    if has_centroid_table(cursor):
+        return
+
+    # workspaces can be created and ingested at the same time
+    cursor.execute(
+        "SELECT pg_advisory_xact_lock(hashtext(%s));", [DOCUMENT_CENTROIDS_TABLE]
+    )
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", [DOCUMENT_CENTROIDS_TABLE])
+    if not cursor.fetchone()[0]:
+        cursor.execute(
+            sql.SQL(
+                """CREATE TABLE {table} (
+                    workspace_id UUID NOT NULL,
+                    document_id UUID NOT NULL,
+                    document_sub_id UUID,
+                    centroid vector NOT NULL,
+                    chunks INTEGER NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );"""
+            ).format(table=sql.Identifier(DOCUMENT_CENTROIDS_TABLE))
+        )
+        cursor.execute(
+            sql.SQL(
+                "CREATE INDEX {index} ON {table} (workspace_id, document_id);"
+            ).format(
+                index=sql.Identifier(f"{DOCUMENT_CENTROIDS_TABLE}_document_id"),
+                table=sql.Identifier(DOCUMENT_CENTROIDS_TABLE),
+            )
+        )
+        print(f"Created the {DOCUMENT_CENTROIDS_TABLE} table")
+
+    _centroid_table_exists = True
+
+
+def has_centroid_table(cursor) -> bool:
+    global _centroid_table_exists
+
+    if not _centroid_table_exists:
+        cursor.execute(
+            "SELECT to_regclass(%s) IS NOT NULL;", [DOCUMENT_CENTROIDS_TABLE]
+        )
+        _centroid_table_exists = cursor.fetchone()[0]
+
+    return _centroid_table_exists
+
+
+def add_document_centroids(
+    cursor,
+    workspace: dict,
+    document_id: str,
+    document_sub_id: Optional[str],
+    chunk_embeddings: Optional[np.ndarray],
+):
+    """Adds the representative vectors of the chunks of one add, in the
+    transaction of the chunks."""
+    if chunk_embeddings is None or len(chunk_embeddings) == 0:
+        return
+
+    rows = [
+        [
+            workspace["workspace_id"],
+            document_id,
+            document_sub_id,
+            format_vector(centroid),
+            chunks,
+        ]
+        for centroid, chunks in get_document_centroids(chunk_embeddings)
+    ]
+
+    psycopg2.extras.execute_values(
+        cursor,
+        sql.SQL(
+            """INSERT INTO {table}
+                (workspace_id, document_id, document_sub_id, centroid, chunks) VALUES %s;"""
+        )
+        .format(table=sql.Identifier(DOCUMENT_CENTROIDS_TABLE))
+        .as_string(cursor),
+        rows,
+        template="(%s, %s, %s, %s::vector, %s)",
+    )
+
+
+def delete_document_centroids(
+    cursor, workspace: dict, document_id: Optional[str] = None
+) -> int:
+    """Removes the centroids of a document, of the whole workspace without
+    a document_id."""
+    if not has_centroid_table(cursor):
+        return 0
+
+    document_filter = sql.SQL("")
+    params = [workspace["workspace_id"]]
+    if document_id:
+        document_filter = sql.SQL("AND document_id = %s")
+        params.append(document_id)
+
+    cursor.execute(
+        sql.SQL(
+            "DELETE FROM {table} WHERE workspace_id = %s {document_filter};"
+        ).format(
+            table=sql.Identifier(DOCUMENT_CENTROIDS_TABLE),
+            document_filter=document_filter,
+        ),
+        params,
+    )
+
+    return cursor.rowcount
+
+
+def rebuild_document_centroids(workspace: dict, document_id: Optional[str] = None):
+    """Computes the centroids of a document, or of every document of the
+    workspace, from the stored chunks. Used to backfill workspaces created
+    before the centroids and after chunks were removed from a document.
+
+    The stored chunks have no insert order, created_at is the same for all
+    the chunks of an add and chunk_id is random, so a rebuilt document gets
+    one centroid per document_sub_id instead of one per section."""
+    table_name = get_chunks_table(workspace)
+    params = [workspace["workspace_id"]]
+    document_filter = sql.SQL("")
+    if document_id:
+        document_filter = sql.SQL("AND document_id = %s")
+        params.append(document_id)
+
+    with AuroraConnection(autocommit=False) as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", [table_name])
+        if not cursor.fetchone()[0]:
+            return 0
+
+        create_centroid_table(cursor)
+        delete_document_centroids(cursor, workspace, document_id)
+
+        cursor.execute(
+            sql.SQL(
+                """INSERT INTO {centroids}
+                    (workspace_id, document_id, document_sub_id, centroid, chunks)
+                SELECT workspace_id, document_id, document_sub_id,
+                    avg(content_embeddings::vector), count(*)
+                FROM {table} WHERE workspace_id = %s {document_filter}
+                    AND document_id IS NOT NULL
+                GROUP BY workspace_id, document_id, document_sub_id;"""
+            ).format(
+                centroids=sql.Identifier(DOCUMENT_CENTROIDS_TABLE),
+                table=sql.Identifier(table_name),
+                document_filter=document_filter,
+            ),
+            params,
+        )
+        rows = cursor.rowcount
+        cursor.connection.commit()
+
+    print(f"Rebuilt {rows} document centroids of {workspace['workspace_id']}")
+
+    return rows
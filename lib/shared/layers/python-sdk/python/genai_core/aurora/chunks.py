@@ -1,10 +1,49 @@
+import io
+import os
+import json
+import uuid
+import struct
+import numpy as np
+import psycopg2
+import psycopg2.extras
 from psycopg2 import sql
 from typing import List, Optional
+from genai_core.aurora.centroids import (
+    add_document_centroids,
+    create_centroid_table,
+    delete_document_centroids,
+)
 from genai_core.aurora.connection import AuroraConnection
+from genai_core.aurora.layout import get_chunks_table
+from genai_core.aurora.partitions import lock_workspace_writes
+
+AURORA_INSERT_PAGE_SIZE = int(os.environ.get("AURORA_INSERT_PAGE_SIZE", "500"))
+
+CHUNK_COLUMNS = [
+    "chunk_id",
+    "workspace_id",
+    "document_id",
+    "document_sub_id",
+    "document_type",
+    "document_sub_type",
+    "path",
+    "title",
+    "content",
+    "content_complement",
+    "content_embeddings",
+    "metadata",
+]
+
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+# Big endian element types of the pgvector binary formats
+COPY_VECTOR_FORMATS = {"vector": ">f4", "halfvec": ">f2"}
+JSONB_BINARY_VERSION = b"\x01"
+
+_vector_types = {}
 
 
 def add_chunks_aurora(
-    workspace_id: str,
+    workspace: dict,
     document_id: str,
     document_sub_id: Optional[str],
     document_type: str,
@@ -12,16 +51,40 @@ def add_chunks_aurora(
     path: Optional[str],
     title: Optional[str],
     chunk_ids: List[str],
-    chunk_embeddings: List[int],
+    chunk_embeddings: np.ndarray,
     chunks: List[str],
     chunk_complements: List[str],
     replace: bool,
+    metadata: Optional[dict] = None,
 ):
-    table_name = sql.Identifier(workspace_id.replace("-", ""))
+    workspace_id = workspace["workspace_id"]
+    table_name = sql.Identifier(get_chunks_table(workspace))
+    metadata = psycopg2.extras.Json(metadata) if metadata else None
     complements_len = len(chunk_complements) if chunk_complements else 0
     removed_vectors = 0
+    added_vectors = 0
+
+    rows = []
+    for idx in range(len(chunk_ids)):
+        rows.append(
+            [
+                chunk_ids[idx],
+                workspace_id,
+                document_id,
+                document_sub_id,
+                document_type,
+                document_sub_type,
+                path,
+                title,
+                chunks[idx],
+                chunk_complements[idx] if idx < complements_len else None,
+                chunk_embeddings[idx],
+                metadata,
+            ]
+        )
 
     with AuroraConnection(autocommit=False) as cursor:
+        lock_workspace_writes(cursor, workspace)
         if replace:
             cursor.execute(
                 sql.SQL(
@@ -33,54 +96,154 @@ def add_chunks_aurora(
 
             removed_vectors = cursor.rowcount
 
-        for idx in range(len(chunk_ids)):
-            chunk_id = chunk_ids[idx]
-            content = chunks[idx]
-            content_complement = (
-                chunk_complements[idx] if idx < complements_len else None
-            )
+        create_centroid_table(cursor)
+        if replace:
+            delete_document_centroids(cursor, workspace, document_id)
 
-            cursor.execute(
-                sql.SQL(
-                    """INSERT INTO {table} (
-                        chunk_id, 
-                        workspace_id,
-                        document_id, 
-                        document_sub_id, 
-                        document_type,
-                        document_sub_type,
-                        path,
-                        title,
-                        content,
-                        content_complement,
-                        content_embeddings
-                    ) VALUES (
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,%s
-                    );"""
-                ).format(table=table_name),
-                [
-                    chunk_id,
-                    workspace_id,
-                    document_id,
-                    document_sub_id,
-                    document_type,
-                    document_sub_type,
-                    path,
-                    title,
-                    content,
-                    content_complement,
-                    chunk_embeddings[idx],
-                ],
+        if rows:
+            added_vectors = None
+            vector_type = _get_vector_type(cursor, get_chunks_table(workspace))
+            if vector_type in COPY_VECTOR_FORMATS:
+                added_vectors = _copy_rows(cursor, table_name, vector_type, rows)
+
+            if added_vectors is None:
+                added_vectors = _insert_rows(cursor, table_name, rows)
+
+            add_document_centroids(
+                cursor, workspace, document_id, document_sub_id, chunk_embeddings
             )
 
         cursor.connection.commit()
 
-    return {"removed_vectors": removed_vectors, "added_vectors": len(chunk_ids)}
+    return {"removed_vectors": removed_vectors, "added_vectors": added_vectors}
+
+
+def _copy_rows(cursor, table_name, vector_type: str, rows: list) -> Optional[int]:
+    """COPY in binary format, returns None when the server rejected the
+    data and the rows have to be inserted as text instead."""
+    data = _encode_copy_rows(rows, COPY_VECTOR_FORMATS[vector_type])
+
+    cursor.execute("SAVEPOINT copy_chunks;")
+    try:
+        cursor.copy_expert(
+            sql.SQL("COPY {table} ({columns}) FROM STDIN WITH (FORMAT BINARY);")
+            .format(
+                table=table_name,
+                columns=sql.SQL(", ").join(map(sql.Identifier, CHUNK_COLUMNS)),
+            )
+            .as_string(cursor),
+            io.BytesIO(data),
+        )
+    except (psycopg2.DataError, psycopg2.NotSupportedError) as error:
+        print(f"Binary COPY failed, inserting with execute_values: {error}")
+        cursor.execute("ROLLBACK TO SAVEPOINT copy_chunks;")
+        return None
+
+    copied_rows = _get_copied_rows(cursor, len(rows))
+    cursor.execute("RELEASE SAVEPOINT copy_chunks;")
+
+    return copied_rows
+
+
+def _insert_rows(cursor, table_name, rows: list) -> int:
+    query = (
+        sql.SQL("INSERT INTO {table} ({columns}) VALUES %s;")
+        .format(
+            table=table_name,
+            columns=sql.SQL(", ").join(map(sql.Identifier, CHUNK_COLUMNS)),
+        )
+        .as_string(cursor)
+    )
+
+    # one page per call, rowcount only covers the last page of a call
+    inserted = 0
+    for idx in range(0, len(rows), AURORA_INSERT_PAGE_SIZE):
+        page = rows[idx : idx + AURORA_INSERT_PAGE_SIZE]
+        psycopg2.extras.execute_values(cursor, query, page, page_size=len(page))
+        inserted += cursor.rowcount
+
+    return inserted
+
+
+def _encode_copy_rows(rows: list, vector_format: str) -> bytes:
+    buffer = io.BytesIO()
+    buffer.write(COPY_SIGNATURE)
+    buffer.write(struct.pack("!ii", 0, 0))
+
+    field_count = struct.pack("!h", len(CHUNK_COLUMNS))
+    for row in rows:
+        buffer.write(field_count)
+        for idx in range(3):
+            _write_field(buffer, _encode_uuid(row[idx]))
+        _write_field(buffer, _encode_uuid(row[3]) if row[3] else None)
+        for value in row[4:10]:
+            _write_field(buffer, value.encode("utf-8") if value is not None else None)
+        _write_field(buffer, _encode_vector(row[10], vector_format))
+        _write_field(buffer, _encode_jsonb(row[11]) if row[11] else None)
+
+    buffer.write(struct.pack("!h", -1))
+
+    return buffer.getvalue()
 
 
-def clean_chunks_aurora(workspace_id: str, document_id: str):
-    table_name = sql.Identifier(workspace_id.replace("-", ""))
-    with AuroraConnection() as cursor:
+def _write_field(buffer: io.BytesIO, value: Optional[bytes]):
+    if value is None:
+        buffer.write(struct.pack("!i", -1))
+    else:
+        buffer.write(struct.pack("!i", len(value)))
+        buffer.write(value)
+
+
+def _encode_uuid(value) -> bytes:
+    if isinstance(value, uuid.UUID):
+        return value.bytes
+
+    return uuid.UUID(str(value)).bytes
+
+
+def _encode_vector(embedding: np.ndarray, vector_format: str) -> bytes:
+    # pgvector binary format: int16 dimensions, int16 unused, the elements
+    values = np.asarray(embedding).astype(vector_format)
+
+    return struct.pack("!hh", len(values), 0) + values.tobytes()
+
+
+def _encode_jsonb(value: psycopg2.extras.Json) -> bytes:
+    return JSONB_BINARY_VERSION + json.dumps(value.adapted).encode("utf-8")
+
+
+def _get_copied_rows(cursor, expected: int) -> int:
+    # the command tag is "COPY <rows>"
+    status = cursor.statusmessage or ""
+    if status.startswith("COPY "):
+        return int(status[len("COPY ") :])
+
+    return cursor.rowcount if cursor.rowcount >= 0 else expected
+
+
+def _get_vector_type(cursor, table_name: str) -> Optional[str]:
+    if table_name in _vector_types:
+        return _vector_types[table_name]
+
+    cursor.execute(
+        """SELECT t.typname FROM pg_attribute a JOIN pg_type t ON t.oid = a.atttypid
+            WHERE a.attrelid = to_regclass(%s) AND a.attname = 'content_embeddings';""",
+        [table_name],
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+
+    _vector_types[table_name] = row[0]
+
+    return row[0]
+
+
+def clean_chunks_aurora(workspace: dict, document_id: str):
+    workspace_id = workspace["workspace_id"]
+    table_name = sql.Identifier(get_chunks_table(workspace))
+    with AuroraConnection(autocommit=False) as cursor:
+        lock_workspace_writes(cursor, workspace)
         cursor.execute(
             sql.SQL(
                 """DELETE FROM {table} WHERE 
@@ -88,3 +251,22 @@ def clean_chunks_aurora(workspace_id: str, document_id: str):
             ).format(table=table_name),
             [workspace_id, document_id],
         )
+        delete_document_centroids(cursor, workspace, document_id)
+        cursor.connection.commit()
+
+
+def delete_chunks_aurora(workspace: dict, chunk_ids: List[str]):
+    table_name = sql.Identifier(get_chunks_table(workspace))
+    with AuroraConnection(autocommit=False) as cursor:
+        lock_workspace_writes(cursor, workspace)
+        # the workspace prunes the partitions of the shared tables
+        cursor.execute(
+            sql.SQL(
+                "DELETE FROM {table} WHERE workspace_id = %s AND chunk_id = ANY(%s::uuid[]);"
+            ).format(table=table_name),
+            [workspace["workspace_id"], [str(chunk_id) for chunk_id in chunk_ids]],
+        )
+        deleted = cursor.rowcount
+        cursor.connection.commit()
+
+        return deleted
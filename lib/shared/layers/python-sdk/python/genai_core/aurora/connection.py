@@ -1,45 +1,307 @@
 import os
+import re
 import json
+import time
+import hashlib
+import itertools
+import threading
 import boto3
 import psycopg2
 import psycopg2.extras
+import psycopg2.extensions
+from collections import OrderedDict
+from psycopg2 import sql
 from pgvector.psycopg2 import register_vector
 
 secretsmanager_client = boto3.client("secretsmanager")
 AURORA_DB_SECRET_ID = os.environ.get("AURORA_DB_SECRET_ID")
+# Idle connections kept for the next invocations of a warm Lambda
+AURORA_POOL_MAX_IDLE = int(os.environ.get("AURORA_POOL_MAX_IDLE", "4"))
+# Connections idle for longer are checked with a round trip before use
+AURORA_POOL_PING_AFTER_SECONDS = int(
+    os.environ.get("AURORA_POOL_PING_AFTER_SECONDS", "30")
+)
+AURORA_POOL_MAX_LIFETIME_SECONDS = int(
+    os.environ.get("AURORA_POOL_MAX_LIFETIME_SECONDS", "3600")
+)
+AURORA_SECRET_TTL_SECONDS = int(os.environ.get("AURORA_SECRET_TTL_SECONDS", "900"))
+# Read-only connections go round-robin to these comma separated replica hosts,
+# or to the cluster reader endpoint, and to the writer when neither is set
+AURORA_READ_REPLICAS = [
+    host.strip()
+    for host in os.environ.get("AURORA_READ_REPLICAS", "").split(",")
+    if host.strip()
+]
+AURORA_READER_ENDPOINT = os.environ.get("AURORA_READER_ENDPOINT")
+# A reader that refused a connection is skipped for this long
+AURORA_READER_RETRY_SECONDS = int(os.environ.get("AURORA_READER_RETRY_SECONDS", "30"))
+# Prepared statements kept by each connection, the least recently used one is
+# deallocated beyond this
+AURORA_PREPARED_STATEMENTS_MAX = int(
+    os.environ.get("AURORA_PREPARED_STATEMENTS_MAX", "32")
+)
+
+# invalid_password, invalid_authorization_specification
+AUTHENTICATION_ERROR_CODES = ["28P01", "28000"]
+
+PLACEHOLDER_PATTERN = re.compile(r"%%|%s")
+
+_lock = threading.Lock()
+# idle connections by host, None is the writer host of the secret
+_idle = {}
+_unavailable_readers = {}
+_next_reader = {"value": 0}
+_secret = {"value": None, "fetched_at": 0.0}
+_uuid_registered = False
+
+
+class _PooledConnection(psycopg2.extensions.connection):
+    # the base class has no instance dict, this one keeps the creation time,
+    # the host it was opened to and its prepared statements
+    _created_at = 0.0
+    _host = None
+    _prepared = None
 
 
 class AuroraConnection(object):
-    def __init__(self, autocommit=True):
-        secret_response = secretsmanager_client.get_secret_value(
-            SecretId=AURORA_DB_SECRET_ID
-        )
-        database_secrets = json.loads(secret_response["SecretString"])
-        self.autocommit = autocommit
+    """Borrows a connection from the module pool for the with block. The
+    connection is returned with no open transaction, so an uncommitted
+    transaction is rolled back as if the connection was closed. Read-only
+    connections come from the readers when there are any."""
 
-        self.dbhost = database_secrets["host"]
-        self.dbport = database_secrets["port"]
-        self.dbuser = database_secrets["username"]
-        self.dbpass = database_secrets["password"]
+    def __init__(self, autocommit=True, read_only=False):
+        self.autocommit = autocommit
+        self.read_only = read_only
+        self.connection = None
+        self.cursor = None
 
     def __enter__(self):
-        connection = psycopg2.connect(
-            host=self.dbhost,
-            user=self.dbuser,
-            password=self.dbpass,
-            port=self.dbport,
-            connect_timeout=10,
-        )
-
-        connection.set_session(autocommit=self.autocommit)
-        psycopg2.extras.register_uuid()
-        register_vector(connection)
-        cursor = connection.cursor()
+        connection = _acquire_reader() if self.read_only else _acquire(None)
+        try:
+            connection.autocommit = self.autocommit
+            connection.readonly = self.read_only
+            cursor = connection.cursor()
+        except Exception:
+            _discard(connection)
+            raise
+
         self.connection = connection
         self.cursor = cursor
 
         return cursor
 
-    def __exit__(self, *args):
-        self.cursor.close()
-        self.connection.close()
+    def __exit__(self, exc_type, exc_value, traceback):
+        connection = self.connection
+        self.connection = None
+
+        try:
+            self.cursor.close()
+        except psycopg2.Error:
+            pass
+
+        if isinstance(exc_value, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+            _discard(connection)
+        else:
+            _release(connection)
+
+
+def execute_prepared(cursor, query: sql.Composable, params: list):
+    """Executes the query as a prepared statement of the cursor connection.
+    The statement is prepared on first use, later calls on the same pooled
+    connection only send EXECUTE with the parameters and can reuse the plan.
+    Prepared statements outlive transactions, including rolled back ones."""
+    connection = cursor.connection
+    if connection._prepared is None:
+        connection._prepared = OrderedDict()
+
+    text = query.as_string(cursor)
+    name = connection._prepared.get(text)
+    if name is None:
+        name = "genai_" + hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+        # without parameters psycopg2 sends the statement as it is
+        cursor.execute(f"PREPARE {name} AS {_to_positional(text)}")
+        connection._prepared[text] = name
+
+        if len(connection._prepared) > AURORA_PREPARED_STATEMENTS_MAX:
+            _, evicted = connection._prepared.popitem(last=False)
+            cursor.execute(f"DEALLOCATE {evicted}")
+    else:
+        connection._prepared.move_to_end(text)
+
+    if not params:
+        cursor.execute(f"EXECUTE {name}")
+        return
+
+    cursor.execute(
+        sql.SQL("EXECUTE {name} ({params})").format(
+            name=sql.Identifier(name),
+            params=sql.SQL(", ").join(sql.Placeholder() * len(params)),
+        ),
+        params,
+    )
+
+
+def _to_positional(text: str) -> str:
+    # %s placeholders become $1, $2, ... and escaped %% a literal %
+    position = itertools.count(1)
+
+    return PLACEHOLDER_PATTERN.sub(
+        lambda match: "%" if match.group(0) == "%%" else f"${next(position)}", text
+    )
+
+
+def _get_readers() -> list:
+    if AURORA_READ_REPLICAS:
+        return AURORA_READ_REPLICAS
+
+    return [AURORA_READER_ENDPOINT] if AURORA_READER_ENDPOINT else []
+
+
+def _acquire_reader():
+    readers = _get_readers()
+    with _lock:
+        start = _next_reader["value"]
+        _next_reader["value"] = start + 1
+
+    for offset in range(len(readers)):
+        host = readers[(start + offset) % len(readers)]
+        with _lock:
+            unavailable_until = _unavailable_readers.get(host, 0.0)
+        if unavailable_until > time.time():
+            continue
+
+        try:
+            return _acquire(host)
+        except psycopg2.OperationalError as error:
+            print(f"Aurora reader {host} is not available: {error}")
+            with _lock:
+                _unavailable_readers[host] = time.time() + AURORA_READER_RETRY_SECONDS
+
+    # the writer serves the reads while no reader is available
+    return _acquire(None)
+
+
+def _acquire(host):
+    while True:
+        with _lock:
+            idle = _idle.get(host)
+            entry = idle.pop() if idle else None
+
+        if entry is None:
+            return _connect(host)
+
+        connection, created_at, released_at = entry
+        now = time.time()
+        if connection.closed or now - created_at > AURORA_POOL_MAX_LIFETIME_SECONDS:
+            _discard(connection)
+            continue
+
+        if now - released_at > AURORA_POOL_PING_AFTER_SECONDS and not _ping(connection):
+            _discard(connection)
+            continue
+
+        return connection
+
+
+def _release(connection):
+    if connection.closed:
+        return
+
+    try:
+        # per use reset, nothing of a transaction leaks to the next borrower
+        status = connection.info.transaction_status
+        if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+    except psycopg2.Error:
+        _discard(connection)
+        return
+
+    with _lock:
+        idle = _idle.setdefault(connection._host, [])
+        if len(idle) < AURORA_POOL_MAX_IDLE:
+            idle.append((connection, connection._created_at, time.time()))
+            return
+
+    _discard(connection)
+
+
+def _discard(connection):
+    try:
+        connection.close()
+    except psycopg2.Error:
+        pass
+
+
+def _ping(connection) -> bool:
+    try:
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1;")
+
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _connect(host):
+    global _uuid_registered
+
+    database_secrets = _get_secret()
+    try:
+        connection = _open(database_secrets, host)
+    except psycopg2.OperationalError as error:
+        if not _is_authentication_error(error):
+            raise
+
+        # the secret was rotated since it was cached
+        print("Aurora authentication failed, refreshing the database secret")
+        connection = _open(_get_secret(refresh=True), host)
+
+    if not _uuid_registered:
+        psycopg2.extras.register_uuid()
+        _uuid_registered = True
+
+    register_vector(connection)
+    connection._created_at = time.time()
+    connection._host = host
+
+    return connection
+
+
+def _open(database_secrets: dict, host):
+    return psycopg2.connect(
+        connection_factory=_PooledConnection,
+        host=host or database_secrets["host"],
+        user=database_secrets["username"],
+        password=database_secrets["password"],
+        port=database_secrets["port"],
+        connect_timeout=10,
+        keepalives=1,
+        keepalives_idle=30,
+    )
+
+
+def _get_secret(refresh: bool = False) -> dict:
+    with _lock:
+        age = time.time() - _secret["fetched_at"]
+        if not refresh and _secret["value"] and age < AURORA_SECRET_TTL_SECONDS:
+            return _secret["value"]
+
+    secret_response = secretsmanager_client.get_secret_value(
+        SecretId=AURORA_DB_SECRET_ID
+    )
+    database_secrets = json.loads(secret_response["SecretString"])
+
+    with _lock:
+        _secret["value"] = database_secrets
+        _secret["fetched_at"] = time.time()
+
+    return database_secrets
+
+
+def _is_authentication_error(error: psycopg2.OperationalError) -> bool:
+    if getattr(error, "pgcode", None) in AUTHENTICATION_ERROR_CODES:
+        return True
+
+    # connection errors come from libpq without a SQLSTATE
+    return "password authentication failed" in str(error)
@@ -1,16 +1,71 @@
 from psycopg2 import sql
+from genai_core.aurora.centroids import create_centroid_table
 from genai_core.aurora.connection import AuroraConnection
+from genai_core.aurora.index import (
+    get_index_method,
+    get_index_options,
+    get_vector_index_names,
+)
+from genai_core.aurora.layout import (
+    get_default_partition,
+    get_embeddings_column,
+    get_index_table,
+    get_parent_table,
+    has_partition,
+    is_partitioned,
+)
+from genai_core.types import AuroraIndexType, VectorStorage
+from genai_core.vector_storage import get_vector_dimensions, get_vector_storage
+
+VECTOR_TYPES = {
+    VectorStorage.FULL: "vector",
+    VectorStorage.HALF: "halfvec",
+    VectorStorage.BINARY: "vector",
+}
+
+METRIC_OPS = {"cosine": "cosine_ops", "l2": "l2_ops", "inner": "ip_ops"}
+
+FILTER_INDEXES = {
+    "document_type": "(document_type, document_sub_type)",
+    "path": "(path text_pattern_ops)",
+    "metadata": "USING GIN (metadata jsonb_path_ops)",
+    "created_at": "(created_at)",
+}
+
+# Indexes of the shared chunk tables, every workspace only reads its own rows
+SHARED_INDEXES = {
+    "document_id": "(workspace_id, document_id)",
+    "document_sub_id": "(workspace_id, document_sub_id)",
+    "document_type": "(workspace_id, document_type, document_sub_type)",
+    "path": "(workspace_id, path text_pattern_ops)",
+    "metadata": "USING GIN (metadata jsonb_path_ops)",
+    "created_at": "(workspace_id, created_at)",
+}
+
+TSVECTOR_COLUMN_PREFIX = "content_tsv_"
+# Adding the columns rewrites the table, it does not wait for long queries
+TSVECTOR_MIGRATION_LOCK_TIMEOUT = "10s"
 
 
 def create_workspace_table(workspace: dict):
+    if is_partitioned(workspace):
+        # the rows go to the default partition until the workspace grows
+        with AuroraConnection(autocommit=False) as cursor:
+            create_shared_table(cursor, workspace)
+            create_centroid_table(cursor)
+            cursor.connection.commit()
+            print("Using the shared chunk table")
+        return
+
     workspace_id = workspace["workspace_id"]
     table_name = sql.Identifier(workspace_id.replace("-", ""))
 
-    embeddings_model_dimensions = workspace["embeddings_model_dimensions"]
+    vector_dimensions = get_vector_dimensions(workspace)
+    vector_storage = get_vector_storage(workspace)
+    vector_type = sql.SQL(VECTOR_TYPES[vector_storage])
     hybrid_search = workspace["hybrid_search"]
     languages = workspace["languages"]
     has_index = workspace["has_index"]
-    metric = workspace["metric"]
 
     with AuroraConnection(autocommit=False) as cursor:
         cursor.execute(
@@ -27,12 +82,12 @@ def create_workspace_table(workspace: dict):
                     title TEXT,
                     content TEXT, 
                     content_complement TEXT, 
-                    content_embeddings vector(%s),
+                    content_embeddings {vector_type}(%s),
                     metadata JSONB,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 );"""
-            ).format(table=table_name),
-            [embeddings_model_dimensions],
+            ).format(table=table_name, vector_type=vector_type),
+            [vector_dimensions],
         )
 
         cursor.execute(
@@ -45,33 +100,258 @@ def create_workspace_table(workspace: dict):
             )
         )
 
+        create_filter_indexes(cursor, workspace)
+
         if hybrid_search:
+            add_tsvector_columns(cursor, workspace)
             for language in languages:
-                cursor.execute(
-                    sql.SQL(
-                        "CREATE INDEX ON {table} USING GIN (to_tsvector('{language}', content));"
-                    ).format(table=table_name, language=sql.Identifier(language))
-                )
+                create_tsvector_index(cursor, workspace, language)
 
         if has_index:
-            if metric == "cosine":
-                cursor.execute(
-                    sql.SQL(
-                        "CREATE INDEX ON {table} USING ivfflat (content_embeddings vector_cosine_ops) WITH (lists = 100);"
-                    ).format(table=table_name)
-                )
-            elif metric == "l2":
-                cursor.execute(
-                    sql.SQL(
-                        "CREATE INDEX ON {table} USING ivfflat (content_embeddings vector_l2_ops) WITH (lists = 100);"
-                    ).format(table=table_name)
-                )
-            elif metric == "inner":
-                cursor.execute(
-                    sql.SQL(
-                        "CREATE INDEX ON {table} USING ivfflat (content_embeddings vector_ip_ops) WITH (lists = 100);"
-                    ).format(table=table_name)
-                )
+            create_vector_index(cursor, workspace)
 
+        create_centroid_table(cursor)
         cursor.connection.commit()
         print("Created workspace table")
+
+
+def create_vector_index(cursor, workspace: dict, concurrently: bool = False):
+    table_name = sql.Identifier(get_index_table(workspace))
+    vector_dimensions = get_vector_dimensions(workspace)
+    vector_storage = get_vector_storage(workspace)
+    metric = workspace["metric"]
+    index_options = get_index_options(workspace)
+    index_type = index_options["index_type"]
+
+    if metric not in METRIC_OPS:
+        raise Exception("Unknown metric")
+
+    if index_type == AuroraIndexType.HNSW.value:
+        with_options = sql.SQL("m = {m}, ef_construction = {ef_construction}").format(
+            m=sql.Literal(index_options["index_m"]),
+            ef_construction=sql.Literal(index_options["index_ef_construction"]),
+        )
+    else:
+        with_options = sql.SQL("lists = {lists}").format(
+            lists=sql.Literal(index_options["index_lists"])
+        )
+
+    if vector_storage == VectorStorage.BINARY:
+        # only the bits are indexed, the full vector is kept for rescoring
+        column = sql.SQL(
+            "(binary_quantize(content_embeddings)::bit({dimensions})) bit_hamming_ops"
+        ).format(dimensions=sql.Literal(vector_dimensions))
+    else:
+        column = sql.SQL("{embeddings} {ops}").format(
+            embeddings=get_embeddings_column(workspace),
+            ops=sql.SQL(f"{VECTOR_TYPES[vector_storage]}_{METRIC_OPS[metric]}"),
+        )
+
+    cursor.execute(
+        sql.SQL(
+            "CREATE INDEX {concurrently} ON {table} USING {method} ({column}) WITH ({with_options});"
+        ).format(
+            concurrently=sql.SQL("CONCURRENTLY" if concurrently else ""),
+            table=table_name,
+            method=get_index_method(index_type),
+            column=column,
+            with_options=with_options,
+        )
+    )
+
+
+def rebuild_vector_index(workspace: dict):
+    """Builds the index with the current options of the workspace next to the
+    old one, so searches keep using the old index until it is dropped."""
+    table_name = get_index_table(workspace)
+
+    # CONCURRENTLY can not run in a transaction
+    with AuroraConnection(autocommit=True) as cursor:
+        if is_partitioned(workspace) and not has_partition(cursor, workspace):
+            # built with the current options once the workspace gets a partition
+            return
+
+        previous_indexes = get_vector_index_names(cursor, table_name)
+        create_vector_index(cursor, workspace, concurrently=True)
+
+        for index_name in previous_indexes:
+            cursor.execute(
+                sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {index};").format(
+                    index=sql.Identifier(index_name)
+                )
+            )
+
+    print(f"Rebuilt the vector index of {table_name}")
+
+
+def create_filter_indexes(cursor, workspace: dict, concurrently: bool = False):
+    """Indexes for the search filters, document_id has its own index."""
+    table_name = workspace["workspace_id"].replace("-", "")
+
+    for name, definition in FILTER_INDEXES.items():
+        cursor.execute(
+            sql.SQL(
+                "CREATE INDEX {concurrently} IF NOT EXISTS {index} ON {table} {definition};"
+            ).format(
+                concurrently=sql.SQL("CONCURRENTLY" if concurrently else ""),
+                index=sql.Identifier(f"{table_name}_{name}"),
+                table=sql.Identifier(table_name),
+                definition=sql.SQL(definition),
+            )
+        )
+
+
+def create_shared_table(cursor, workspace: dict):
+    """Creates the shared chunk table of the workspace vector type, if it does
+    not exist, with a default partition for the workspaces without one."""
+    parent = get_parent_table(workspace)
+    vector_type = sql.SQL(VECTOR_TYPES[get_vector_storage(workspace)])
+
+    # workspaces can be created at the same time
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", [parent])
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", [parent])
+    if cursor.fetchone()[0]:
+        return
+
+    cursor.execute(
+        sql.SQL(
+            """CREATE TABLE {table} (
+                chunk_id UUID NOT NULL, 
+                workspace_id UUID NOT NULL,
+                document_id UUID,
+                document_sub_id UUID,
+                document_type VARCHAR(50),
+                document_sub_type VARCHAR(50),
+                path TEXT, 
+                language VARCHAR(15),
+                title TEXT,
+                content TEXT, 
+                content_complement TEXT, 
+                content_embeddings {vector_type},
+                metadata JSONB,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (workspace_id, chunk_id)
+            ) PARTITION BY LIST (workspace_id);"""
+        ).format(table=sql.Identifier(parent), vector_type=vector_type)
+    )
+
+    cursor.execute(
+        sql.SQL("CREATE TABLE {partition} PARTITION OF {table} DEFAULT;").format(
+            partition=sql.Identifier(get_default_partition(workspace)),
+            table=sql.Identifier(parent),
+        )
+    )
+
+    create_shared_indexes(cursor, parent, named=True)
+    print(f"Created the shared chunk table {parent}")
+
+
+def create_shared_indexes(cursor, table_name: str, named: bool = False):
+    """The indexes of a shared table. A dedicated partition gets them before
+    it is attached, attaching then uses them instead of building its own."""
+    for name, definition in SHARED_INDEXES.items():
+        cursor.execute(
+            sql.SQL("CREATE INDEX {index} ON {table} {definition};").format(
+                index=sql.Identifier(f"{table_name}_{name}") if named else sql.SQL(""),
+                table=sql.Identifier(table_name),
+                definition=sql.SQL(definition),
+            )
+        )
+
+
+def create_keyword_indexes(cursor, workspace: dict, concurrently: bool = False):
+    """to_tsvector expression indexes on the partition of a workspace, in the
+    form the keyword search of the shared tables uses."""
+    for language in workspace["languages"]:
+        cursor.execute(
+            sql.SQL(
+                "CREATE INDEX {concurrently} ON {table} USING GIN (to_tsvector('{language}', content));"
+            ).format(
+                concurrently=sql.SQL("CONCURRENTLY" if concurrently else ""),
+                table=sql.Identifier(get_index_table(workspace)),
+                language=sql.Identifier(language),
+            )
+        )
+
+
+def get_tsvector_column(language: str) -> str:
+    return f"{TSVECTOR_COLUMN_PREFIX}{language}"
+
+
+def has_tsvector_column(workspace: dict, language: str) -> bool:
+    """Tables created before the tsvector columns only have expression indexes
+    until they are migrated. The shared tables have none."""
+    if is_partitioned(workspace):
+        return False
+
+    return bool(workspace.get("tsvector_columns")) and language in workspace.get(
+        "languages", []
+    )
+
+
+def add_tsvector_columns(cursor, workspace: dict):
+    table_name = sql.Identifier(workspace["workspace_id"].replace("-", ""))
+
+    # generated on insert, COPY and execute_values leave them out
+    for language in workspace["languages"]:
+        cursor.execute(
+            sql.SQL(
+                """ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} tsvector 
+                GENERATED ALWAYS AS (to_tsvector({language}::regconfig, coalesce(content, ''))) STORED;"""
+            ).format(
+                table=table_name,
+                column=sql.Identifier(get_tsvector_column(language)),
+                language=sql.Literal(language),
+            )
+        )
+
+
+def create_tsvector_index(
+    cursor, workspace: dict, language: str, concurrently: bool = False
+):
+    table_name = workspace["workspace_id"].replace("-", "")
+    column = get_tsvector_column(language)
+
+    cursor.execute(
+        sql.SQL(
+            "CREATE INDEX {concurrently} IF NOT EXISTS {index} ON {table} USING GIN ({column});"
+        ).format(
+            concurrently=sql.SQL("CONCURRENTLY" if concurrently else ""),
+            index=sql.Identifier(f"{table_name}_{column}"),
+            table=sql.Identifier(table_name),
+            column=sql.Identifier(column),
+        )
+    )
+
+
+def migrate_tsvector_columns(workspace: dict):
+    """Moves a table from to_tsvector expression indexes to stored tsvector
+    columns. Adding the columns rewrites the table under an exclusive lock,
+    the indexes are then built and the old ones dropped concurrently."""
+    table_name = workspace["workspace_id"].replace("-", "")
+
+    with AuroraConnection(autocommit=False) as cursor:
+        cursor.execute(
+            "SET LOCAL lock_timeout = %s;", [TSVECTOR_MIGRATION_LOCK_TIMEOUT]
+        )
+        add_tsvector_columns(cursor, workspace)
+        cursor.connection.commit()
+
+    # CONCURRENTLY can not run in a transaction
+    with AuroraConnection(autocommit=True) as cursor:
+        for language in workspace["languages"]:
+            create_tsvector_index(cursor, workspace, language, concurrently=True)
+
+        cursor.execute(
+            """SELECT indexname FROM pg_indexes WHERE tablename = %s
+                AND indexdef LIKE '%%to_tsvector(%%';""",
+            [table_name],
+        )
+        for row in cursor.fetchall():
+            cursor.execute(
+                sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {index};").format(
+                    index=sql.Identifier(row[0])
+                )
+            )
+
+    print(f"Migrated {table_name} to tsvector columns")
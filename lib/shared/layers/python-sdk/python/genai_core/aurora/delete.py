@@ -1,8 +1,17 @@
 import os
 import boto3
+import genai_core.deduplication
 import genai_core.utils.delete_files_with_prefix
 from psycopg2 import sql
+from genai_core.aurora.centroids import delete_document_centroids
 from genai_core.aurora.connection import AuroraConnection
+from genai_core.aurora.layout import (
+    get_default_partition,
+    get_parent_table,
+    get_partition_name,
+    get_workspace_table,
+    is_partitioned,
+)
 
 PROCESSING_BUCKET_NAME = os.environ["PROCESSING_BUCKET_NAME"]
 UPLOAD_BUCKET_NAME = os.environ["UPLOAD_BUCKET_NAME"]
@@ -10,6 +19,7 @@ WORKSPACES_TABLE_NAME = os.environ["WORKSPACES_TABLE_NAME"]
 DOCUMENTS_TABLE_NAME = os.environ.get("DOCUMENTS_TABLE_NAME")
 
 WORKSPACE_OBJECT_TYPE = "workspace"
+DROP_PARTITION_LOCK_TIMEOUT = "10s"
 
 dynamodb = boto3.resource("dynamodb")
 
@@ -23,11 +33,19 @@ def delete_aurora_workspace(workspace: dict):
         PROCESSING_BUCKET_NAME, workspace_id
     )
 
-    table_name = sql.Identifier(workspace_id.replace("-", ""))
-    with AuroraConnection(autocommit=False) as cursor:
-        cursor.execute(
-            sql.SQL("DROP TABLE IF EXISTS {table};").format(table=table_name)
-        )
+    if is_partitioned(workspace):
+        delete_workspace_rows(workspace)
+    else:
+        table_name = sql.Identifier(get_workspace_table(workspace))
+        with AuroraConnection(autocommit=False) as cursor:
+            cursor.execute(
+                sql.SQL("DROP TABLE IF EXISTS {table};").format(table=table_name)
+            )
+
+    with AuroraConnection() as cursor:
+        delete_document_centroids(cursor, workspace)
+
+    genai_core.deduplication.delete_workspace_signatures(workspace_id)
 
     workspaces_table = dynamodb.Table(WORKSPACES_TABLE_NAME)
     documents_table = dynamodb.Table(DOCUMENTS_TABLE_NAME)
@@ -68,3 +86,29 @@ def delete_aurora_workspace(workspace: dict):
     )
 
     print(f"Delete Item succeeded: {response}")
+
+
+def delete_workspace_rows(workspace: dict):
+    """Removes a workspace from the shared tables. Dropping its partition
+    locks the shared table, it gives up instead of queueing the searches of
+    the other workspaces behind it."""
+    with AuroraConnection(autocommit=False) as cursor:
+        cursor.execute("SET LOCAL lock_timeout = %s;", [DROP_PARTITION_LOCK_TIMEOUT])
+        cursor.execute(
+            "SELECT to_regclass(%s) IS NOT NULL;", [get_parent_table(workspace)]
+        )
+        if not cursor.fetchone()[0]:
+            return
+
+        cursor.execute(
+            sql.SQL("DROP TABLE IF EXISTS {partition};").format(
+                partition=sql.Identifier(get_partition_name(workspace))
+            )
+        )
+        cursor.execute(
+            sql.SQL("DELETE FROM {partition} WHERE workspace_id = %s;").format(
+                partition=sql.Identifier(get_default_partition(workspace))
+            ),
+            [workspace["workspace_id"]],
+        )
+        cursor.connection.commit()
@@ -0,0 +1,35 @@
+from typing import Optional, Tuple
+from genai_core.aurora.connection import AuroraConnection
+from genai_core.types import CommonError
+
+# pgvector releases that added the index and column types the workspace
+# options use, clusters created on older engine versions can have older ones
+HNSW_VECTOR_VERSION = (0, 5, 0)
+# halfvec, binary_quantize and bit_hamming_ops
+VECTOR_STORAGE_VERSION = (0, 7, 0)
+
+
+def get_vector_version() -> Optional[Tuple[int, ...]]:
+    """Version of the installed pgvector extension, None without it."""
+    with AuroraConnection() as cursor:
+        cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector';")
+        row = cursor.fetchone()
+
+    if row is None:
+        return None
+
+    return tuple(int(part) for part in row[0].split("."))
+
+
+def validate_vector_version(feature: str, required: Tuple[int, ...]):
+    """Rejects an option the installed pgvector does not support, before the
+    workspace is stored and its table or index creation fails."""
+    version = get_vector_version()
+    if version is not None and version >= required:
+        return
+
+    installed = ".".join(map(str, version)) if version else "no pgvector"
+    raise CommonError(
+        f"{feature} requires pgvector {'.'.join(map(str, required))} or later, "
+        f"the Aurora cluster has {installed}"
+    )
@@ -0,0 +1,117 @@
+from psycopg2 import sql
+from typing import Optional
+from genai_core.types import AuroraIndexType, CommonError
+
+DEFAULT_INDEX_LISTS = 100
+DEFAULT_INDEX_PROBES = 10
+DEFAULT_INDEX_M = 16
+DEFAULT_INDEX_EF_CONSTRUCTION = 64
+DEFAULT_INDEX_EF_SEARCH = 40
+
+# options that change the index itself, the others only apply to queries
+BUILD_OPTIONS = ["index_type", "index_lists", "index_m", "index_ef_construction"]
+
+# pgvector limits
+MAX_INDEX_LISTS = 32768
+MIN_INDEX_M = 2
+MAX_INDEX_M = 100
+MIN_INDEX_EF_CONSTRUCTION = 4
+MAX_INDEX_EF_CONSTRUCTION = 1000
+MAX_INDEX_EF_SEARCH = 1000
+
+
+def get_index_options(workspace: dict) -> dict:
+    """Index options of a workspace, workspaces created before they were
+    configurable have an ivfflat index with 100 lists."""
+    return {
+        "index_type": workspace.get("index_type", AuroraIndexType.IVFFLAT.value),
+        "index_lists": int(workspace.get("index_lists", DEFAULT_INDEX_LISTS)),
+        "index_probes": int(workspace.get("index_probes", DEFAULT_INDEX_PROBES)),
+        "index_m": int(workspace.get("index_m", DEFAULT_INDEX_M)),
+        "index_ef_construction": int(
+            workspace.get("index_ef_construction", DEFAULT_INDEX_EF_CONSTRUCTION)
+        ),
+        "index_ef_search": int(
+            workspace.get("index_ef_search", DEFAULT_INDEX_EF_SEARCH)
+        ),
+    }
+
+
+def validate_index_options(
+    index_type: str,
+    index_lists: int,
+    index_m: int,
+    index_ef_construction: int,
+    index_ef_search: int,
+    index_probes: int,
+):
+    if index_type not in [value.value for value in AuroraIndexType]:
+        raise CommonError("Invalid index type")
+
+    if index_lists < 1 or index_lists > MAX_INDEX_LISTS:
+        raise CommonError(f"Index lists must be between 1 and {MAX_INDEX_LISTS}")
+
+    if index_probes < 1 or index_probes > index_lists:
+        raise CommonError("Index probes must be between 1 and the index lists")
+
+    if index_m < MIN_INDEX_M or index_m > MAX_INDEX_M:
+        raise CommonError(f"Index m must be between {MIN_INDEX_M} and {MAX_INDEX_M}")
+
+    if (
+        index_ef_construction < max(MIN_INDEX_EF_CONSTRUCTION, 2 * index_m)
+        or index_ef_construction > MAX_INDEX_EF_CONSTRUCTION
+    ):
+        raise CommonError(
+            f"Index ef_construction must be between twice m and {MAX_INDEX_EF_CONSTRUCTION}"
+        )
+
+    if index_ef_search < 1 or index_ef_search > MAX_INDEX_EF_SEARCH:
+        raise CommonError(
+            f"Index ef_search must be between 1 and {MAX_INDEX_EF_SEARCH}"
+        )
+
+
+def set_search_settings(
+    cursor,
+    workspace: dict,
+    candidates: int,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+):
+    """SET LOCAL the recall settings of the workspace index for the current
+    transaction. Request values take precedence over the workspace ones."""
+    if not workspace.get("has_index"):
+        return
+
+    index_type = workspace.get("index_type", AuroraIndexType.IVFFLAT.value)
+    if index_type == AuroraIndexType.HNSW.value:
+        ef_search = ef_search or workspace.get("index_ef_search")
+        if ef_search is None:
+            return
+
+        # hnsw returns at most ef_search rows
+        ef_search = min(max(int(ef_search), candidates), MAX_INDEX_EF_SEARCH)
+        cursor.execute("SET LOCAL hnsw.ef_search = %s;", [ef_search])
+    else:
+        probes = probes or workspace.get("index_probes")
+        if probes is None:
+            return
+
+        lists = int(workspace.get("index_lists", DEFAULT_INDEX_LISTS))
+        cursor.execute(
+            "SET LOCAL ivfflat.probes = %s;", [min(max(int(probes), 1), lists)]
+        )
+
+
+def get_vector_index_names(cursor, table_name: str) -> list:
+    cursor.execute(
+        """SELECT indexname FROM pg_indexes WHERE tablename = %s
+            AND (indexdef LIKE '%%USING ivfflat%%' OR indexdef LIKE '%%USING hnsw%%');""",
+        [table_name],
+    )
+
+    return [row[0] for row in cursor.fetchall()]
+
+
+def get_index_method(index_type: str) -> sql.SQL:
+    return sql.SQL(AuroraIndexType(index_type).value)
@@ -0,0 +1,95 @@
+from psycopg2 import sql
+from typing import Optional
+from genai_core.types import AuroraTableLayout, VectorStorage
+from genai_core.vector_storage import get_vector_dimensions, get_vector_storage
+
+# Shared chunk tables, list partitioned by workspace_id. The column type has
+# no dimensions so workspaces of every embeddings model fit in one table.
+PARTITIONED_TABLES = {
+    VectorStorage.FULL: "workspace_chunks",
+    VectorStorage.HALF: "workspace_chunks_halfvec",
+    VectorStorage.BINARY: "workspace_chunks",
+}
+
+DEFAULT_PARTITION_SUFFIX = "_default"
+
+
+def get_table_layout(workspace: dict) -> AuroraTableLayout:
+    # workspaces created before the option have a table of their own
+    return AuroraTableLayout(
+        workspace.get("table_layout", AuroraTableLayout.TABLE.value)
+    )
+
+
+def is_partitioned(workspace: dict) -> bool:
+    return get_table_layout(workspace) == AuroraTableLayout.PARTITIONED
+
+
+def get_workspace_table(workspace: dict) -> str:
+    """Table of a workspace with the table layout."""
+    return workspace["workspace_id"].replace("-", "")
+
+
+def get_parent_table(workspace: dict) -> str:
+    return PARTITIONED_TABLES[get_vector_storage(workspace)]
+
+
+def get_default_partition(workspace: dict) -> str:
+    return get_parent_table(workspace) + DEFAULT_PARTITION_SUFFIX
+
+
+def get_partition_name(workspace: dict) -> str:
+    """Dedicated partition of a workspace, small workspaces share the
+    default partition."""
+    return f"{get_parent_table(workspace)}_{get_workspace_table(workspace)}"
+
+
+def get_chunks_table(workspace: dict) -> str:
+    """Table the chunks of a workspace are inserted into and queried from."""
+    if is_partitioned(workspace):
+        return get_parent_table(workspace)
+
+    return get_workspace_table(workspace)
+
+
+def get_index_table(workspace: dict) -> str:
+    """Table the vector and keyword indexes of a workspace are built on."""
+    if is_partitioned(workspace):
+        return get_partition_name(workspace)
+
+    return get_workspace_table(workspace)
+
+
+def has_partition(cursor, workspace: dict) -> bool:
+    cursor.execute(
+        "SELECT to_regclass(%s) IS NOT NULL;", [get_partition_name(workspace)]
+    )
+
+    return cursor.fetchone()[0]
+
+
+def get_embeddings_column(workspace: dict) -> sql.Composable:
+    """The embeddings as the vector indexes see them. The shared tables have
+    no dimensions, their indexes are on a cast to the workspace dimensions
+    and queries have to use the same expression."""
+    if not is_partitioned(workspace):
+        return sql.SQL("content_embeddings")
+
+    vector_type = (
+        "halfvec" if get_vector_storage(workspace) == VectorStorage.HALF else "vector"
+    )
+
+    return sql.SQL("(content_embeddings::{vector_type}({dimensions}))").format(
+        vector_type=sql.SQL(vector_type),
+        dimensions=sql.Literal(get_vector_dimensions(workspace)),
+    )
+
+
+def get_workspace_condition(workspace: dict) -> Optional[sql.Composable]:
+    """Prunes the partitions of the shared table at plan time."""
+    if not is_partitioned(workspace):
+        return None
+
+    return sql.SQL("workspace_id = {workspace_id}::uuid").format(
+        workspace_id=sql.Literal(workspace["workspace_id"])
+    )
@@ -0,0 +1,191 @@
+import os
+import math
+from psycopg2 import sql
+from datetime import datetime
+from typing import Optional
+from genai_core.aurora.centroids import rebuild_document_centroids
+from genai_core.aurora.connection import AuroraConnection
+from genai_core.aurora.create import (
+    create_filter_indexes,
+    create_vector_index,
+    migrate_tsvector_columns,
+    rebuild_vector_index,
+)
+from genai_core.aurora.index import (
+    MAX_INDEX_LISTS,
+    get_index_options,
+    get_vector_index_names,
+)
+from genai_core.aurora.layout import get_index_table, is_partitioned
+from genai_core.aurora.partitions import (
+    AURORA_PARTITION_MIN_ROWS,
+    count_shared_rows,
+    create_workspace_partition,
+)
+from genai_core.types import AuroraIndexType
+
+# Smaller tables keep the lists they were created with
+AURORA_MAINTENANCE_MIN_ROWS = int(
+    os.environ.get("AURORA_MAINTENANCE_MIN_ROWS", "10000")
+)
+# IVFFlat indexes are rebuilt once the recommended lists differ from the
+# current ones by this factor
+AURORA_MAINTENANCE_LISTS_DRIFT = float(
+    os.environ.get("AURORA_MAINTENANCE_LISTS_DRIFT", "2")
+)
+# Tables are vacuumed once dead or changed rows reach this share of the rows
+AURORA_MAINTENANCE_VACUUM_RATIO = float(
+    os.environ.get("AURORA_MAINTENANCE_VACUUM_RATIO", "0.2")
+)
+AURORA_MAINTENANCE_VACUUM_MIN_ROWS = int(
+    os.environ.get("AURORA_MAINTENANCE_VACUUM_MIN_ROWS", "1000")
+)
+
+
+def get_recommended_lists(rows: int) -> int:
+    """pgvector's starting point, rows / 1000 up to 1M rows and sqrt(rows)
+    above."""
+    if rows <= 1000000:
+        lists = rows // 1000
+    else:
+        lists = int(math.sqrt(rows))
+
+    return min(max(lists, 1), MAX_INDEX_LISTS)
+
+
+def get_table_stats(cursor, table_name: str) -> Optional[dict]:
+    cursor.execute(
+        """SELECT n_live_tup, n_dead_tup, n_mod_since_analyze, pg_total_relation_size(relid)
+            FROM pg_stat_user_tables WHERE relname = %s;""",
+        [table_name],
+    )
+
+    row = cursor.fetchone()
+    if row is None:
+        return None
+
+    return {
+        "rows": row[0],
+        "dead_rows": row[1],
+        "modified_rows": row[2],
+        "size_bytes": row[3],
+    }
+
+
+def needs_vacuum(stats: dict) -> bool:
+    changed_rows = max(stats["dead_rows"], stats["modified_rows"])
+    if changed_rows < AURORA_MAINTENANCE_VACUUM_MIN_ROWS:
+        return False
+
+    return changed_rows >= AURORA_MAINTENANCE_VACUUM_RATIO * max(stats["rows"], 1)
+
+
+def maintain_workspace(workspace: dict) -> Optional[dict]:
+    """Vacuums the workspace table after large ingests or deletes, rebuilds
+    an IVFFlat index whose lists no longer fit the table size, and migrates
+    tables created without the filter indexes or still searched through
+    to_tsvector expression indexes. Workspaces of the shared tables get a
+    partition once they are large enough. Document centroids are backfilled
+    for workspaces created before them. An index update of the API is built
+    first and its options applied. Returns the values to record on the
+    workspace item, None if there is no table."""
+    table_name = get_index_table(workspace)
+    timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    ret_value = {"maintenance_checked_at": timestamp}
+    partitioned = is_partitioned(workspace)
+
+    index_update = workspace.get("index_update")
+    if workspace.get("index_status") == "updating" and index_update:
+        print(f"Rebuilding the vector index of {table_name}: {index_update}")
+        workspace = {**workspace, **index_update}
+        rebuild_vector_index(workspace)
+        ret_value.update(index_update)
+        ret_value["index_status"] = "ready"
+        ret_value["index_update"] = None
+
+    if not workspace.get("document_centroids"):
+        print(f"Computing the document centroids of {workspace['workspace_id']}")
+        rebuild_document_centroids(workspace)
+        ret_value["document_centroids"] = True
+
+    # VACUUM can not run in a transaction
+    with AuroraConnection(autocommit=True) as cursor:
+        stats = get_table_stats(cursor, table_name)
+        if stats is None and partitioned:
+            # still in the default partition
+            rows = count_shared_rows(cursor, workspace)
+            ret_value["maintenance_rows"] = rows
+            if rows < AURORA_PARTITION_MIN_ROWS:
+                return ret_value
+
+            print(f"Creating the partition of {workspace['workspace_id']}")
+            create_workspace_partition(workspace)
+            ret_value["maintenance_partitioned_at"] = timestamp
+            return ret_value
+
+        if stats is None:
+            return None
+
+        if needs_vacuum(stats):
+            print(f"Vacuuming {table_name}: {stats}")
+            cursor.execute(
+                sql.SQL("VACUUM ANALYZE {table};").format(
+                    table=sql.Identifier(table_name)
+                )
+            )
+            ret_value["maintenance_vacuumed_at"] = timestamp
+            stats = get_table_stats(cursor, table_name)
+
+        if (
+            partitioned
+            and workspace.get("has_index")
+            and not get_vector_index_names(cursor, table_name)
+        ):
+            # the build after the partition was attached did not finish
+            print(f"Creating the vector index of {table_name}")
+            create_vector_index(cursor, workspace, concurrently=True)
+
+        if not partitioned and not workspace.get("filter_indexes"):
+            print(f"Creating the search filter indexes of {table_name}")
+            create_filter_indexes(cursor, workspace, concurrently=True)
+            ret_value["filter_indexes"] = True
+
+    if (
+        not partitioned
+        and workspace.get("hybrid_search")
+        and not workspace.get("tsvector_columns")
+    ):
+        print(f"Migrating {table_name} to tsvector columns")
+        migrate_tsvector_columns(workspace)
+        ret_value["tsvector_columns"] = True
+
+    ret_value["maintenance_rows"] = stats["rows"]
+    ret_value["maintenance_dead_rows"] = stats["dead_rows"]
+    ret_value["maintenance_size_bytes"] = stats["size_bytes"]
+
+    options = get_index_options(workspace)
+    if (
+        not workspace.get("has_index")
+        or options["index_type"] != AuroraIndexType.IVFFLAT.value
+        or stats["rows"] < AURORA_MAINTENANCE_MIN_ROWS
+    ):
+        return ret_value
+
+    lists = options["index_lists"]
+    recommended_lists = get_recommended_lists(stats["rows"])
+    drift = max(lists, recommended_lists) / min(lists, recommended_lists)
+    if drift < AURORA_MAINTENANCE_LISTS_DRIFT:
+        return ret_value
+
+    print(f"Rebuilding {table_name} with {recommended_lists} lists, was {lists}")
+    rebuild_vector_index({**workspace, "index_lists": recommended_lists})
+
+    ret_value["maintenance_reindexed_at"] = timestamp
+    ret_value["index_lists"] = recommended_lists
+    # at least sqrt(lists) probes so recall does not drop with more lists
+    ret_value["index_probes"] = min(
+        max(options["index_probes"], int(math.sqrt(recommended_lists))),
+        recommended_lists,
+    )
+
+    return ret_value
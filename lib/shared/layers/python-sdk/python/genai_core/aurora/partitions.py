@@ -0,0 +1,317 @@
+import os
+from psycopg2 import sql
+from typing import Optional
+from genai_core.aurora.connection import AuroraConnection
+from genai_core.aurora.create import (
+    create_keyword_indexes,
+    create_shared_indexes,
+    create_shared_table,
+    create_vector_index,
+)
+from genai_core.aurora.layout import (
+    get_default_partition,
+    get_parent_table,
+    get_partition_name,
+    get_workspace_table,
+)
+from genai_core.types import AuroraTableLayout
+
+# Workspaces of the shared tables get a partition with their own vector and
+# keyword indexes at this many rows, smaller ones are searched exactly
+AURORA_PARTITION_MIN_ROWS = int(os.environ.get("AURORA_PARTITION_MIN_ROWS", "10000"))
+# Attaching a partition and adding a constraint to the default partition
+# take an exclusive lock, they do not wait for long queries
+AURORA_PARTITION_LOCK_TIMEOUT = "10s"
+# Constraint of the default partition that excludes the workspace being
+# attached, attaching skips the scan of the default partition once it is valid
+DEFAULT_EXCLUDE_CONSTRAINT_PREFIX = "exclude_"
+
+SHARED_COLUMNS = [
+    "chunk_id",
+    "document_id",
+    "document_sub_id",
+    "document_type",
+    "document_sub_type",
+    "path",
+    "language",
+    "title",
+    "content",
+    "content_complement",
+    "content_embeddings",
+    "metadata",
+    "created_at",
+]
+
+
+def count_shared_rows(cursor, workspace: dict) -> int:
+    """Rows of a workspace in the default partition."""
+    cursor.execute(
+        sql.SQL("SELECT count(*) FROM {partition} WHERE workspace_id = %s;").format(
+            partition=sql.Identifier(get_default_partition(workspace))
+        ),
+        [workspace["workspace_id"]],
+    )
+
+    return cursor.fetchone()[0]
+
+
+def lock_workspace_writes(cursor, workspace: dict):
+    """Makes a transaction that changes the chunks of a workspace wait while
+    the workspace gets a partition, from the default partition or from a
+    table of its own."""
+    cursor.execute(
+        "SELECT pg_advisory_xact_lock_shared(hashtext(%s));",
+        [_get_lock_key(workspace)],
+    )
+
+
+def create_workspace_partition(workspace: dict, source_table: Optional[str] = None):
+    """Gives a workspace of the shared tables a partition of its own. The rows
+    are moved out of the default partition, or copied from source_table and
+    the table dropped. The vector and keyword indexes are built once the
+    partition is attached, searches scan it exactly until then.
+
+    Attaching would scan the whole default partition under an exclusive lock,
+    a constraint that excludes the workspace is validated on it first, which
+    only blocks schema changes. Writes of the workspace wait for the whole
+    move, its searches miss the moved rows until the partition is attached."""
+    workspace = {**workspace, "table_layout": AuroraTableLayout.PARTITIONED.value}
+
+    with AuroraConnection(autocommit=False) as cursor:
+        # session level, it outlives the transactions of the move
+        cursor.execute(
+            "SELECT pg_advisory_lock(hashtext(%s));", [_get_lock_key(workspace)]
+        )
+        cursor.connection.commit()
+
+        try:
+            rows = _move_workspace_rows(cursor, workspace, source_table)
+            _attach_workspace_partition(cursor, workspace, source_table)
+        except Exception:
+            cursor.connection.rollback()
+            _restore_workspace_rows(cursor, workspace, source_table)
+            raise
+        finally:
+            cursor.execute(
+                "SELECT pg_advisory_unlock(hashtext(%s));", [_get_lock_key(workspace)]
+            )
+            cursor.connection.commit()
+
+    create_partition_indexes(workspace)
+    print(f"Created partition {get_partition_name(workspace)} with {rows} rows")
+
+    return rows
+
+
+def _move_workspace_rows(cursor, workspace: dict, source_table: Optional[str]):
+    workspace_id = workspace["workspace_id"]
+    partition = sql.Identifier(get_partition_name(workspace))
+    default = sql.Identifier(get_default_partition(workspace))
+
+    cursor.execute("SET LOCAL lock_timeout = %s;", [AURORA_PARTITION_LOCK_TIMEOUT])
+    create_shared_table(cursor, workspace)
+    # the check constraint spares attaching a scan of the partition
+    cursor.execute(
+        sql.SQL(
+            """CREATE TABLE {partition} (LIKE {table} INCLUDING DEFAULTS);
+            ALTER TABLE {partition} ADD CHECK (workspace_id IS NOT NULL AND workspace_id = %s::uuid);"""
+        ).format(
+            partition=partition, table=sql.Identifier(get_parent_table(workspace))
+        ),
+        [workspace_id],
+    )
+
+    if source_table:
+        _copy_workspace_table(cursor, workspace, source_table, partition)
+    else:
+        cursor.execute(
+            sql.SQL(
+                """WITH moved AS (
+                    DELETE FROM {default} WHERE workspace_id = %s RETURNING *
+                ) INSERT INTO {partition} SELECT * FROM moved;"""
+            ).format(default=default, partition=partition),
+            [workspace_id],
+        )
+    rows = cursor.rowcount
+
+    cursor.execute(
+        sql.SQL(
+            "ALTER TABLE {partition} ADD PRIMARY KEY (workspace_id, chunk_id);"
+        ).format(partition=partition)
+    )
+    create_shared_indexes(cursor, get_partition_name(workspace))
+    cursor.connection.commit()
+
+    # NOT VALID only takes the lock, VALIDATE scans without blocking writes
+    cursor.execute("SET LOCAL lock_timeout = %s;", [AURORA_PARTITION_LOCK_TIMEOUT])
+    cursor.execute(
+        sql.SQL(
+            "ALTER TABLE {default} ADD CONSTRAINT {constraint} CHECK (workspace_id <> %s::uuid) NOT VALID;"
+        ).format(default=default, constraint=_get_exclude_constraint(workspace)),
+        [workspace_id],
+    )
+    cursor.connection.commit()
+
+    cursor.execute(
+        sql.SQL("ALTER TABLE {default} VALIDATE CONSTRAINT {constraint};").format(
+            default=default, constraint=_get_exclude_constraint(workspace)
+        )
+    )
+    cursor.connection.commit()
+
+    return rows
+
+
+def _attach_workspace_partition(cursor, workspace: dict, source_table: Optional[str]):
+    cursor.execute("SET LOCAL lock_timeout = %s;", [AURORA_PARTITION_LOCK_TIMEOUT])
+    cursor.execute(
+        sql.SQL(
+            "ALTER TABLE {table} ATTACH PARTITION {partition} FOR VALUES IN (%s);"
+        ).format(
+            table=sql.Identifier(get_parent_table(workspace)),
+            partition=sql.Identifier(get_partition_name(workspace)),
+        ),
+        [workspace["workspace_id"]],
+    )
+    # the partition bounds exclude the workspace from now on
+    cursor.execute(
+        sql.SQL("ALTER TABLE {default} DROP CONSTRAINT {constraint};").format(
+            default=sql.Identifier(get_default_partition(workspace)),
+            constraint=_get_exclude_constraint(workspace),
+        )
+    )
+
+    if source_table:
+        cursor.execute(
+            sql.SQL("DROP TABLE {table};").format(table=sql.Identifier(source_table))
+        )
+
+    cursor.connection.commit()
+
+
+def _restore_workspace_rows(cursor, workspace: dict, source_table: Optional[str]):
+    """Moves the rows back to the default partition after a failed move and
+    drops the partition table, rows copied from source_table are only
+    dropped. Nothing is restored once the partition is attached."""
+    partition_name = get_partition_name(workspace)
+    default = sql.Identifier(get_default_partition(workspace))
+
+    try:
+        cursor.execute(
+            """SELECT NOT EXISTS (SELECT 1 FROM pg_inherits
+                WHERE inhrelid = to_regclass(%s)) AND to_regclass(%s) IS NOT NULL;""",
+            [partition_name, partition_name],
+        )
+        if not cursor.fetchone()[0]:
+            cursor.connection.rollback()
+            return
+
+        cursor.execute(
+            sql.SQL(
+                "ALTER TABLE {default} DROP CONSTRAINT IF EXISTS {constraint};"
+            ).format(default=default, constraint=_get_exclude_constraint(workspace))
+        )
+        if not source_table:
+            cursor.execute(
+                sql.SQL(
+                    "INSERT INTO {default} SELECT * FROM {partition} ON CONFLICT DO NOTHING;"
+                ).format(default=default, partition=sql.Identifier(partition_name))
+            )
+        cursor.execute(
+            sql.SQL("DROP TABLE {partition};").format(
+                partition=sql.Identifier(partition_name)
+            )
+        )
+        cursor.connection.commit()
+        print(f"Dropped {partition_name} after a failed move")
+    except Exception as error:
+        cursor.connection.rollback()
+        print(f"Failed to restore the rows of {partition_name}: {error}")
+
+
+def _get_lock_key(workspace: dict) -> str:
+    return f"partition:{workspace['workspace_id']}"
+
+
+def _get_exclude_constraint(workspace: dict) -> sql.Identifier:
+    return sql.Identifier(
+        DEFAULT_EXCLUDE_CONSTRAINT_PREFIX + get_workspace_table(workspace)
+    )
+
+
+def create_partition_indexes(workspace: dict):
+    # CONCURRENTLY can not run in a transaction
+    with AuroraConnection(autocommit=True) as cursor:
+        if workspace["has_index"]:
+            create_vector_index(cursor, workspace, concurrently=True)
+
+        if workspace["hybrid_search"]:
+            create_keyword_indexes(cursor, workspace, concurrently=True)
+
+
+def migrate_workspace_table(workspace: dict) -> dict:
+    """Moves a workspace from a table of its own to the shared tables, small
+    tables to the default partition and large ones to a partition of their
+    own. Writes wait for the copy, the table is dropped in the same
+    transaction. Returns the values to record on the workspace item, until
+    they are recorded the workspace can not be searched."""
+    table_name = get_workspace_table(workspace)
+    partitioned = {**workspace, "table_layout": AuroraTableLayout.PARTITIONED.value}
+    ret_value = {
+        "table_layout": AuroraTableLayout.PARTITIONED.value,
+        "tsvector_columns": False,
+        "filter_indexes": True,
+    }
+
+    with AuroraConnection(autocommit=False) as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL;", [table_name])
+        if not cursor.fetchone()[0]:
+            print(f"{table_name} does not exist, nothing to migrate")
+            return ret_value
+
+        cursor.execute(
+            sql.SQL("SELECT count(*) FROM {table};").format(
+                table=sql.Identifier(table_name)
+            )
+        )
+        rows = cursor.fetchone()[0]
+
+        if rows < AURORA_PARTITION_MIN_ROWS:
+            cursor.execute(
+                "SET LOCAL lock_timeout = %s;", [AURORA_PARTITION_LOCK_TIMEOUT]
+            )
+            create_shared_table(cursor, partitioned)
+            _copy_workspace_table(
+                cursor,
+                partitioned,
+                table_name,
+                sql.Identifier(get_parent_table(partitioned)),
+            )
+            cursor.execute(
+                sql.SQL("DROP TABLE {table};").format(table=sql.Identifier(table_name))
+            )
+            cursor.connection.commit()
+            print(f"Moved {rows} rows of {table_name} to the default partition")
+
+            return ret_value
+
+    create_workspace_partition(partitioned, source_table=table_name)
+
+    return ret_value
+
+
+def _copy_workspace_table(cursor, workspace: dict, source_table: str, target):
+    # generated tsvector columns of the table layout are left out
+    columns = sql.SQL(", ").join(map(sql.Identifier, SHARED_COLUMNS))
+    cursor.execute(
+        sql.SQL("LOCK TABLE {source} IN SHARE MODE;").format(
+            source=sql.Identifier(source_table)
+        )
+    )
+    cursor.execute(
+        sql.SQL(
+            """INSERT INTO {target} (workspace_id, {columns})
+                SELECT %s::uuid, {columns} FROM {source};"""
+        ).format(target=target, columns=columns, source=sql.Identifier(source_table)),
+        [workspace["workspace_id"]],
+    )
@@ -1,16 +1,68 @@
+import os
+import json
 import numpy as np
 import genai_core.embeddings
 import genai_core.cross_encoder
 import genai_core.utils.comprehend
-from typing import List
+import genai_core.document_centroids
+from datetime import datetime
+from typing import List, Optional, Tuple
 from psycopg2 import sql
-from genai_core.aurora.connection import AuroraConnection
-from genai_core.aurora.utils import convert_types
+from genai_core.aurora.centroids import DOCUMENT_CENTROIDS_TABLE
+from genai_core.aurora.connection import AuroraConnection, execute_prepared
+from genai_core.aurora.create import get_tsvector_column, has_tsvector_column
+from genai_core.aurora.index import set_search_settings
+from genai_core.aurora.layout import (
+    get_chunks_table,
+    get_embeddings_column,
+    get_workspace_condition,
+)
+from genai_core.aurora.utils import convert_types, format_uuids, format_vector
 from aws_lambda_powertools import Logger
-from genai_core.types import CommonError, Task
+from genai_core.types import (
+    CommonError,
+    HybridFusion,
+    RetrievalMode,
+    Task,
+    VectorStorage,
+)
+from genai_core.vector_storage import (
+    BINARY_RESCORE_FACTOR,
+    get_vector_dimensions,
+    get_vector_storage,
+    prepare_embeddings,
+)
 
 logger = Logger()
 
+DISTANCE_OPERATORS = {"cosine": "<=>", "l2": "<->", "inner": "<#>"}
+# Reciprocal rank fusion constant, the score of a rank is 1 / (k + rank)
+RRF_K = 60
+DEFAULT_FUSION_WEIGHT = 0.5
+# Workspaces updated this recently, by an ingest for example, are searched on
+# the writer until the readers have the new chunks. 0 always uses the readers
+AURORA_READ_YOUR_WRITES_SECONDS = int(
+    os.environ.get("AURORA_READ_YOUR_WRITES_SECONDS", "0")
+)
+
+# Sorts after every character, byte wise in UTF-8 as text_pattern_ops compares
+PATH_PREFIX_UPPER_BOUND = "\U0010ffff"
+
+RECORD_COLUMNS = sql.SQL(
+    """chunk_id, 
+        workspace_id,
+        document_id, 
+        document_sub_id, 
+        document_type,
+        document_sub_type,
+        path,
+        language,
+        title,
+        content,
+        content_complement,
+        metadata"""
+)
+
 
 def query_workspace_aurora(
     workspace_id: str,
@@ -19,8 +71,16 @@ def query_workspace_aurora(
     limit: int,
     full_response: bool,
     threshold: int = 0,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    filters: Optional[dict] = None,
+    retrieval_mode: Optional[str] = None,
+    retrieval_documents: Optional[int] = None,
 ):
-    table_name = sql.Identifier(workspace_id.replace("-", ""))
+    """In the documents retrieval mode the closest documents are found by
+    their centroids first, the vector search then only ranks their chunks.
+    The keyword search always covers the whole workspace."""
+    table_name = sql.Identifier(get_chunks_table(workspace))
     embeddings_model_provider = workspace["embeddings_model_provider"]
     embeddings_model_name = workspace["embeddings_model_name"]
     cross_encoder_model_provider = workspace["cross_encoder_model_provider"]
@@ -30,6 +90,10 @@ def query_workspace_aurora(
     languages = workspace["languages"]
     vector_search_limit = 25
     keyword_search_limit = 25
+    conditions, condition_params = _search_conditions(workspace, filters)
+    mode, documents_limit = genai_core.document_centroids.get_retrieval_options(
+        workspace, retrieval_mode, retrieval_documents
+    )
 
     selected_model = genai_core.embeddings.get_embeddings_model(
         embeddings_model_provider, embeddings_model_name
@@ -47,145 +111,90 @@ def query_workspace_aurora(
 
     query_embeddings = genai_core.embeddings.generate_embeddings(
         selected_model, [query], Task.RETRIEVE
-    )[0]
+    )
+    query_embeddings = prepare_embeddings(workspace, query_embeddings)[0]
 
     language_name, detected_languages = genai_core.utils.comprehend.get_query_language(
         query, languages
     )
 
-    items = []
-    vector_search_records = []
-    keyword_search_records = []
-    with AuroraConnection() as cursor:
-        if metric == "cosine":
-            cursor.execute(
-                sql.SQL(
-                    """SELECT chunk_id, 
-                        workspace_id,
-                        document_id, 
-                        document_sub_id, 
-                        document_type,
-                        document_sub_type,
-                        path,
-                        language,
-                        title,
-                        content,
-                        content_complement,
-                        metadata,
-                        content_embeddings <=> %s AS vector_search_score 
-                FROM {table} ORDER BY vector_search_score LIMIT %s;"""
-                ).format(table=table_name),
-                [np.array(query_embeddings), vector_search_limit],
-            )
-        elif metric == "l2":
-            cursor.execute(
-                sql.SQL(
-                    """SELECT chunk_id, 
-                        workspace_id,
-                        document_id, 
-                        document_sub_id, 
-                        document_type,
-                        document_sub_type,
-                        path,
-                        language,
-                        title,
-                        content,
-                        content_complement,
-                        metadata,
-                        content_embeddings <-> %s AS vector_search_score 
-                FROM {table} ORDER BY vector_search_score LIMIT %s;"""
-                ).format(table=table_name),
-                [np.array(query_embeddings), vector_search_limit],
-            )
-        elif metric == "inner":
-            cursor.execute(
-                sql.SQL(
-                    """SELECT chunk_id, 
-                        workspace_id,
-                        document_id, 
-                        document_sub_id, 
-                        document_type,
-                        document_sub_type,
-                        path,
-                        language,
-                        title,
-                        content,
-                        content_complement,
-                        metadata,
-                        content_embeddings <#> %s AS vector_search_score 
-                FROM {table} ORDER BY vector_search_score LIMIT %s;"""
-                ).format(table=table_name),
-                [np.array(query_embeddings), vector_search_limit],
-            )
-        else:
-            raise Exception("Unknown metric")
+    # SET LOCAL only lasts for a transaction, it is rolled back on release
+    with AuroraConnection(
+        autocommit=False, read_only=not _has_recent_writes(workspace)
+    ) as cursor:
+        set_search_settings(
+            cursor,
+            workspace,
+            _vector_search_candidates(workspace, vector_search_limit),
+            ef_search=ef_search,
+            probes=probes,
+        )
 
-        vector_search_records = cursor.fetchall()
-        vector_search_records = _convert_records("vector_search", vector_search_records)
-        items.extend(vector_search_records)
+        vector_conditions, vector_condition_params = conditions, condition_params
+        if mode == RetrievalMode.DOCUMENTS:
+            document_ids = _search_documents(
+                cursor, workspace, metric, query_embeddings, documents_limit, filters
+            )
+            if document_ids:
+                vector_conditions, vector_condition_params = _search_conditions(
+                    workspace,
+                    genai_core.document_centroids.restrict_filters(
+                        filters, document_ids
+                    ),
+                )
+            else:
+                # nothing to select from, the chunks are searched instead
+                mode = RetrievalMode.CHUNKS
 
         if hybrid_search:
-            language = sql.Identifier(language_name)
-
-            cursor.execute(
-                sql.SQL(
-                    """SELECT chunk_id, 
-                            workspace_id,
-                            document_id, 
-                            document_sub_id, 
-                            document_type,
-                            document_sub_type,
-                            path,
-                            language,
-                            title,
-                            content,
-                            content_complement,
-                            metadata,
-                            ts_rank_cd(to_tsvector('{language}', content), query) AS keyword_search_score
-                            FROM {table}, 
-                            plainto_tsquery('{language}', %s) query 
-                            WHERE to_tsvector('{language}', content) @@ query 
-                            ORDER BY keyword_search_score DESC 
-                            LIMIT %s;"""
-                ).format(table=table_name, language=language),
-                [query, keyword_search_limit],
+            # both candidate sets and their fusion in one round trip
+            execute_prepared(
+                cursor,
+                _hybrid_search_query(
+                    table_name,
+                    workspace,
+                    metric,
+                    language_name,
+                    conditions,
+                    vector_conditions,
+                ),
+                _vector_search_params(
+                    workspace,
+                    query_embeddings,
+                    vector_search_limit,
+                    vector_condition_params,
+                )
+                + [query]
+                + condition_params
+                + [keyword_search_limit]
+                + _fusion_params(workspace),
             )
-
-            keyword_search_records = cursor.fetchall()
-            keyword_search_records = _convert_records(
-                "keyword_search", keyword_search_records
+            unique_items = _convert_hybrid_records(cursor.fetchall())
+        else:
+            execute_prepared(
+                cursor,
+                _vector_search_query(
+                    table_name, workspace, metric, RECORD_COLUMNS, vector_conditions
+                ),
+                _vector_search_params(
+                    workspace,
+                    query_embeddings,
+                    vector_search_limit,
+                    vector_condition_params,
+                ),
             )
-            items.extend(keyword_search_records)
+            unique_items = _convert_records("vector_search", cursor.fetchall())
 
-    unique_items = dict({})
-    for item in items:
-        chunk_id = item["chunk_id"]
+    vector_search_records = sorted(
+        [item for item in unique_items if item["vector_search_score"] is not None],
+        key=lambda x: x["vector_search_score"],
+    )
+    keyword_search_records = sorted(
+        [item for item in unique_items if item["keyword_search_score"] is not None],
+        key=lambda x: x["keyword_search_score"],
+        reverse=True,
+    )
 
-        if chunk_id not in unique_items:
-            unique_items[chunk_id] = item
-        else:
-            current = unique_items[chunk_id]
-            for source in item["sources"]:
-                if source not in current["sources"]:
-                    current["sources"].append(source)
-            current["sources"] = sorted(current["sources"])
-
-            for source in current["sources"]:
-                if source not in item["sources"]:
-                    item["sources"].append(source)
-            item["sources"] = sorted(item["sources"])
-
-            if current["vector_search_score"] is None:
-                current["vector_search_score"] = item["vector_search_score"]
-            if current["keyword_search_score"] is None:
-                current["keyword_search_score"] = item["keyword_search_score"]
-
-            if item["vector_search_score"] is None:
-                item["vector_search_score"] = current["vector_search_score"]
-            if item["keyword_search_score"] is None:
-                item["keyword_search_score"] = current["keyword_search_score"]
-
-    unique_items = list(unique_items.values())
     score_dict = dict({})
     if len(unique_items) > 0:
         passages = [record["content"] for record in unique_items]
@@ -214,6 +223,7 @@ def query_workspace_aurora(
             "detected_languages": detected_languages,
             "items": convert_types(unique_items),
             "vector_search_metric": metric,
+            "retrieval_mode": mode.value,
             "vector_search_items": convert_types(vector_search_records),
             "keyword_search_items": convert_types(keyword_search_records),
         }
@@ -265,6 +275,339 @@ def query_workspace_aurora(
     return ret_value
 
 
+def _vector_search_query(
+    table_name: sql.Identifier,
+    workspace: dict,
+    metric: str,
+    columns: sql.Composable,
+    conditions: Optional[sql.Composable] = None,
+):
+    if metric not in DISTANCE_OPERATORS:
+        raise Exception("Unknown metric")
+
+    operator = sql.SQL(DISTANCE_OPERATORS[metric])
+    vector_storage = get_vector_storage(workspace)
+    where = sql.SQL("")
+    if conditions:
+        where = sql.SQL("WHERE {conditions}").format(conditions=conditions)
+
+    if vector_storage == VectorStorage.BINARY:
+        # coarse search on the bit index, then rescore with the full vectors
+        return sql.SQL(
+            """SELECT {columns},
+                    content_embeddings {operator} %s::vector AS vector_search_score 
+            FROM (
+                SELECT * FROM {table} {where} 
+                ORDER BY binary_quantize(content_embeddings)::bit({dimensions}) <~> binary_quantize(%s::vector) 
+                LIMIT %s
+            ) candidates ORDER BY vector_search_score LIMIT %s"""
+        ).format(
+            table=table_name,
+            operator=operator,
+            columns=columns,
+            where=where,
+            # a type modifier can not be a parameter of a prepared statement
+            dimensions=sql.Literal(get_vector_dimensions(workspace)),
+        )
+
+    vector_type = "halfvec" if vector_storage == VectorStorage.HALF else "vector"
+
+    return sql.SQL(
+        """SELECT {columns},
+                {embeddings} {operator} %s::{vector_type} AS vector_search_score 
+        FROM {table} {where} ORDER BY vector_search_score LIMIT %s"""
+    ).format(
+        table=table_name,
+        embeddings=get_embeddings_column(workspace),
+        operator=operator,
+        vector_type=sql.SQL(vector_type),
+        columns=columns,
+        where=where,
+    )
+
+
+def _keyword_search_query(
+    table_name: sql.Identifier,
+    workspace: dict,
+    language_name: str,
+    conditions: Optional[sql.Composable] = None,
+):
+    filters = sql.SQL("")
+    if conditions:
+        filters = sql.SQL("AND {conditions}").format(conditions=conditions)
+
+    if has_tsvector_column(workspace, language_name):
+        # ranked from the stored column, nothing is parsed per row
+        return sql.SQL(
+            """SELECT chunk_id,
+                    ts_rank_cd({column}, query) AS keyword_search_score
+                    FROM {table}, 
+                    plainto_tsquery({language}::regconfig, %s) query 
+                    WHERE {column} @@ query {filters} 
+                    ORDER BY keyword_search_score DESC 
+                    LIMIT %s"""
+        ).format(
+            table=table_name,
+            column=sql.Identifier(get_tsvector_column(language_name)),
+            language=sql.Literal(language_name),
+            filters=filters,
+        )
+
+    language = sql.Identifier(language_name)
+
+    return sql.SQL(
+        """SELECT chunk_id,
+                ts_rank_cd(to_tsvector('{language}', content), query) AS keyword_search_score
+                FROM {table}, 
+                plainto_tsquery('{language}', %s) query 
+                WHERE to_tsvector('{language}', content) @@ query {filters} 
+                ORDER BY keyword_search_score DESC 
+                LIMIT %s"""
+    ).format(table=table_name, language=language, filters=filters)
+
+
+def _hybrid_search_query(
+    table_name: sql.Identifier,
+    workspace: dict,
+    metric: str,
+    language_name: str,
+    conditions: Optional[sql.Composable] = None,
+    vector_conditions: Optional[sql.Composable] = None,
+):
+    """Vector and keyword candidates fused in SQL, one row per chunk with the
+    score of each search that found it and the fusion score. The vector
+    search uses vector_conditions when they are given, the parameters of
+    the conditions follow the query vector and the query text."""
+    if _get_hybrid_fusion(workspace) == HybridFusion.WEIGHTED:
+        # min-max normalized scores, distances are lower for better matches
+        fusion = sql.SQL(
+            "%s * COALESCE(vector_search_norm, 0) + %s * COALESCE(keyword_search_norm, 0)"
+        )
+    else:
+        fusion = sql.SQL(
+            "COALESCE(1.0 / (%s + vector_search_rank), 0) + COALESCE(1.0 / (%s + keyword_search_rank), 0)"
+        )
+
+    workspace_condition = get_workspace_condition(workspace)
+    where = sql.SQL("")
+    if workspace_condition:
+        where = sql.SQL("WHERE {condition}").format(condition=workspace_condition)
+
+    return sql.SQL(
+        """WITH vector_search AS (
+            SELECT chunk_id, 
+                vector_search_score,
+                ROW_NUMBER() OVER (ORDER BY vector_search_score) AS vector_search_rank,
+                COALESCE(
+                    (MAX(vector_search_score) OVER () - vector_search_score) 
+                    / NULLIF(MAX(vector_search_score) OVER () - MIN(vector_search_score) OVER (), 0), 
+                    1
+                ) AS vector_search_norm
+            FROM ({vector_search}) vector_candidates
+        ), keyword_search AS (
+            SELECT chunk_id, 
+                keyword_search_score,
+                ROW_NUMBER() OVER (ORDER BY keyword_search_score DESC) AS keyword_search_rank,
+                COALESCE(
+                    (keyword_search_score - MIN(keyword_search_score) OVER ()) 
+                    / NULLIF(MAX(keyword_search_score) OVER () - MIN(keyword_search_score) OVER (), 0), 
+                    1
+                ) AS keyword_search_norm
+            FROM ({keyword_search}) keyword_candidates
+        ), fused AS (
+            SELECT chunk_id, 
+                vector_search_score, 
+                keyword_search_score, 
+                ({fusion})::float AS fusion_score
+            FROM vector_search FULL OUTER JOIN keyword_search USING (chunk_id)
+        )
+        SELECT {columns}, 
+            fused.vector_search_score, 
+            fused.keyword_search_score, 
+            fused.fusion_score
+        FROM fused JOIN {table} USING (chunk_id) {where} 
+        ORDER BY fused.fusion_score DESC;"""
+    ).format(
+        vector_search=_vector_search_query(
+            table_name,
+            workspace,
+            metric,
+            sql.SQL("chunk_id"),
+            vector_conditions or conditions,
+        ),
+        keyword_search=_keyword_search_query(
+            table_name, workspace, language_name, conditions
+        ),
+        fusion=fusion,
+        columns=RECORD_COLUMNS,
+        table=table_name,
+        where=where,
+    )
+
+
+def _search_documents(
+    cursor,
+    workspace: dict,
+    metric: str,
+    query_embeddings: np.ndarray,
+    limit: int,
+    filters: Optional[dict],
+) -> List[str]:
+    """The documents with the closest centroids, a document is as close as
+    its closest representative vector."""
+    document_ids = filters.get("document_id") if filters else None
+    execute_prepared(
+        cursor,
+        _document_search_query(metric, document_ids is not None),
+        [workspace["workspace_id"]]
+        + ([format_uuids(document_ids)] if document_ids is not None else [])
+        + [format_vector(query_embeddings), limit],
+    )
+
+    return [str(row[0]) for row in cursor.fetchall()]
+
+
+def _document_search_query(metric: str, document_filter: bool):
+    if metric not in DISTANCE_OPERATORS:
+        raise Exception("Unknown metric")
+
+    # the other filters are chunk columns, the chunk search applies them
+    document_condition = sql.SQL("")
+    if document_filter:
+        document_condition = sql.SQL("AND document_id = ANY(%s::uuid[])")
+
+    return sql.SQL(
+        """SELECT document_id FROM {table} 
+            WHERE workspace_id = %s {document_condition} 
+            GROUP BY document_id 
+            ORDER BY MIN(centroid {operator} %s::vector) 
+            LIMIT %s"""
+    ).format(
+        table=sql.Identifier(DOCUMENT_CENTROIDS_TABLE),
+        document_condition=document_condition,
+        operator=sql.SQL(DISTANCE_OPERATORS[metric]),
+    )
+
+
+def _search_conditions(
+    workspace: dict, filters: Optional[dict]
+) -> Tuple[Optional[sql.Composable], list]:
+    """The conditions of a search and the values of their parameters."""
+    filter_conditions, params = _filter_conditions(filters)
+    conditions = [
+        condition
+        for condition in [get_workspace_condition(workspace), filter_conditions]
+        if condition
+    ]
+    if not conditions:
+        return None, params
+
+    return sql.SQL(" AND ").join(conditions), params
+
+
+def _filter_conditions(
+    filters: Optional[dict],
+) -> Tuple[Optional[sql.Composable], list]:
+    """Predicates of a validated search filter, each one can use an index of
+    the workspace table. The values are parameters, the statement text only
+    depends on the filtered keys and is prepared once for all values."""
+    if not filters:
+        return None, []
+
+    conditions = []
+    params = []
+    if "document_id" in filters:
+        conditions.append(sql.SQL("document_id = ANY(%s::uuid[])"))
+        params.append(format_uuids(filters["document_id"]))
+
+    for key in ["document_type", "document_sub_type"]:
+        if key in filters:
+            conditions.append(
+                sql.SQL("{column} = ANY(%s)").format(column=sql.Identifier(key))
+            )
+            params.append(filters[key])
+
+    if "rss_feed_id" in filters:
+        # a jsonpath match is what the jsonb_path_ops index supports besides
+        # containment, any number of values fit in one parameter
+        conditions.append(sql.SQL("metadata @? %s::jsonpath"))
+        params.append(
+            "$.rss_feed_id ? ({values})".format(
+                values=" || ".join(
+                    f"@ == {json.dumps(value)}" for value in filters["rss_feed_id"]
+                )
+            )
+        )
+
+    if "path_prefix" in filters:
+        # LIKE only uses the text_pattern_ops index with a constant prefix, a
+        # range of the same operator class also works with a parameter
+        conditions.append(sql.SQL("path ~>=~ %s AND path ~<~ %s"))
+        params.extend(
+            [filters["path_prefix"], filters["path_prefix"] + PATH_PREFIX_UPPER_BOUND]
+        )
+
+    if "created_after" in filters:
+        conditions.append(sql.SQL("created_at >= %s::timestamp"))
+        params.append(filters["created_after"])
+
+    if "created_before" in filters:
+        conditions.append(sql.SQL("created_at <= %s::timestamp"))
+        params.append(filters["created_before"])
+
+    return sql.SQL(" AND ").join(conditions), params
+
+
+def _has_recent_writes(workspace: dict) -> bool:
+    updated_at = workspace.get("updated_at")
+    if AURORA_READ_YOUR_WRITES_SECONDS <= 0 or not updated_at:
+        return False
+
+    age = datetime.utcnow() - datetime.strptime(updated_at, "%Y-%m-%dT%H:%M:%S.%fZ")
+
+    return age.total_seconds() < AURORA_READ_YOUR_WRITES_SECONDS
+
+
+def _get_hybrid_fusion(workspace: dict) -> HybridFusion:
+    # workspaces created before the option use reciprocal rank fusion
+    return HybridFusion(workspace.get("hybrid_fusion", HybridFusion.RRF.value))
+
+
+def _fusion_params(workspace: dict):
+    if _get_hybrid_fusion(workspace) == HybridFusion.WEIGHTED:
+        weight = float(workspace.get("hybrid_fusion_weight", DEFAULT_FUSION_WEIGHT))
+        return [weight, 1 - weight]
+
+    return [RRF_K, RRF_K]
+
+
+def _vector_search_params(
+    workspace: dict,
+    query_embeddings: np.ndarray,
+    limit: int,
+    condition_params: Optional[list] = None,
+):
+    # in the order of the placeholders, the conditions follow the vector
+    vector = format_vector(query_embeddings)
+    condition_params = condition_params or []
+    if get_vector_storage(workspace) == VectorStorage.BINARY:
+        return (
+            [vector]
+            + condition_params
+            + [vector, _vector_search_candidates(workspace, limit), limit]
+        )
+
+    return [vector] + condition_params + [limit]
+
+
+def _vector_search_candidates(workspace: dict, limit: int) -> int:
+    # rows the index scan has to return
+    if get_vector_storage(workspace) == VectorStorage.BINARY:
+        return limit * BINARY_RESCORE_FACTOR
+
+    return limit
+
+
 def _convert_records(source: str, records: List[dict]):
     converted_records = []
     for record in records:
@@ -297,3 +640,25 @@ def _convert_records(source: str, records: List[dict]):
         converted_records.append(converted)
 
     return converted_records
+
+
+def _convert_hybrid_records(records: List[dict]):
+    converted_records = []
+    for record in records:
+        # the first columns are the same as in a single search
+        converted = _convert_records("vector_search", [record])[0]
+        converted["vector_search_score"] = record[12]
+        converted["keyword_search_score"] = record[13]
+        converted["fusion_score"] = record[14]
+        converted["sources"] = [
+            source
+            for source, score in [
+                ("keyword_search", record[13]),
+                ("vector_search", record[12]),
+            ]
+            if score is not None
+        ]
+
+        converted_records.append(converted)
+
+    return converted_records
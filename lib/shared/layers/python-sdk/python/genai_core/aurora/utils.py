@@ -1,4 +1,5 @@
 import uuid
+import numpy as np
 
 
 def convert_types(data):
@@ -10,3 +11,19 @@ def convert_types(data):
         return str(data)
     else:
         return data
+
+
+def format_uuids(values) -> list:
+    """uuid.UUID values psycopg2 sends as a uuid[] array. A list of str is a
+    text[] array, which EXECUTE of a prepared statement does not convert to
+    the uuid[] of its parameter."""
+    return [
+        value if isinstance(value, uuid.UUID) else uuid.UUID(value) for value in values
+    ]
+
+
+def format_vector(embeddings: np.ndarray) -> str:
+    """pgvector text format with the shortest float32 representations, about
+    half the size of the default adaptation and exact for the stored float4.
+    psycopg2 only sends text parameters."""
+    return "[" + ",".join(map(str, np.asarray(embeddings, dtype=np.float32))) + "]"
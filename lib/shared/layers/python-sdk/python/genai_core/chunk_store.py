@@ -0,0 +1,365 @@
+import os
+import gzip
+import json
+import hashlib
+import boto3
+import botocore
+from typing import Dict, Iterator, List, Optional, Tuple
+
+PROCESSING_BUCKET_NAME = os.environ.get("PROCESSING_BUCKET_NAME", "")
+
+CHUNK_STORE_FORMAT_VERSION = 1
+# Uncompressed bytes per gzip member, the unit fetched by a range GET
+CHUNK_STORE_BLOCK_SIZE = 64 * 1024
+# Multipart upload parts have to be at least 5 MB, except for the last one
+CHUNK_STORE_PART_SIZE = 8 * 1024 * 1024
+
+s3_client = boto3.client("s3")
+
+
+class ChunkStoreWriter(object):
+    """Writes the chunks of a document, or sub document, to a single
+    chunks.jsonl.gz object. Every block of lines is a separate gzip member,
+    so the object is a regular gzip file and the index written next to it
+    maps each chunk to the byte range of its block."""
+
+    def __init__(
+        self,
+        workspace_id: str,
+        document_id: str,
+        document_sub_id: Optional[str] = None,
+        append: bool = False,
+    ):
+        prefix = get_prefix(workspace_id, document_id, document_sub_id)
+        self.pack_key = get_pack_key(prefix)
+        self.index_key = get_index_key(prefix)
+        self.index = {}
+        self.hashes = {}
+        self.signatures = {}
+        self.buffer = bytearray()
+        self.offset = 0
+        self.block = []
+        self.block_ids = []
+        self.block_size = 0
+        self.upload_id = None
+        self.parts = []
+
+        if append:
+            self._load_existing(prefix)
+
+    def write(
+        self,
+        chunk_ids: List[str],
+        chunks: List[str],
+        chunk_hashes: Optional[List[str]] = None,
+        chunk_signatures: Optional[Dict[str, int]] = None,
+    ):
+        if chunk_hashes is None:
+            chunk_hashes = [get_chunk_hash(chunk) for chunk in chunks]
+
+        for chunk_id, signature in (chunk_signatures or {}).items():
+            self.signatures[str(chunk_id)] = f"{signature:016x}"
+
+        for chunk_id, chunk, chunk_hash in zip(chunk_ids, chunks, chunk_hashes):
+            self.hashes[str(chunk_id)] = chunk_hash
+            line = json.dumps({"chunk_id": str(chunk_id), "content": chunk})
+            line = (line + "\n").encode("utf-8")
+
+            self.block.append(line)
+            self.block_ids.append(str(chunk_id))
+            self.block_size += len(line)
+
+            if self.block_size >= CHUNK_STORE_BLOCK_SIZE:
+                self._flush_block()
+
+    def close(self):
+        self._flush_block()
+
+        if self.upload_id is None:
+            s3_client.put_object(
+                Bucket=PROCESSING_BUCKET_NAME,
+                Key=self.pack_key,
+                Body=bytes(self.buffer),
+                ContentType="application/gzip",
+            )
+        else:
+            if self.buffer:
+                self._upload_part()
+
+            s3_client.complete_multipart_upload(
+                Bucket=PROCESSING_BUCKET_NAME,
+                Key=self.pack_key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.parts},
+            )
+
+        s3_client.put_object(
+            Bucket=PROCESSING_BUCKET_NAME,
+            Key=self.index_key,
+            Body=json.dumps(
+                {
+                    "format_version": CHUNK_STORE_FORMAT_VERSION,
+                    "chunks": self.index,
+                    "hashes": self.hashes,
+                    "signatures": self.signatures,
+                }
+            ),
+            ContentType="application/json",
+        )
+
+    def abort(self):
+        if self.upload_id is not None:
+            s3_client.abort_multipart_upload(
+                Bucket=PROCESSING_BUCKET_NAME,
+                Key=self.pack_key,
+                UploadId=self.upload_id,
+            )
+            self.upload_id = None
+
+    def _flush_block(self):
+        if not self.block:
+            return
+
+        data = gzip.compress(b"".join(self.block), mtime=0)
+        for line_number, chunk_id in enumerate(self.block_ids):
+            self.index[chunk_id] = [self.offset, len(data), line_number]
+
+        self.buffer.extend(data)
+        self.offset += len(data)
+        self.block = []
+        self.block_ids = []
+        self.block_size = 0
+
+        if len(self.buffer) >= CHUNK_STORE_PART_SIZE:
+            self._upload_part()
+
+    def _upload_part(self):
+        if self.upload_id is None:
+            response = s3_client.create_multipart_upload(
+                Bucket=PROCESSING_BUCKET_NAME,
+                Key=self.pack_key,
+                ContentType="application/gzip",
+            )
+            self.upload_id = response["UploadId"]
+
+        part_number = len(self.parts) + 1
+        response = s3_client.upload_part(
+            Bucket=PROCESSING_BUCKET_NAME,
+            Key=self.pack_key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=bytes(self.buffer),
+        )
+
+        self.parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+        self.buffer = bytearray()
+
+    def _load_existing(self, prefix: str):
+        index = _get_index(prefix)
+        if index is None:
+            return
+
+        self.index = index["chunks"]
+        self.hashes = index.get("hashes", {})
+        self.signatures = index.get("signatures", {})
+
+        # a large pack is the first part of the upload, copied within S3
+        size = s3_client.head_object(Bucket=PROCESSING_BUCKET_NAME, Key=self.pack_key)[
+            "ContentLength"
+        ]
+        if size < CHUNK_STORE_PART_SIZE:
+            self.buffer.extend(_get_object(self.pack_key))
+        else:
+            self._copy_part(size)
+
+        self.offset = size
+
+    def _copy_part(self, size: int):
+        response = s3_client.create_multipart_upload(
+            Bucket=PROCESSING_BUCKET_NAME,
+            Key=self.pack_key,
+            ContentType="application/gzip",
+        )
+        self.upload_id = response["UploadId"]
+
+        response = s3_client.upload_part_copy(
+            Bucket=PROCESSING_BUCKET_NAME,
+            Key=self.pack_key,
+            UploadId=self.upload_id,
+            PartNumber=1,
+            CopySource={"Bucket": PROCESSING_BUCKET_NAME, "Key": self.pack_key},
+            CopySourceRange=f"bytes=0-{size - 1}",
+        )
+
+        self.parts.append({"ETag": response["CopyPartResult"]["ETag"], "PartNumber": 1})
+
+
+def get_prefix(
+    workspace_id: str, document_id: str, document_sub_id: Optional[str] = None
+) -> str:
+    if document_sub_id:
+        return f"{workspace_id}/{document_id}/{document_sub_id}"
+
+    return f"{workspace_id}/{document_id}"
+
+
+def get_pack_key(prefix: str) -> str:
+    return f"{prefix}/chunks.jsonl.gz"
+
+
+def get_index_key(prefix: str) -> str:
+    return f"{prefix}/chunks.index.json"
+
+
+def get_chunk_hash(content: str, content_complement: Optional[str] = None) -> str:
+    value = (
+        content if content_complement is None else content + "\x00" + content_complement
+    )
+
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def get_chunk_hashes(
+    workspace_id: str, document_id: str, document_sub_id: Optional[str] = None
+) -> Optional[Dict[str, str]]:
+    """Returns the content hash of every stored chunk by chunk id, or None
+    when the chunks were stored without hashes."""
+    index = _get_index(get_prefix(workspace_id, document_id, document_sub_id))
+    if index is None or "hashes" not in index:
+        return None
+
+    return index["hashes"]
+
+
+def get_chunk_signatures(
+    workspace_id: str, document_id: str, document_sub_id: Optional[str] = None
+) -> Dict[str, int]:
+    """Returns the near duplicate signature of every stored chunk by chunk id."""
+    index = _get_index(get_prefix(workspace_id, document_id, document_sub_id))
+    if index is None:
+        return {}
+
+    return {
+        chunk_id: int(signature, 16)
+        for chunk_id, signature in index.get("signatures", {}).items()
+    }
+
+
+def get_chunk(
+    workspace_id: str,
+    document_id: str,
+    document_sub_id: Optional[str],
+    chunk_id: str,
+) -> Optional[str]:
+    chunks = get_chunks(workspace_id, document_id, document_sub_id, [chunk_id])
+
+    return chunks.get(str(chunk_id))
+
+
+def get_chunks(
+    workspace_id: str,
+    document_id: str,
+    document_sub_id: Optional[str],
+    chunk_ids: List[str],
+) -> Dict[str, str]:
+    """Reads the chunks with one range GET per block they are stored in.
+    Chunks missing from the index are read from the per chunk objects, a
+    document ingested before the packed format only has those and appends
+    to it only pack the new chunks."""
+    prefix = get_prefix(workspace_id, document_id, document_sub_id)
+    index = _get_index(prefix)
+    if index is None:
+        return _get_legacy_chunks(prefix, chunk_ids)
+
+    blocks = {}
+    legacy_ids = []
+    for chunk_id in chunk_ids:
+        entry = index["chunks"].get(str(chunk_id))
+        if entry is None:
+            legacy_ids.append(chunk_id)
+            continue
+
+        offset, length, line_number = entry
+        blocks.setdefault((offset, length), []).append((str(chunk_id), line_number))
+
+    ret_value = {}
+    pack_key = get_pack_key(prefix)
+    for (offset, length), entries in blocks.items():
+        data = _get_object(pack_key, f"bytes={offset}-{offset + length - 1}")
+        lines = gzip.decompress(data).splitlines()
+        for chunk_id, line_number in entries:
+            ret_value[chunk_id] = json.loads(lines[line_number])["content"]
+
+    if legacy_ids:
+        ret_value.update(_get_legacy_chunks(prefix, legacy_ids))
+
+    return ret_value
+
+
+def iter_chunks(
+    workspace_id: str, document_id: str, document_sub_id: Optional[str] = None
+) -> Iterator[Tuple[str, str]]:
+    """Yields (chunk_id, content) for every stored chunk, the per chunk
+    objects of a document ingested before the packed format first, then the
+    packed chunks in write order."""
+    prefix = get_prefix(workspace_id, document_id, document_sub_id)
+    index = _get_index(prefix)
+    for chunk_id, content in _iter_legacy_chunks(prefix):
+        if index is None or chunk_id not in index["chunks"]:
+            yield chunk_id, content
+
+    if index is None:
+        return
+
+    data = _get_object(get_pack_key(prefix))
+    for line in gzip.decompress(data).splitlines():
+        record = json.loads(line)
+        yield record["chunk_id"], record["content"]
+
+
+def _get_index(prefix: str) -> Optional[dict]:
+    try:
+        data = _get_object(get_index_key(prefix))
+    except botocore.exceptions.ClientError as error:
+        if error.response["Error"]["Code"] in ["NoSuchKey", "404"]:
+            return None
+        raise
+
+    return json.loads(data)
+
+
+def _get_object(key: str, byte_range: Optional[str] = None) -> bytes:
+    if byte_range:
+        response = s3_client.get_object(
+            Bucket=PROCESSING_BUCKET_NAME, Key=key, Range=byte_range
+        )
+    else:
+        response = s3_client.get_object(Bucket=PROCESSING_BUCKET_NAME, Key=key)
+
+    return response["Body"].read()
+
+
+# Documents ingested before the packed format have one object per chunk
+def _get_legacy_chunks(prefix: str, chunk_ids: List[str]) -> Dict[str, str]:
+    ret_value = {}
+    for chunk_id in chunk_ids:
+        try:
+            data = _get_object(f"{prefix}/chunks/{chunk_id}.txt")
+        except botocore.exceptions.ClientError as error:
+            if error.response["Error"]["Code"] in ["NoSuchKey", "404"]:
+                continue
+            raise
+
+        ret_value[str(chunk_id)] = data.decode("utf-8")
+
+    return ret_value
+
+
+def _iter_legacy_chunks(prefix: str) -> Iterator[Tuple[str, str]]:
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(
+        Bucket=PROCESSING_BUCKET_NAME, Prefix=f"{prefix}/chunks/", Delimiter="/"
+    ):
+        for item in page.get("Contents", []):
+            chunk_id = os.path.basename(item["Key"])[: -len(".txt")]
+            yield chunk_id, _get_object(item["Key"]).decode("utf-8")
@@ -1,16 +1,31 @@
 import os
 import uuid
-import boto3
+import itertools
+import numpy as np
 import genai_core.documents
+import genai_core.chunk_store
+import genai_core.deduplication
 import genai_core.embeddings
 import genai_core.aurora.chunks
+import genai_core.aurora.centroids
 import genai_core.opensearch.chunks
-from genai_core.types import CommonError,Task
-from typing import List, Optional
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import genai_core.vector_storage
+import genai_core.search_filters
+import genai_core.tokenizer
+import genai_core.utils.text_splitter
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from genai_core.types import ChunkingStrategy, CommonError, Task
+from typing import Iterable, Iterator, List, Optional
 
-PROCESSING_BUCKET_NAME = os.environ.get("PROCESSING_BUCKET_NAME", "")
-s3 = boto3.resource("s3")
+CHUNKS_PIPELINE_BATCH_SIZE = int(os.environ.get("CHUNKS_PIPELINE_BATCH_SIZE", "100"))
+CHUNKS_PIPELINE_QUEUE_DEPTH = int(os.environ.get("CHUNKS_PIPELINE_QUEUE_DEPTH", "2"))
+# Content is split in sections of about this many characters so chunks can
+# be produced while the previous ones are embedded
+SPLIT_SECTION_SIZE = 1000000
+# Characters read to find the last chunk_overlap tokens of a section
+SECTION_OVERLAP_TOKEN_CHARS = 16
 
 
 def add_chunks(
@@ -18,19 +33,25 @@ def add_chunks(
     workspace: dict,
     document: dict,
     document_sub_id: Optional[str],
-    chunks: List[str],
-    chunk_complements: List[str],
+    chunks: Iterable[str],
+    chunk_complements: Optional[List[str]],
     path: Optional[str] = None,
+    incremental: bool = False,
 ):
+    """Embeds and stores the chunks in batches. chunks can be a generator,
+    a batch is embedded while the previous ones are written to S3 and the
+    engine, with at most CHUNKS_PIPELINE_QUEUE_DEPTH batches in flight.
+
+    With incremental, chunks whose hash matches a stored chunk keep their
+    id and vector, only new chunks are embedded and only vanished ones are
+    deleted. Documents stored without hashes are replaced instead.
+
+    When the workspace has deduplication, new chunks that are near duplicates
+    of a chunk already in the workspace are skipped before embedding."""
     workspace_id = workspace["workspace_id"]
-    engine = workspace["engine"]
     embeddings_model_provider = workspace["embeddings_model_provider"]
     embeddings_model_name = workspace["embeddings_model_name"]
     document_id = document["document_id"]
-    document_type = document["document_type"]
-    document_sub_type = document["document_sub_type"]
-    path = path if path else document["path"]
-    title = document["title"]
 
     embeddings_model = genai_core.embeddings.get_embeddings_model(
         embeddings_model_provider, embeddings_model_name
@@ -39,16 +60,269 @@ def add_chunks(
     if embeddings_model is None:
         raise CommonError("Embeddings model not found")
 
-    chunk_embeddings = genai_core.embeddings.generate_embeddings(
-        embeddings_model, chunks, Task.STORE.value
+    stored_chunks = {}
+    if incremental:
+        stored_hashes = genai_core.chunk_store.get_chunk_hashes(
+            workspace_id, document_id, document_sub_id
+        )
+
+        if stored_hashes is None:
+            print("No stored chunk hashes, replacing all chunks")
+            incremental = False
+            replace = True
+        else:
+            replace = False
+            for chunk_id, chunk_hash in stored_hashes.items():
+                stored_chunks.setdefault(chunk_hash, []).append(chunk_id)
+
+    near_duplicate_filter = None
+    previous_signatures = {}
+    if genai_core.deduplication.is_enabled(workspace):
+        if replace or incremental:
+            previous_signatures = genai_core.chunk_store.get_chunk_signatures(
+                workspace_id, document_id, document_sub_id
+            )
+
+        near_duplicate_filter = genai_core.deduplication.NearDuplicateFilter(
+            workspace_id, previous_signatures.keys()
+        )
+
+    # one worker each keeps the writes of a stage in order, the first engine
+    # batch removes the previous chunks when replacing
+    s3_executor = ThreadPoolExecutor(max_workers=1)
+    engine_executor = ThreadPoolExecutor(max_workers=1)
+    in_flight = deque()
+    chunk_writer = genai_core.chunk_store.ChunkStoreWriter(
+        workspace_id,
+        document_id,
+        document_sub_id,
+        append=not replace and not incremental,
+    )
+    batch_replace = replace
+    offset = 0
+    kept_vectors = 0
+    # in document order, the centroids of the kept chunks are rebuilt from them
+    kept_chunk_ids = []
+    started_at = datetime.utcnow()
+
+    try:
+        for batch in _get_batches(chunks, CHUNKS_PIPELINE_BATCH_SIZE):
+            complements = [None] * len(batch)
+            if chunk_complements:
+                complements = chunk_complements[offset : offset + len(batch)]
+                complements += [None] * (len(batch) - len(complements))
+            offset += len(batch)
+
+            chunk_hashes = [
+                genai_core.chunk_store.get_chunk_hash(chunk, complement)
+                for chunk, complement in zip(batch, complements)
+            ]
+            chunk_ids = []
+            new_idx = []
+            for idx, chunk_hash in enumerate(chunk_hashes):
+                if stored_chunks.get(chunk_hash):
+                    chunk_ids.append(stored_chunks[chunk_hash].pop())
+                    kept_vectors += 1
+                else:
+                    chunk_ids.append(uuid.uuid4())
+                    new_idx.append(idx)
+
+            chunk_signatures = None
+            if near_duplicate_filter is not None:
+                batch, chunk_ids, chunk_hashes, complements, new_idx = (
+                    _suppress_near_duplicates(
+                        near_duplicate_filter,
+                        batch,
+                        chunk_ids,
+                        chunk_hashes,
+                        complements,
+                        new_idx,
+                    )
+                )
+
+                # kept chunks stay in the document, new ones may match them
+                for chunk_id in chunk_ids:
+                    near_duplicate_filter.ignore_chunk_ids.discard(str(chunk_id))
+
+                chunk_signatures = near_duplicate_filter.get_simhashes(chunk_ids)
+                chunk_signatures.update(
+                    {
+                        str(chunk_id): previous_signatures[str(chunk_id)]
+                        for chunk_id in chunk_ids
+                        if str(chunk_id) in previous_signatures
+                    }
+                )
+
+            new_chunk_idx = set(new_idx)
+            kept_chunk_ids.extend(
+                chunk_id
+                for idx, chunk_id in enumerate(chunk_ids)
+                if idx not in new_chunk_idx
+            )
+
+            s3_future = s3_executor.submit(
+                chunk_writer.write, chunk_ids, batch, chunk_hashes, chunk_signatures
+            )
+            if not new_idx:
+                in_flight.append((s3_future,))
+                continue
+
+            new_chunks = [batch[idx] for idx in new_idx]
+            chunk_embeddings = genai_core.embeddings.generate_embeddings(
+                embeddings_model, new_chunks, Task.STORE.value
+            )
+            chunk_embeddings = genai_core.vector_storage.prepare_embeddings(
+                workspace, chunk_embeddings
+            )
+
+            in_flight.append(
+                (
+                    s3_future,
+                    engine_executor.submit(
+                        _store_chunks_engine,
+                        batch_replace,
+                        workspace,
+                        document,
+                        document_sub_id,
+                        path,
+                        [chunk_ids[idx] for idx in new_idx],
+                        chunk_embeddings,
+                        new_chunks,
+                        [complements[idx] for idx in new_idx],
+                    ),
+                )
+            )
+            if near_duplicate_filter is not None:
+                # signatures are stored once the chunks are in the engine
+                in_flight[-1] += (
+                    engine_executor.submit(
+                        near_duplicate_filter.add,
+                        document_id,
+                        near_duplicate_filter.get_simhashes(
+                            [chunk_ids[idx] for idx in new_idx]
+                        ),
+                    ),
+                )
+            batch_replace = False
+
+            while len(in_flight) > CHUNKS_PIPELINE_QUEUE_DEPTH:
+                _wait_batch(in_flight.popleft())
+
+        while in_flight:
+            _wait_batch(in_flight.popleft())
+
+        if batch_replace:
+            # no chunks, the previous ones still have to be removed
+            _store_chunks_engine(
+                True, workspace, document, document_sub_id, path, [], None, [], None
+            )
+
+        if incremental:
+            removed_ids = [
+                chunk_id
+                for chunk_ids in stored_chunks.values()
+                for chunk_id in chunk_ids
+            ]
+            _remove_chunks_engine(workspace, removed_ids)
+            if removed_ids:
+                # the centroids still include the removed chunks
+                _rebuild_centroids_engine(
+                    workspace, document_id, document_sub_id, kept_chunk_ids, started_at
+                )
+
+            # vectors is 0 when create_document already reset the counters,
+            # the previous count of the document otherwise
+            current_vectors = int(document.get("vectors", 0))
+            genai_core.documents.set_document_vectors(
+                workspace_id, document_id, kept_vectors - current_vectors, replace=False
+            )
+            print(f"Kept {kept_vectors} chunks, removed {len(removed_ids)} chunks")
+
+        if near_duplicate_filter is not None:
+            if incremental:
+                removed_signatures = {
+                    str(chunk_id): previous_signatures[str(chunk_id)]
+                    for chunk_id in removed_ids
+                    if str(chunk_id) in previous_signatures
+                }
+            else:
+                removed_signatures = previous_signatures
+            genai_core.deduplication.remove_signatures(workspace_id, removed_signatures)
+
+            genai_core.documents.set_document_suppressed_chunks(
+                workspace_id,
+                document_id,
+                near_duplicate_filter.suppressed,
+                replace=replace or incremental,
+            )
+            print(
+                f"Checked {near_duplicate_filter.checked} chunks, "
+                f"suppressed {near_duplicate_filter.suppressed} near duplicates"
+            )
+
+        chunk_writer.close()
+    except Exception:
+        s3_executor.shutdown(wait=True, cancel_futures=True)
+        chunk_writer.abort()
+        raise
+    finally:
+        s3_executor.shutdown(wait=True, cancel_futures=True)
+        engine_executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _suppress_near_duplicates(
+    near_duplicate_filter,
+    batch: List[str],
+    chunk_ids: list,
+    chunk_hashes: List[str],
+    complements: list,
+    new_idx: List[int],
+):
+    duplicates = near_duplicate_filter.check(
+        [chunk_ids[idx] for idx in new_idx], [batch[idx] for idx in new_idx]
+    )
+    suppressed = set(
+        idx for idx, duplicate_of in zip(new_idx, duplicates) if duplicate_of
     )
-    chunk_ids = [uuid.uuid4() for _ in chunks]
+    if not suppressed:
+        return batch, chunk_ids, chunk_hashes, complements, new_idx
 
-    store_chunks_on_s3(workspace_id, document_id, document_sub_id, chunk_ids, chunks)
+    # suppressed chunks are neither embedded nor stored
+    stored_idx = [idx for idx in range(len(batch)) if idx not in suppressed]
+    positions = {idx: position for position, idx in enumerate(stored_idx)}
+
+    return (
+        [batch[idx] for idx in stored_idx],
+        [chunk_ids[idx] for idx in stored_idx],
+        [chunk_hashes[idx] for idx in stored_idx],
+        [complements[idx] for idx in stored_idx],
+        [positions[idx] for idx in new_idx if idx not in suppressed],
+    )
+
+
+def _store_chunks_engine(
+    replace: bool,
+    workspace: dict,
+    document: dict,
+    document_sub_id: Optional[str],
+    path: Optional[str],
+    chunk_ids: List[str],
+    chunk_embeddings: Optional[np.ndarray],
+    chunks: List[str],
+    chunk_complements: Optional[List[str]],
+):
+    workspace_id = workspace["workspace_id"]
+    engine = workspace["engine"]
+    document_id = document["document_id"]
+    document_type = document["document_type"]
+    document_sub_type = document["document_sub_type"]
+    path = path if path else document["path"]
+    title = document["title"]
+    metadata = genai_core.search_filters.get_chunk_metadata(document)
 
     if engine == "aurora":
         result = genai_core.aurora.chunks.add_chunks_aurora(
-            workspace_id=workspace_id,
+            workspace=workspace,
             document_id=document_id,
             document_sub_id=document_sub_id,
             document_type=document_type,
@@ -60,10 +334,11 @@ def add_chunks(
             chunks=chunks,
             chunk_complements=chunk_complements,
             replace=replace,
+            metadata=metadata,
         )
     elif engine == "opensearch":
         result = genai_core.opensearch.chunks.add_chunks_open_search(
-            workspace_id=workspace_id,
+            workspace=workspace,
             document_id=document_id,
             document_sub_id=document_sub_id,
             document_type=document_type,
@@ -75,6 +350,7 @@ def add_chunks(
             chunks=chunks,
             chunk_complements=chunk_complements,
             replace=replace,
+            metadata=metadata,
         )
     else:
         raise CommonError("Engine not supported")
@@ -85,36 +361,137 @@ def add_chunks(
     )
 
 
+def _remove_chunks_engine(workspace: dict, chunk_ids: List[str]):
+    workspace_id = workspace["workspace_id"]
+    engine = workspace["engine"]
+
+    if not chunk_ids:
+        return
+
+    if engine == "aurora":
+        genai_core.aurora.chunks.delete_chunks_aurora(workspace, chunk_ids)
+    elif engine == "opensearch":
+        genai_core.opensearch.chunks.delete_chunks_open_search(workspace_id, chunk_ids)
+    else:
+        raise CommonError("Engine not supported")
+
+
+def _rebuild_centroids_engine(
+    workspace: dict,
+    document_id: str,
+    document_sub_id: Optional[str],
+    kept_chunk_ids: List[str],
+    started_at: datetime,
+):
+    engine = workspace["engine"]
+
+    if engine == "aurora":
+        genai_core.aurora.centroids.rebuild_document_centroids(workspace, document_id)
+    elif engine == "opensearch":
+        genai_core.opensearch.chunks.rebuild_document_centroids_open_search(
+            workspace, document_id, document_sub_id, kept_chunk_ids, started_at
+        )
+    else:
+        raise CommonError("Engine not supported")
+
+
+def _wait_batch(futures):
+    for future in futures:
+        future.result()
+
+
+def _get_batches(values: Iterable[str], batch_size: int) -> Iterator[List[str]]:
+    iterator = iter(values)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+
+        yield batch
+
+
 def split_content(workspace: dict, content: str):
     chunking_strategy = workspace["chunking_strategy"]
     chunk_size = workspace["chunk_size"]
     chunk_overlap = workspace["chunk_overlap"]
 
-    if chunking_strategy == "recursive":
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len
+    # same length as NUL so the chunk boundaries do not change
+    if "\x00" in content:
+        content = content.replace("\x00", "\ufffd")
+
+    if chunking_strategy == ChunkingStrategy.RECURSIVE.value:
+        return genai_core.utils.text_splitter.split_text(
+            content, int(chunk_size), int(chunk_overlap)
         )
 
-        text_data = text_splitter.split_text(content)
-        text_data = [text.replace("\x00", "\uFFFD") for text in text_data]
+    if chunking_strategy in [
+        ChunkingStrategy.TOKEN.value,
+        ChunkingStrategy.SENTENCE.value,
+    ]:
+        # sizes are in tokens of the workspace embeddings model
+        offsets = _get_tokenizer(workspace).get_offsets(content)
+
+        if chunking_strategy == ChunkingStrategy.TOKEN.value:
+            return genai_core.utils.text_splitter.split_text_by_tokens(
+                content, offsets, int(chunk_size), int(chunk_overlap)
+            )
 
-        return text_data
+        return genai_core.utils.text_splitter.split_text_by_sentences(
+            content, offsets, int(chunk_size), int(chunk_overlap)
+        )
 
     raise CommonError("Chunking strategy not supported")
 
 
-def store_chunks_on_s3(
-    workspace_id: str,
-    document_id: str,
-    document_sub_id: Optional[str],
-    chunk_ids: List[str],
-    chunks: List[str],
-):
-    for chunk_id, chunk in zip(chunk_ids, chunks):
-        path = f"{workspace_id}/{document_id}/chunks/{chunk_id}.txt"
-        if document_sub_id:
-            path = (
-                f"{workspace_id}/{document_id}/{document_sub_id}/chunks/{chunk_id}.txt"
-            )
+def _get_tokenizer(workspace: dict):
+    embeddings_model = genai_core.embeddings.get_embeddings_model(
+        workspace["embeddings_model_provider"], workspace["embeddings_model_name"]
+    )
+    if embeddings_model is None:
+        raise CommonError("Embeddings model not found")
+
+    return genai_core.tokenizer.get_tokenizer(embeddings_model)
+
+
+def iter_split_content(workspace: dict, content: str) -> Iterator[str]:
+    """Yields the chunks of split_content section by section. Sections end
+    on a paragraph break, the first separator of the splitter, and the next
+    section starts with the last chunk_overlap of the previous one so the
+    first chunk of a section overlaps like the others."""
+    start = 0
+    while start < len(content):
+        end = start + SPLIT_SECTION_SIZE
+        if end >= len(content):
+            end = len(content)
+        else:
+            paragraph_break = content.rfind("\n\n", start, end)
+            if paragraph_break > start:
+                end = paragraph_break + 2
+
+        section = content[start:end]
+        yield from split_content(workspace, section)
+        if end == len(content):
+            break
+
+        start = end - _get_section_overlap(workspace, section)
+
+
+def _get_section_overlap(workspace: dict, section: str) -> int:
+    """Length of the end of a section the next one starts with, the last
+    chunk_overlap characters from a word boundary or the last chunk_overlap
+    tokens."""
+    chunk_overlap = int(workspace["chunk_overlap"])
+    if chunk_overlap <= 0:
+        return 0
+
+    if workspace["chunking_strategy"] == ChunkingStrategy.RECURSIVE.value:
+        cut = max(1, len(section) - chunk_overlap)
+        while cut < len(section) and not section[cut - 1].isspace():
+            cut += 1
+    else:
+        cut = max(1, len(section) - chunk_overlap * SECTION_OVERLAP_TOKEN_CHARS)
+        offsets = _get_tokenizer(workspace).get_offsets(section[cut:])
+        if len(offsets) > chunk_overlap:
+            cut += offsets[-chunk_overlap][0]
 
-        s3.Object(PROCESSING_BUCKET_NAME, path).put(Body=chunk)
+    return len(section) - cut
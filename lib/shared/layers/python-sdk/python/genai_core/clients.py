@@ -18,8 +18,8 @@ def get_openai_client():
     return openai
 
 
-def get_sagemaker_client():
-    config = Config(retries={"max_attempts": 15, "mode": "adaptive"})
+def get_sagemaker_client(max_attempts: int = 15):
+    config = Config(retries={"max_attempts": max_attempts, "mode": "adaptive"})
 
     client = boto3.client("sagemaker-runtime", config=config)
 
@@ -1,11 +1,9 @@
 import os
-import json
 import genai_core.types
-import genai_core.clients
 import genai_core.parameters
+import genai_core.sagemaker_endpoint
 from typing import List, Optional
 
-
 SAGEMAKER_RAG_MODELS_ENDPOINT = os.environ.get("SAGEMAKER_RAG_MODELS_ENDPOINT")
 
 
@@ -19,7 +17,7 @@ def rank_passages(
     if model.provider == "sagemaker":
         return _rank_passages_sagemaker(model, input, passages)
 
-    raise genai_core.typesCommonError(f"Unknown provider")
+    raise genai_core.types.CommonError(f"Unknown provider: {model.provider}")
 
 
 def get_cross_encoder_models():
@@ -48,21 +46,11 @@ def get_cross_encoder_model(
 def _rank_passages_sagemaker(
     model: genai_core.types.CrossEncoderModel, input: str, passages: List[str]
 ):
-    client = genai_core.clients.get_sagemaker_client()
-
-    response = client.invoke_endpoint(
-        EndpointName=SAGEMAKER_RAG_MODELS_ENDPOINT,
-        ContentType="application/json",
-        Body=json.dumps(
-            {
-                "type": "cross-encoder",
-                "model": model.name,
-                "input": input,
-                "passages": passages,
-            }
-        ),
+    return genai_core.sagemaker_endpoint.invoke_rag_models_endpoint(
+        {
+            "type": "cross-encoder",
+            "model": model.name,
+            "input": input,
+            "passages": passages,
+        }
     )
-
-    ret_value = json.loads(response["Body"].read().decode())
-
-    return ret_value
@@ -0,0 +1,254 @@
+import os
+import re
+import hashlib
+import itertools
+import threading
+import boto3
+import numpy as np
+from boto3.dynamodb.conditions import Key
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set
+
+CHUNK_SIGNATURES_TABLE_NAME = os.environ.get("CHUNK_SIGNATURES_TABLE_NAME")
+# Chunks whose SimHash differs in at most this many of the 64 bits are
+# near duplicates
+NEAR_DUPLICATE_MAX_DISTANCE = int(os.environ.get("NEAR_DUPLICATE_MAX_DISTANCE", "5"))
+NEAR_DUPLICATE_LOOKUP_WORKERS = 16
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+# The bits are split in max distance + LSH_KEY_BLOCKS blocks. A near duplicate
+# differs in at most max distance blocks, so the blocks of at least one
+# combination of LSH_KEY_BLOCKS blocks are equal. Every combination is a band
+# key of about 18 bits, wide enough that buckets stay small as workspaces grow.
+LSH_KEY_BLOCKS = 2
+LSH_BLOCKS = NEAR_DUPLICATE_MAX_DISTANCE + LSH_KEY_BLOCKS
+LSH_BLOCK_BOUNDS = [
+    (idx * SIMHASH_BITS // LSH_BLOCKS, (idx + 1) * SIMHASH_BITS // LSH_BLOCKS)
+    for idx in range(LSH_BLOCKS)
+]
+LSH_BANDS = list(itertools.combinations(range(LSH_BLOCKS), LSH_KEY_BLOCKS))
+
+WORD_REGEX = re.compile(r"\w+")
+
+dynamodb = boto3.resource("dynamodb")
+
+if CHUNK_SIGNATURES_TABLE_NAME:
+    table = dynamodb.Table(CHUNK_SIGNATURES_TABLE_NAME)
+
+_lock = threading.Lock()
+_stats = {"checked": 0, "suppressed": 0}
+
+
+def is_enabled(workspace: dict) -> bool:
+    return bool(workspace.get("deduplication", False)) and bool(
+        CHUNK_SIGNATURES_TABLE_NAME
+    )
+
+
+def get_simhash(content: str) -> int:
+    """64 bit SimHash of the word shingles of content."""
+    words = WORD_REGEX.findall(content.lower())
+    if len(words) > SHINGLE_SIZE:
+        shingles = [
+            " ".join(words[idx : idx + SHINGLE_SIZE])
+            for idx in range(len(words) - SHINGLE_SIZE + 1)
+        ]
+    else:
+        shingles = [" ".join(words)]
+
+    digests = b"".join(
+        hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest()
+        for shingle in shingles
+    )
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1)
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 > len(shingles)
+
+    return int.from_bytes(np.packbits(votes).tobytes(), "big")
+
+
+def get_distance(simhash_a: int, simhash_b: int) -> int:
+    return bin(simhash_a ^ simhash_b).count("1")
+
+
+def get_band_keys(simhash: int) -> List[str]:
+    ret_value = []
+    for band, blocks in enumerate(LSH_BANDS):
+        value = 0
+        bits = 0
+        for block in blocks:
+            start, end = LSH_BLOCK_BOUNDS[block]
+            value = (value << (end - start)) | (
+                (simhash >> start) & ((1 << (end - start)) - 1)
+            )
+            bits += end - start
+
+        ret_value.append(f"{band}:{value:0{(bits + 3) // 4}x}")
+
+    return ret_value
+
+
+class NearDuplicateFilter(object):
+    """Finds chunks that are near duplicates of chunks already stored in the
+    workspace, or of chunks accepted earlier in the same run. Signatures are
+    stored with one item per LSH band, so a lookup is one query per band.
+    Chunks in ignore_chunk_ids, the previous chunks of the document being
+    re-ingested, never count as a match."""
+
+    def __init__(self, workspace_id: str, ignore_chunk_ids: Iterable[str] = ()):
+        self.workspace_id = workspace_id
+        self.ignore_chunk_ids: Set[str] = set(map(str, ignore_chunk_ids))
+        self.buckets: Dict[str, Dict[str, int]] = {}
+        self.accepted: Dict[str, int] = {}
+        self.checked = 0
+        self.suppressed = 0
+
+    def check(self, chunk_ids: List[str], chunks: List[str]) -> List[Optional[str]]:
+        """Returns, for every chunk, the id of the chunk it duplicates or None.
+        Accepted chunks are remembered for the rest of the run, add stores
+        them once they are in the engine."""
+        simhashes = [get_simhash(chunk) for chunk in chunks]
+        self._load_buckets(
+            set(key for simhash in simhashes for key in get_band_keys(simhash))
+        )
+
+        ret_value = []
+        for chunk_id, simhash in zip(chunk_ids, simhashes):
+            duplicate_of = self._find(simhash)
+            if duplicate_of is None:
+                self.accepted[str(chunk_id)] = simhash
+                for key in get_band_keys(simhash):
+                    self.buckets[key][str(chunk_id)] = simhash
+            else:
+                self.suppressed += 1
+            ret_value.append(duplicate_of)
+
+        self.checked += len(chunks)
+        with _lock:
+            _stats["checked"] += len(chunks)
+            _stats["suppressed"] += sum(value is not None for value in ret_value)
+
+        return ret_value
+
+    def get_simhashes(self, chunk_ids: List[str]) -> Dict[str, int]:
+        return {
+            str(chunk_id): self.accepted[str(chunk_id)]
+            for chunk_id in chunk_ids
+            if str(chunk_id) in self.accepted
+        }
+
+    def add(self, document_id: str, simhashes: Dict[str, int]):
+        with table.batch_writer() as batch:
+            for chunk_id, simhash in simhashes.items():
+                for key in get_band_keys(simhash):
+                    batch.put_item(
+                        Item={
+                            "workspace_id": self.workspace_id,
+                            "signature_key": f"{key}:{chunk_id}",
+                            "chunk_id": str(chunk_id),
+                            "document_id": document_id,
+                            "simhash": f"{simhash:016x}",
+                        }
+                    )
+
+    def _find(self, simhash: int) -> Optional[str]:
+        for key in get_band_keys(simhash):
+            for chunk_id, value in self.buckets[key].items():
+                if chunk_id in self.ignore_chunk_ids:
+                    continue
+
+                if get_distance(simhash, value) <= NEAR_DUPLICATE_MAX_DISTANCE:
+                    return chunk_id
+
+        return None
+
+    def _load_buckets(self, keys: Set[str]):
+        missing = [key for key in keys if key not in self.buckets]
+        if not missing:
+            return
+
+        with ThreadPoolExecutor(max_workers=NEAR_DUPLICATE_LOOKUP_WORKERS) as executor:
+            for key, values in zip(missing, executor.map(self._query_bucket, missing)):
+                self.buckets[key] = values
+
+    def _query_bucket(self, key: str) -> Dict[str, int]:
+        ret_value = {}
+        query_args = {
+            "KeyConditionExpression": Key("workspace_id").eq(self.workspace_id)
+            & Key("signature_key").begins_with(f"{key}:"),
+            "ProjectionExpression": "chunk_id, simhash",
+        }
+
+        while True:
+            response = table.query(**query_args)
+            for item in response["Items"]:
+                ret_value[item["chunk_id"]] = int(item["simhash"], 16)
+
+            last_evaluated_key = response.get("LastEvaluatedKey")
+            if not last_evaluated_key:
+                break
+            query_args["ExclusiveStartKey"] = last_evaluated_key
+
+        return ret_value
+
+
+def remove_signatures(workspace_id: str, simhashes: Dict[str, int]):
+    if not simhashes:
+        return
+
+    with table.batch_writer() as batch:
+        for chunk_id, simhash in simhashes.items():
+            for key in get_band_keys(simhash):
+                batch.delete_item(
+                    Key={
+                        "workspace_id": workspace_id,
+                        "signature_key": f"{key}:{chunk_id}",
+                    }
+                )
+
+
+def delete_workspace_signatures(workspace_id: str):
+    if not CHUNK_SIGNATURES_TABLE_NAME:
+        return
+
+    query_args = {
+        "KeyConditionExpression": Key("workspace_id").eq(workspace_id),
+        "ProjectionExpression": "workspace_id, signature_key",
+    }
+
+    deleted = 0
+    with table.batch_writer() as batch:
+        while True:
+            response = table.query(**query_args)
+            for item in response["Items"]:
+                batch.delete_item(
+                    Key={
+                        "workspace_id": item["workspace_id"],
+                        "signature_key": item["signature_key"],
+                    }
+                )
+            deleted += len(response["Items"])
+
+            last_evaluated_key = response.get("LastEvaluatedKey")
+            if not last_evaluated_key:
+                break
+            query_args["ExclusiveStartKey"] = last_evaluated_key
+
+    print(f"Deleted {deleted} chunk signatures.")
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+
+    stats["suppressed_ratio"] = (
+        stats["suppressed"] / stats["checked"] if stats["checked"] > 0 else 0.0
+    )
+
+    return stats
+
+
+def reset_stats():
+    with _lock:
+        for key in _stats:
+            _stats[key] = 0
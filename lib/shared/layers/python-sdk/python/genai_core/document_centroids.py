@@ -0,0 +1,64 @@
+import os
+import numpy as np
+from typing import List, Optional, Tuple
+from genai_core.types import CommonError, RetrievalMode
+
+# Consecutive chunks of a document averaged into one representative vector,
+# a long document gets one per section instead of a single blurred centroid
+DOCUMENT_CENTROID_CHUNKS = int(os.environ.get("DOCUMENT_CENTROID_CHUNKS", "50"))
+DEFAULT_RETRIEVAL_DOCUMENTS = 20
+MAX_RETRIEVAL_DOCUMENTS = 200
+
+
+def get_document_centroids(embeddings: np.ndarray) -> List[Tuple[np.ndarray, int]]:
+    """Representative vectors of the chunks of one add, the mean of every
+    DOCUMENT_CENTROID_CHUNKS consecutive chunks with the number of chunks.
+    Byte vectors are rounded back to the stored type."""
+    ret_value = []
+    for idx in range(0, len(embeddings), DOCUMENT_CENTROID_CHUNKS):
+        group = np.asarray(embeddings[idx : idx + DOCUMENT_CENTROID_CHUNKS])
+        centroid = group.mean(axis=0, dtype=np.float64)
+        if np.issubdtype(group.dtype, np.integer):
+            centroid = np.rint(centroid)
+
+        ret_value.append((centroid.astype(group.dtype), len(group)))
+
+    return ret_value
+
+
+def validate_retrieval_options(retrieval_mode: str, retrieval_documents: int):
+    if retrieval_mode not in [value.value for value in RetrievalMode]:
+        raise CommonError("Invalid retrieval mode")
+
+    if retrieval_documents < 1 or retrieval_documents > MAX_RETRIEVAL_DOCUMENTS:
+        raise CommonError(
+            f"Retrieval documents must be between 1 and {MAX_RETRIEVAL_DOCUMENTS}"
+        )
+
+
+def get_retrieval_options(
+    workspace: dict,
+    retrieval_mode: Optional[str] = None,
+    retrieval_documents: Optional[int] = None,
+) -> Tuple[RetrievalMode, int]:
+    """The retrieval mode of a search, the arguments override the workspace
+    options. Workspaces without centroids, created before them and not yet
+    backfilled, always search the chunks."""
+    mode = retrieval_mode or workspace.get("retrieval_mode", RetrievalMode.CHUNKS.value)
+    documents = retrieval_documents or int(
+        workspace.get("retrieval_documents", DEFAULT_RETRIEVAL_DOCUMENTS)
+    )
+    validate_retrieval_options(mode, documents)
+
+    if mode == RetrievalMode.DOCUMENTS.value and not workspace.get(
+        "document_centroids"
+    ):
+        print("The workspace has no document centroids, searching the chunks")
+        return RetrievalMode.CHUNKS, documents
+
+    return RetrievalMode(mode), documents
+
+
+def restrict_filters(filters: Optional[dict], document_ids: List[str]) -> dict:
+    """The search filters of the chunk search of the selected documents."""
+    return {**(filters or {}), "document_id": document_ids}
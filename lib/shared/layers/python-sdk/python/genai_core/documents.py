@@ -147,6 +147,35 @@ def set_document_vectors(
     return response
 
 
+def set_document_suppressed_chunks(
+    workspace_id: str, document_id: str, suppressed_chunks: int, replace: bool
+):
+    timestamp = _get_timestamp()
+
+    if replace:
+        response = documents_table.update_item(
+            Key={"workspace_id": workspace_id, "document_id": document_id},
+            UpdateExpression="SET suppressed_chunks=:value, updated_at=:timestampValue",
+            ExpressionAttributeValues={
+                ":value": suppressed_chunks,
+                ":timestampValue": timestamp,
+            },
+        )
+    else:
+        response = documents_table.update_item(
+            Key={"workspace_id": workspace_id, "document_id": document_id},
+            UpdateExpression="ADD suppressed_chunks :value SET updated_at=:timestampValue",
+            ExpressionAttributeValues={
+                ":value": suppressed_chunks,
+                ":timestampValue": timestamp,
+            },
+        )
+
+    print(response)
+
+    return response
+
+
 def set_sub_documents(workspace_id: str, document_id: str, sub_documents: int):
     timestamp = _get_timestamp()
 
@@ -306,6 +335,9 @@ def create_document(
         }
         if document_type in ["rssfeed"] and "crawler_properties" in kwargs:
             document["crawler_properties"] = kwargs["crawler_properties"]
+        # websites crawled from a feed post can be searched by feed
+        if document_type in ["website"] and kwargs.get("rss_feed_id"):
+            document["rss_feed_id"] = kwargs["rss_feed_id"]
 
         response = documents_table.put_item(Item=document)
         print(response)
@@ -712,6 +744,7 @@ def batch_crawl_websites():
                     if "crawler_properties" in post
                     else 250,
                 },
+                rss_feed_id=feed_id,
             )
             set_status(workspace_id, document_id, "processed")
             update_subscription_timestamp(workspace_id, feed_id)
@@ -2,37 +2,182 @@ import os
 import json
 import time
 import random
+import asyncio
+import threading
 import botocore
 import numpy as np
-from genai_core.types import EmbeddingsModel, CommonError, Provider, Task
+from concurrent.futures import ThreadPoolExecutor
+from genai_core.types import (
+    EmbeddingsModel,
+    EmbeddingsOverflow,
+    CommonError,
+    Provider,
+    Task,
+)
 import genai_core.clients
 import genai_core.parameters
-from typing import List, Optional
+import genai_core.embeddings_cache
+import genai_core.embeddings_packer
+import genai_core.onnx_embeddings
+import genai_core.sagemaker_endpoint
+from typing import AsyncIterator, List, Optional, Tuple
 
 SAGEMAKER_RAG_MODELS_ENDPOINT = os.environ.get("SAGEMAKER_RAG_MODELS_ENDPOINT")
+BEDROCK_EMBEDDINGS_MAX_CONCURRENCY = int(
+    os.environ.get("BEDROCK_EMBEDDINGS_MAX_CONCURRENCY", "10")
+)
+BEDROCK_EMBEDDINGS_MAX_RETRIES = 8
+EMBEDDINGS_MAX_IN_FLIGHT = int(os.environ.get("EMBEDDINGS_MAX_IN_FLIGHT", "4"))
 
 
 def generate_embeddings(
-    model: EmbeddingsModel, input: List[str], task: str = "store", batch_size: int = 50
-) -> List[List[float]]:
-    input = list(map(lambda x: x[:10000], input))
-
-    ret_value = []
-    batch_split = [input[i : i + batch_size] for i in range(0, len(input), batch_size)]
-
-    for batch in batch_split:
-        if model.provider == Provider.OPENAI.value:
-            ret_value.extend(_generate_embeddings_openai(model, batch))
-        elif model.provider == Provider.BEDROCK.value:
-            ret_value.extend(_generate_embeddings_bedrock(model, batch, task))
-        elif model.provider == Provider.SAGEMAKER.value:
-            ret_value.extend(_generate_embeddings_sagemaker(model, batch))
-        else:
-            raise CommonError(f"Unknown provider: {model.provider}")
+    model: EmbeddingsModel,
+    input: List[str],
+    task: str = "store",
+    batch_size: Optional[int] = None,
+    overflow: EmbeddingsOverflow = EmbeddingsOverflow.SPLIT,
+) -> np.ndarray:
+    """Returns a contiguous float32 matrix with one row per input."""
+    if len(input) == 0:
+        return np.empty((0, model.dimensions), dtype=np.float32)
+
+    # Only cache misses are sent to the provider, duplicates once
+    cached_values = genai_core.embeddings_cache.get_embeddings(model, task, input)
+    missing_input = list(
+        dict.fromkeys(
+            value for value, cached in zip(input, cached_values) if cached is None
+        )
+    )
+
+    if not missing_input:
+        return np.vstack(cached_values).astype(np.float32, copy=False)
+
+    pieces, owners, _ = genai_core.embeddings_packer.split_inputs(
+        model, missing_input, overflow
+    )
+
+    generated = np.concatenate(
+        [
+            _generate_embeddings_batch(model, batch, task)
+            for batch in genai_core.embeddings_packer.pack_batches(
+                model, pieces, batch_size
+            )
+        ]
+    )
+
+    generated = genai_core.embeddings_packer.merge_pieces(
+        pieces, owners, generated, len(missing_input)
+    )
+    genai_core.embeddings_cache.put_embeddings(model, task, missing_input, generated)
+
+    if len(missing_input) == len(input):
+        return generated
+
+    generated_by_value = dict(zip(missing_input, generated))
+    ret_value = np.vstack(
+        [
+            cached if cached is not None else generated_by_value[value]
+            for value, cached in zip(input, cached_values)
+        ]
+    ).astype(np.float32, copy=False)
 
     return ret_value
 
 
+async def agenerate_embeddings(
+    model: EmbeddingsModel,
+    input: List[str],
+    task: str = "store",
+    batch_size: Optional[int] = None,
+    overflow: EmbeddingsOverflow = EmbeddingsOverflow.SPLIT,
+    max_in_flight: int = EMBEDDINGS_MAX_IN_FLIGHT,
+) -> AsyncIterator[Tuple[int, np.ndarray]]:
+    """Yields (index, vector) pairs as soon as the provider batch holding
+    them completes, with up to max_in_flight batches running at once.
+    Cached inputs are yielded first, results are not in input order."""
+    cached_values = await asyncio.to_thread(
+        genai_core.embeddings_cache.get_embeddings, model, task, input
+    )
+
+    positions = {}
+    for idx, (value, cached) in enumerate(zip(input, cached_values)):
+        if cached is not None:
+            yield idx, cached
+        else:
+            positions.setdefault(value, []).append(idx)
+
+    if not positions:
+        return
+
+    missing_input = list(positions)
+    pieces, owners, _ = genai_core.embeddings_packer.split_inputs(
+        model, missing_input, overflow
+    )
+    weights = np.array([len(piece) for piece in pieces], dtype=np.float32)
+    remaining = np.bincount(owners, minlength=len(missing_input))
+    received = {}
+
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def run_batch(offset: int, batch: List[str]):
+        async with semaphore:
+            embeddings = await asyncio.to_thread(
+                _generate_embeddings_batch, model, batch, task
+            )
+
+        return offset, embeddings
+
+    tasks = []
+    offset = 0
+    for batch in genai_core.embeddings_packer.pack_batches(model, pieces, batch_size):
+        tasks.append(asyncio.ensure_future(run_batch(offset, batch)))
+        offset += len(batch)
+
+    try:
+        for future in asyncio.as_completed(tasks):
+            offset, embeddings = await future
+
+            completed = []
+            for piece_idx in range(offset, offset + len(embeddings)):
+                owner = owners[piece_idx]
+                received.setdefault(owner, {})[piece_idx] = embeddings[
+                    piece_idx - offset
+                ]
+                remaining[owner] -= 1
+                if remaining[owner] == 0:
+                    completed.append(owner)
+
+            if not completed:
+                continue
+
+            vectors = []
+            for owner in completed:
+                owner_pieces = received.pop(owner)
+                piece_idxs = sorted(owner_pieces)
+                vectors.append(
+                    genai_core.embeddings_packer.merge_piece_vectors(
+                        np.vstack([owner_pieces[i] for i in piece_idxs]),
+                        weights[piece_idxs],
+                    )
+                )
+
+            values = [missing_input[owner] for owner in completed]
+            await asyncio.to_thread(
+                genai_core.embeddings_cache.put_embeddings,
+                model,
+                task,
+                values,
+                vectors,
+            )
+
+            for value, vector in zip(values, vectors):
+                for idx in positions[value]:
+                    yield idx, vector
+    finally:
+        for task_future in tasks:
+            task_future.cancel()
+
+
 def get_embeddings_models():
     config = genai_core.parameters.get_config()
     models = config["rag"]["embeddingsModels"]
@@ -40,6 +185,9 @@ def get_embeddings_models():
     if not SAGEMAKER_RAG_MODELS_ENDPOINT:
         models = list(filter(lambda x: x["provider"] != "sagemaker", models))
 
+    if not genai_core.onnx_embeddings.is_available():
+        models = list(filter(lambda x: x["provider"] != "onnx", models))
+
     return models
 
 
@@ -54,6 +202,23 @@ def get_embeddings_model(provider: Provider, name: str) -> Optional[EmbeddingsMo
     return None
 
 
+def _generate_embeddings_batch(
+    model: EmbeddingsModel, input: List[str], task: Task
+) -> np.ndarray:
+    if model.provider == Provider.OPENAI.value:
+        ret_value = _generate_embeddings_openai(model, input)
+    elif model.provider == Provider.BEDROCK.value:
+        ret_value = _generate_embeddings_bedrock(model, input, task)
+    elif model.provider == Provider.SAGEMAKER.value:
+        ret_value = _generate_embeddings_sagemaker(model, input)
+    elif model.provider == Provider.ONNX.value:
+        ret_value = genai_core.onnx_embeddings.generate_embeddings_onnx(model, input)
+    else:
+        raise CommonError(f"Unknown provider: {model.provider}")
+
+    return np.asarray(ret_value, dtype=np.float32)
+
+
 def _generate_embeddings_openai(model: EmbeddingsModel, input: List[str]):
     openai = genai_core.clients.get_openai_client()
 
@@ -81,27 +246,85 @@ def _generate_embeddings_bedrock(model: EmbeddingsModel, input: List[str], task:
         raise CommonError(f'Unknown embeddings provider "{model_provider}"')
 
 
-def _generate_embeddings_amazon(model: EmbeddingsModel, input: List[str], bedrock):
-    ret_value = []
-    for value in input:
+def _generate_embeddings_amazon(
+    model: EmbeddingsModel,
+    input: List[str],
+    bedrock,
+    max_concurrency: int = BEDROCK_EMBEDDINGS_MAX_CONCURRENCY,
+):
+    # Titan only accepts one text per request, fan the batch out over a
+    # bounded pool. map() keeps the output in input order.
+    backoff = _AdaptiveBackoff()
+
+    def invoke(value: str):
         body = json.dumps({"inputText": value})
-        response = bedrock.invoke_model(
-            body=body,
-            modelId=model.name,
-            accept="application/json",
-            contentType="application/json",
-        )
-        response_body = json.loads(response.get("body").read())
-        embedding = response_body.get("embedding")
+        for attempt in range(BEDROCK_EMBEDDINGS_MAX_RETRIES):
+            backoff.wait()
+            try:
+                response = bedrock.invoke_model(
+                    body=body,
+                    modelId=model.name,
+                    accept="application/json",
+                    contentType="application/json",
+                )
+            except botocore.exceptions.ClientError as error:
+                error_code = error.response.get("Error", {}).get("Code")
+                if (
+                    error_code == "ThrottlingException"
+                    and attempt < BEDROCK_EMBEDDINGS_MAX_RETRIES - 1
+                ):
+                    backoff.throttled()
+                    continue
 
-        ret_value.append(embedding)
+                raise error
 
-    ret_value = np.array(ret_value)
+            backoff.succeeded()
+            response_body = json.loads(response.get("body").read())
+
+            return response_body.get("embedding")
+
+    if max_concurrency <= 1 or len(input) <= 1:
+        ret_value = [invoke(value) for value in input]
+    else:
+        with ThreadPoolExecutor(
+            max_workers=min(max_concurrency, len(input))
+        ) as executor:
+            ret_value = list(executor.map(invoke, input))
+
+    ret_value = np.array(ret_value, dtype=np.float32)
     ret_value = ret_value / np.linalg.norm(ret_value, axis=1, keepdims=True)
-    ret_value = ret_value.tolist()
     return ret_value
 
 
+class _AdaptiveBackoff(object):
+    """Shared pause for all workers of a fan-out. The delay doubles on every
+    throttle and halves on every success."""
+
+    def __init__(self, base_delay: float = 0.2, max_delay: float = 10.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.delay = 0.0
+        self.resume_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            pause = self.resume_at - time.monotonic()
+
+        if pause > 0:
+            time.sleep(pause)
+
+    def throttled(self):
+        with self.lock:
+            self.delay = min(self.max_delay, max(self.base_delay, self.delay * 2))
+            resume_at = time.monotonic() + random.uniform(self.delay / 2, self.delay)
+            self.resume_at = max(self.resume_at, resume_at)
+
+    def succeeded(self):
+        with self.lock:
+            self.delay = self.delay / 2 if self.delay > self.base_delay else 0.0
+
+
 def _generate_embeddings_cohere(
     model: EmbeddingsModel, input: List[str], task: Task, bedrock
 ):
@@ -122,32 +345,6 @@ def _generate_embeddings_cohere(
 
 
 def _generate_embeddings_sagemaker(model: EmbeddingsModel, input: List[str]):
-    client = genai_core.clients.get_sagemaker_client()
-
-    max_retries = 5
-    for attempt in range(max_retries):
-        try:
-            response = client.invoke_endpoint(
-                EndpointName=SAGEMAKER_RAG_MODELS_ENDPOINT,
-                ContentType="application/json",
-                Body=json.dumps(
-                    {"type": "embeddings", "model": model.name, "input": input}
-                ),
-            )
-
-            ret_value = json.loads(response["Body"].read().decode())
-
-            return ret_value
-        except botocore.exceptions.ClientError as error:
-            # Check if the error is due to a 500 server error
-            error_code = error.response.get("Error", {}).get("Code")
-            if (
-                error_code == "ServiceUnavailableException"
-                or error_code == "InternalServerError"
-            ):
-                print(f"Attempt {attempt + 1} failed with a 500 error.")
-                time.sleep(random.uniform(0.3, 1.5))
-                continue
-            else:
-                # If the exception was due to another reason, raise it.
-                raise error
+    return genai_core.sagemaker_endpoint.invoke_rag_models_endpoint(
+        {"type": "embeddings", "model": model.name, "input": input}
+    )
@@ -0,0 +1,135 @@
+import os
+import time
+import hashlib
+import threading
+import boto3
+import numpy as np
+from collections import OrderedDict
+from genai_core.types import EmbeddingsModel, Task
+from typing import Dict, List, Optional
+
+EMBEDDINGS_CACHE_TABLE_NAME = os.environ.get("EMBEDDINGS_CACHE_TABLE_NAME")
+EMBEDDINGS_CACHE_MAX_ITEMS = int(os.environ.get("EMBEDDINGS_CACHE_MAX_ITEMS", "10000"))
+EMBEDDINGS_CACHE_TTL_DAYS = int(os.environ.get("EMBEDDINGS_CACHE_TTL_DAYS", "30"))
+
+# DynamoDB BatchGetItem limit
+BATCH_GET_SIZE = 100
+
+dynamodb = boto3.resource("dynamodb")
+
+if EMBEDDINGS_CACHE_TABLE_NAME:
+    table = dynamodb.Table(EMBEDDINGS_CACHE_TABLE_NAME)
+
+_lock = threading.Lock()
+_memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_stats = {"memory_hits": 0, "store_hits": 0, "misses": 0}
+
+
+def get_cache_key(model: EmbeddingsModel, task, text: str) -> str:
+    task_value = task.value if isinstance(task, Task) else str(task)
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    return f"{model.provider}/{model.name}/{task_value}/{text_hash}"
+
+
+def get_embeddings(
+    model: EmbeddingsModel, task, input: List[str]
+) -> List[Optional[np.ndarray]]:
+    keys = [get_cache_key(model, task, value) for value in input]
+    found: Dict[str, np.ndarray] = {}
+
+    with _lock:
+        for key in keys:
+            if key in _memory:
+                _memory.move_to_end(key)
+                found[key] = _memory[key]
+
+    memory_hits = len(found)
+    store_hits = 0
+    missing = list(dict.fromkeys(key for key in keys if key not in found))
+    if missing and EMBEDDINGS_CACHE_TABLE_NAME:
+        stored = _get_stored_embeddings(missing)
+        store_hits = len(stored)
+        found.update(stored)
+        _remember(stored)
+
+    ret_value = [found.get(key) for key in keys]
+
+    with _lock:
+        _stats["memory_hits"] += memory_hits
+        _stats["store_hits"] += store_hits
+        _stats["misses"] += len(missing) - store_hits
+
+    return ret_value
+
+
+def put_embeddings(
+    model: EmbeddingsModel, task, input: List[str], embeddings: np.ndarray
+):
+    # copy the rows so the LRU does not keep the whole batch matrix alive
+    items = {
+        get_cache_key(model, task, value): np.array(embedding, dtype=np.float32)
+        for value, embedding in zip(input, embeddings)
+    }
+
+    _remember(items)
+
+    if EMBEDDINGS_CACHE_TABLE_NAME and items:
+        expires_at = int(time.time()) + EMBEDDINGS_CACHE_TTL_DAYS * 24 * 60 * 60
+        with table.batch_writer(overwrite_by_pkeys=["cache_key"]) as batch:
+            for key, embedding in items.items():
+                batch.put_item(
+                    Item={
+                        "cache_key": key,
+                        "embedding": embedding.astype("<f4").tobytes(),
+                        "expires_at": expires_at,
+                    }
+                )
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+
+    stats["hits"] = stats["memory_hits"] + stats["store_hits"]
+    total = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / total if total > 0 else 0.0
+
+    return stats
+
+
+def reset_stats():
+    with _lock:
+        for key in _stats:
+            _stats[key] = 0
+
+
+def _remember(items: Dict[str, np.ndarray]):
+    with _lock:
+        for key, embedding in items.items():
+            _memory[key] = embedding
+            _memory.move_to_end(key)
+
+        while len(_memory) > EMBEDDINGS_CACHE_MAX_ITEMS:
+            _memory.popitem(last=False)
+
+
+def _get_stored_embeddings(keys: List[str]) -> Dict[str, np.ndarray]:
+    ret_value = {}
+    for i in range(0, len(keys), BATCH_GET_SIZE):
+        request_items = {
+            EMBEDDINGS_CACHE_TABLE_NAME: {
+                "Keys": [{"cache_key": key} for key in keys[i : i + BATCH_GET_SIZE]],
+                "ProjectionExpression": "cache_key, embedding",
+            }
+        }
+
+        while request_items:
+            response = dynamodb.batch_get_item(RequestItems=request_items)
+            for item in response["Responses"].get(EMBEDDINGS_CACHE_TABLE_NAME, []):
+                embedding = np.frombuffer(item["embedding"].value, dtype="<f4")
+                ret_value[item["cache_key"]] = embedding.astype(np.float32)
+
+            request_items = response.get("UnprocessedKeys")
+
+    return ret_value
@@ -0,0 +1,177 @@
+import math
+import numpy as np
+import genai_core.tokenizer
+from genai_core.types import CommonError, EmbeddingsModel, EmbeddingsOverflow
+from typing import List, Optional, Tuple
+
+# Conservative estimate, most tokenizers average closer to 4 characters
+CHARS_PER_TOKEN = 3
+# Room for the special tokens the models add around every input
+RESERVED_TOKENS = 2
+
+# Limits per request. Titan takes one text per InvokeModel call but the
+# batch is fanned out in _generate_embeddings_amazon, so max_items only
+# bounds the fan-out there.
+DEFAULT_LIMITS = {"max_items": 50, "max_item_tokens": 512, "max_batch_tokens": None}
+PROVIDER_LIMITS = {
+    "openai": {"max_items": 2048, "max_item_tokens": 8191, "max_batch_tokens": 300000},
+    "bedrock/amazon.titan-embed-image": {
+        "max_items": 50,
+        "max_item_tokens": 128,
+        "max_batch_tokens": None,
+    },
+    "bedrock/amazon": {
+        "max_items": 50,
+        "max_item_tokens": 8192,
+        "max_batch_tokens": None,
+    },
+    "bedrock/cohere": {
+        "max_items": 96,
+        "max_item_tokens": 512,
+        "max_batch_tokens": None,
+    },
+    "sagemaker": {"max_items": 32, "max_item_tokens": 512, "max_batch_tokens": None},
+    "onnx": {"max_items": 32, "max_item_tokens": 512, "max_batch_tokens": None},
+}
+
+
+def get_limits(model: EmbeddingsModel) -> dict:
+    model_key = f"{model.provider}/{model.name}"
+    matches = [key for key in PROVIDER_LIMITS if model_key.startswith(key)]
+
+    if not matches:
+        return dict(DEFAULT_LIMITS)
+
+    # the most specific entry wins
+    return dict(PROVIDER_LIMITS[max(matches, key=len)])
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+def split_inputs(
+    model: EmbeddingsModel,
+    input: List[str],
+    overflow: EmbeddingsOverflow = EmbeddingsOverflow.SPLIT,
+) -> Tuple[List[str], List[int], dict]:
+    """Returns the pieces to embed, for every piece the index of the input it
+    belongs to, and the number of split and truncated inputs. Inputs over the
+    model token limit, counted with the model tokenizer, are split into
+    several pieces, truncated or rejected depending on overflow."""
+    overflow = EmbeddingsOverflow(overflow)
+    max_tokens = get_limits(model)["max_item_tokens"] - RESERVED_TOKENS
+    tokenizer = genai_core.tokenizer.get_tokenizer(model)
+
+    pieces = []
+    owners = []
+    stats = {"split": 0, "truncated": 0}
+    for idx, value in enumerate(input):
+        # every token is at least one byte, short inputs are not tokenized
+        if (
+            len(value.encode("utf-8")) <= max_tokens
+            or tokenizer.count(value) <= max_tokens
+        ):
+            pieces.append(value)
+            owners.append(idx)
+            continue
+
+        if overflow == EmbeddingsOverflow.ERROR:
+            raise CommonError(
+                f"Input {idx} exceeds the {model.name} limit of {max_tokens} tokens"
+            )
+
+        # pieces end where the token after the limit starts
+        offsets = tokenizer.get_offsets(value)
+        if overflow == EmbeddingsOverflow.SPLIT:
+            stats["split"] += 1
+            start = 0
+            for token in range(max_tokens, len(offsets), max_tokens):
+                end = offsets[token][0]
+                pieces.append(value[start:end])
+                owners.append(idx)
+                start = end
+            pieces.append(value[start:])
+            owners.append(idx)
+        else:
+            stats["truncated"] += 1
+            end = offsets[max_tokens][0] if len(offsets) > max_tokens else len(value)
+            pieces.append(value[:end])
+            owners.append(idx)
+
+    if stats["split"] > 0 or stats["truncated"] > 0:
+        print(
+            f"Split {stats['split']} and truncated {stats['truncated']} input(s) "
+            f"over {max_tokens} tokens for {model.name}"
+        )
+
+    return pieces, owners, stats
+
+
+def pack_batches(
+    model: EmbeddingsModel, input: List[str], max_items: Optional[int] = None
+) -> List[List[str]]:
+    """Greedily packs the inputs, in order, into the fewest batches that fit
+    the provider item and token limits."""
+    limits = get_limits(model)
+    max_items = min(max_items or limits["max_items"], limits["max_items"])
+    max_batch_tokens = limits["max_batch_tokens"]
+
+    batches = []
+    current = []
+    current_tokens = 0
+    for value in input:
+        tokens = estimate_tokens(value)
+        if current and (
+            len(current) >= max_items
+            or (max_batch_tokens and current_tokens + tokens > max_batch_tokens)
+        ):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+
+        current.append(value)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+
+    return batches
+
+
+def merge_pieces(
+    pieces: List[str], owners: List[int], embeddings: np.ndarray, count: int
+) -> np.ndarray:
+    """Combines the embeddings of split inputs into one vector per input.
+    Pieces of an input are contiguous, as produced by split_inputs."""
+    if len(owners) == count:
+        return embeddings
+
+    weights = np.array([len(piece) for piece in pieces], dtype=np.float32)
+    ret_value = np.empty((count, embeddings.shape[1]), dtype=np.float32)
+    start = 0
+    for owner in range(count):
+        end = start
+        while end < len(owners) and owners[end] == owner:
+            end += 1
+
+        ret_value[owner] = merge_piece_vectors(
+            embeddings[start:end], weights[start:end]
+        )
+        start = end
+
+    return ret_value
+
+
+def merge_piece_vectors(vectors: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Length weighted mean of the piece vectors, rescaled to their average
+    norm so inner product and l2 scores stay comparable."""
+    if len(vectors) == 1:
+        return vectors[0]
+
+    merged = np.average(vectors, axis=0, weights=weights)
+    norm = np.linalg.norm(merged)
+    if norm > 0:
+        merged = merged * (np.linalg.norm(vectors, axis=1).mean() / norm)
+
+    return merged.astype(np.float32)
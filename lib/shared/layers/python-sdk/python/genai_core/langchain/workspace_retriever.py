@@ -1,11 +1,13 @@
 import genai_core.semantic_search
-from typing import List
+from typing import List, Optional
 from langchain.callbacks.manager import CallbackManagerForRetrieverRun
 from langchain.schema import BaseRetriever, Document
 
 
 class WorkspaceRetriever(BaseRetriever):
     workspace_id: str
+    # search filter, see genai_core.search_filters
+    filters: Optional[dict] = None
 
     # def get_relevant_documents(
     #     self, query: str) -> List[Document]:
@@ -20,7 +22,11 @@ class WorkspaceRetriever(BaseRetriever):
         self, query: str, *, run_manager: CallbackManagerForRetrieverRun
     ) -> List[Document]:
         result = genai_core.semantic_search.semantic_search(
-            self.workspace_id, query, limit=3, full_response=False
+            self.workspace_id,
+            query,
+            limit=3,
+            full_response=False,
+            filters=self.filters,
         )
 
         return [self._get_document(item) for item in result.get("items", [])]
@@ -0,0 +1,131 @@
+import os
+import threading
+import boto3
+import numpy as np
+from genai_core.types import CommonError, EmbeddingsModel
+from typing import List
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+except ImportError:
+    onnxruntime = None
+    Tokenizer = None
+
+ONNX_MODELS_PATH = os.environ.get("ONNX_MODELS_PATH", "/opt/onnx-models")
+ONNX_MODELS_BUCKET_NAME = os.environ.get("ONNX_MODELS_BUCKET_NAME")
+ONNX_MODELS_PREFIX = "onnx-models"
+ONNX_MAX_SEQUENCE_LENGTH = 512
+ONNX_NUM_THREADS = int(os.environ.get("ONNX_NUM_THREADS", "0"))
+
+MODEL_FILE_NAME = "model.onnx"
+TOKENIZER_FILE_NAME = "tokenizer.json"
+
+_lock = threading.Lock()
+_models = {}
+
+
+def is_available() -> bool:
+    return onnxruntime is not None
+
+
+def generate_embeddings_onnx(model: EmbeddingsModel, input: List[str]) -> np.ndarray:
+    if not is_available():
+        raise CommonError(
+            "ONNX runtime is not available. Please install onnxruntime and tokenizers."
+        )
+
+    session, tokenizer = _load_model(model.name)
+    model_id = model.name.split("/")[-1]
+
+    # Same input handling as the SageMaker RAG models endpoint
+    if model_id == "multilingual-e5-large":
+        input = list(map(lambda val: "query: " + val, input))
+
+    encoded = tokenizer.encode_batch(input)
+    input_ids = np.array([value.ids for value in encoded], dtype=np.int64)
+    attention_mask = np.array(
+        [value.attention_mask for value in encoded], dtype=np.int64
+    )
+
+    feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+    session_inputs = set(value.name for value in session.get_inputs())
+    if "token_type_ids" in session_inputs:
+        feeds["token_type_ids"] = np.array(
+            [value.type_ids for value in encoded], dtype=np.int64
+        )
+
+    token_embeddings = session.run(None, feeds)[0]
+
+    # Mean pooling over the attention mask, then L2 normalization
+    mask = attention_mask[..., np.newaxis].astype(np.float32)
+    summed = np.sum(token_embeddings * mask, axis=1)
+    counts = np.clip(mask.sum(axis=1), 1e-9, None)
+    embeddings = summed / counts
+    norms = np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+
+    return (embeddings / norms).astype(np.float32)
+
+
+def load_tokenizer(model_name: str):
+    if Tokenizer is None:
+        raise CommonError("tokenizers is not installed")
+
+    model_dir = _get_model_dir(model_name.split("/")[-1])
+
+    return Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE_NAME))
+
+
+def _load_model(model_name: str):
+    model_id = model_name.split("/")[-1]
+
+    with _lock:
+        if model_id in _models:
+            return _models[model_id]
+
+        model_dir = _get_model_dir(model_id)
+        options = onnxruntime.SessionOptions()
+        if ONNX_NUM_THREADS > 0:
+            options.intra_op_num_threads = ONNX_NUM_THREADS
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+
+        session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, MODEL_FILE_NAME),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+
+        tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE_NAME))
+        tokenizer.enable_truncation(max_length=ONNX_MAX_SEQUENCE_LENGTH)
+        tokenizer.enable_padding()
+
+        _models[model_id] = (session, tokenizer)
+
+        return _models[model_id]
+
+
+def _get_model_dir(model_id: str) -> str:
+    model_dir = os.path.join(ONNX_MODELS_PATH, model_id)
+    if os.path.exists(os.path.join(model_dir, MODEL_FILE_NAME)):
+        return model_dir
+
+    if not ONNX_MODELS_BUCKET_NAME:
+        raise CommonError(f"ONNX model {model_id} not found in {ONNX_MODELS_PATH}")
+
+    # Lambda only allows writing to /tmp
+    model_dir = os.path.join("/tmp", ONNX_MODELS_PREFIX, model_id)
+    os.makedirs(model_dir, exist_ok=True)
+
+    s3_client = boto3.client("s3")
+    for file_name in [MODEL_FILE_NAME, TOKENIZER_FILE_NAME]:
+        local_path = os.path.join(model_dir, file_name)
+        if not os.path.exists(local_path):
+            s3_client.download_file(
+                ONNX_MODELS_BUCKET_NAME,
+                f"{ONNX_MODELS_PREFIX}/{model_id}/{file_name}",
+                local_path,
+            )
+
+    return model_dir
@@ -1,9 +1,19 @@
+import numpy as np
+from datetime import datetime
 from typing import List, Optional
 from .client import get_open_search_client
+from genai_core.document_centroids import get_document_centroids
+from genai_core.types import VectorStorage
+from genai_core.vector_storage import get_vector_storage
+
+# The date format of the created_at mapping, as the search filters use it
+CREATED_AT_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Chunk ids per search when the stored chunks of a document are read back
+OPEN_SEARCH_READ_BATCH_SIZE = 500
 
 
 def add_chunks_open_search(
-    workspace_id: str,
+    workspace: dict,
     document_id: str,
     document_sub_id: Optional[str],
     document_type: str,
@@ -11,16 +21,19 @@ def add_chunks_open_search(
     path: Optional[str],
     title: Optional[str],
     chunk_ids: List[str],
-    chunk_embeddings: List[int],
+    chunk_embeddings: np.ndarray,
     chunks: List[str],
     chunk_complements: List[str],
     replace: bool,
+    metadata: Optional[dict] = None,
 ):
+    workspace_id = workspace["workspace_id"]
     index_name = workspace_id.replace("-", "")
     complements_len = len(chunk_complements) if chunk_complements else 0
     removed_vectors = 0
 
     client = get_open_search_client()
+    created_at = datetime.utcnow().strftime(CREATED_AT_FORMAT)
 
     if replace:
         removed_vectors = clean_chunks_open_search(workspace_id, document_id)
@@ -41,14 +54,131 @@ def add_chunks_open_search(
             "title": title,
             "content": content,
             "content_complement": content_complement,
-            "content_embeddings": chunk_embeddings[idx],
+            "content_embeddings": chunk_embeddings[idx].tolist(),
+            "metadata": metadata or {},
+            "created_at": created_at,
         }
 
         client.index(index=index_name, body=add_body)
 
+    # indexes created before the centroids have no mapping for them
+    if workspace.get("document_centroids") and len(chunk_ids) > 0:
+        _add_document_centroids(
+            client, workspace, document_id, document_sub_id, chunk_embeddings
+        )
+
     return {"removed_vectors": removed_vectors, "added_vectors": len(chunk_ids)}
 
 
+def rebuild_document_centroids_open_search(
+    workspace: dict,
+    document_id: str,
+    document_sub_id: Optional[str],
+    chunk_ids: List[str],
+    created_before: datetime,
+):
+    """Replaces the centroids of a sub-document stored before created_before,
+    which still include removed chunks, with the centroids of its remaining
+    chunk_ids in document order. The chunks added since have centroids of
+    their own, they may not be searchable yet and are left out of the search."""
+    if not workspace.get("document_centroids"):
+        return 0
+
+    workspace_id = workspace["workspace_id"]
+    index_name = workspace_id.replace("-", "")
+    client = get_open_search_client()
+
+    sub_document = (
+        {"term": {"document_sub_id": document_sub_id}}
+        if document_sub_id
+        else {"bool": {"must_not": {"exists": {"field": "document_sub_id"}}}}
+    )
+    query = {
+        "query": {
+            "bool": {
+                "must": [
+                    {"term": {"workspace_id": workspace_id}},
+                    {"term": {"document_id": document_id}},
+                    {"exists": {"field": "document_embeddings"}},
+                    {
+                        "range": {
+                            "created_at": {
+                                "lt": created_before.strftime(CREATED_AT_FORMAT)
+                            }
+                        }
+                    },
+                    sub_document,
+                ]
+            }
+        },
+        "_source": False,
+    }
+
+    # one centroid per DOCUMENT_CENTROID_CHUNKS chunks of the sub-document
+    response = client.search(
+        index=index_name, body=query, size=OPEN_SEARCH_READ_BATCH_SIZE
+    )
+    for doc in response["hits"]["hits"]:
+        client.delete(index=index_name, id=doc["_id"], ignore=[400, 404])
+
+    embeddings = {}
+    for idx in range(0, len(chunk_ids), OPEN_SEARCH_READ_BATCH_SIZE):
+        batch = [
+            str(value) for value in chunk_ids[idx : idx + OPEN_SEARCH_READ_BATCH_SIZE]
+        ]
+        response = client.search(
+            index=index_name,
+            body={
+                "query": {"terms": {"chunk_id": batch}},
+                "_source": ["chunk_id", "content_embeddings"],
+            },
+            size=len(batch),
+        )
+        for doc in response["hits"]["hits"]:
+            embeddings[doc["_source"]["chunk_id"]] = doc["_source"][
+                "content_embeddings"
+            ]
+
+    # byte vectors are stored as integers, their centroids have to be too
+    dtype = (
+        np.int8 if get_vector_storage(workspace) == VectorStorage.BYTE else np.float32
+    )
+    chunk_embeddings = np.array(
+        [embeddings[str(value)] for value in chunk_ids if str(value) in embeddings],
+        dtype=dtype,
+    )
+    if len(chunk_embeddings) > 0:
+        _add_document_centroids(
+            client, workspace, document_id, document_sub_id, chunk_embeddings
+        )
+
+    return len(chunk_embeddings)
+
+
+def _add_document_centroids(
+    client,
+    workspace: dict,
+    document_id: str,
+    document_sub_id: Optional[str],
+    chunk_embeddings: np.ndarray,
+):
+    workspace_id = workspace["workspace_id"]
+    index_name = workspace_id.replace("-", "")
+    created_at = datetime.utcnow().strftime(CREATED_AT_FORMAT)
+
+    for centroid, centroid_chunks in get_document_centroids(chunk_embeddings):
+        centroid_body = {
+            "workspace_id": workspace_id,
+            "document_id": document_id,
+            "document_sub_id": document_sub_id,
+            "document_embeddings": centroid.tolist(),
+            "document_chunks": centroid_chunks,
+            "created_at": created_at,
+        }
+
+        client.index(index=index_name, body=centroid_body)
+
+
 def clean_chunks_open_search(workspace_id: str, document_id: str):
     index_name = workspace_id.replace("-", "")
     client = get_open_search_client()
@@ -66,9 +196,25 @@ def clean_chunks_open_search(workspace_id: str, document_id: str):
 
     response = client.search(index=index_name, body=query)
     docs = response["hits"]["hits"]
-    removed_vectors = len(docs)
+    # the document centroids are removed with the chunks
+    removed_vectors = len([doc for doc in docs if doc["_source"].get("chunk_id")])
 
     for doc in docs:
         client.delete(index=index_name, id=doc["_id"], ignore=[400, 404])
 
     return removed_vectors
+
+
+def delete_chunks_open_search(workspace_id: str, chunk_ids: List[str]):
+    index_name = workspace_id.replace("-", "")
+    client = get_open_search_client()
+
+    query = {"query": {"terms": {"chunk_id": [str(value) for value in chunk_ids]}}}
+
+    response = client.search(index=index_name, body=query, size=len(chunk_ids))
+    docs = response["hits"]["hits"]
+
+    for doc in docs:
+        client.delete(index=index_name, id=doc["_id"], ignore=[400, 404])
+
+    return len(docs)
@@ -1,45 +1,50 @@
 from .client import get_open_search_client
+from genai_core.types import VectorStorage
+from genai_core.vector_storage import (
+    OPEN_SEARCH_ENGINES,
+    get_vector_dimensions,
+    get_vector_storage,
+)
+
+EF_SEARCH = 512
 
 
 def create_workspace_index(workspace: dict):
     workspace_id = workspace["workspace_id"]
     index_name = workspace_id.replace("-", "")
-    embeddings_model_dimensions = workspace["embeddings_model_dimensions"]
 
     client = get_open_search_client()
 
-    ef_search = 512
     index_body = {
         "settings": {
             "index": {
                 "knn": True,
-                "knn.algo_param.ef_search": ef_search,
+                "knn.algo_param.ef_search": EF_SEARCH,
             }
         },
         "mappings": {
             "properties": {
-                "content_embeddings": {
-                    "type": "knn_vector",
-                    "dimension": int(embeddings_model_dimensions),
-                    "method": {
-                        "name": "hnsw",
-                        "space_type": "l2",
-                        "engine": "nmslib",
-                        "parameters": {"ef_construction": 512, "m": 16},
-                    },
-                },
+                "content_embeddings": get_embeddings_mapping(workspace),
+                # representative vectors of the documents, in documents of
+                # their own without content
+                "document_embeddings": get_embeddings_mapping(workspace),
+                "document_chunks": {"type": "integer"},
                 "chunk_id": {"type": "keyword"},
                 "workspace_id": {"type": "keyword"},
                 "document_id": {"type": "keyword"},
                 "document_sub_id": {"type": "keyword"},
                 "document_type": {"type": "keyword"},
                 "document_sub_type": {"type": "keyword"},
-                "path": {"type": "text"},
+                # the keyword sub field serves path prefix filters
+                "path": {"type": "text", "fields": {"keyword": {"type": "keyword"}}},
                 "language": {"type": "keyword"},
                 "title": {"type": "text"},
                 "content": {"type": "text"},
                 "content_complement": {"type": "text"},
-                "metadata": {"type": "object"},
+                "metadata": {
+                    "type": "object",
+                    "properties": {"rss_feed_id": {"type": "keyword"}},
+                },
                 "created_at": {
                     "type": "date",
                     "format": "yyyy-MM-dd HH:mm:ss||yyyy-MM-dd||epoch_millis",
@@ -52,3 +57,28 @@ def create_workspace_index(workspace: dict):
 
     print("Created workspace index")
     print(response)
+
+
+def get_embeddings_mapping(workspace: dict) -> dict:
+    vector_storage = get_vector_storage(workspace)
+    ret_value = {
+        "type": "knn_vector",
+        "dimension": get_vector_dimensions(workspace),
+        "method": {
+            "name": "hnsw",
+            "space_type": "l2",
+            "engine": OPEN_SEARCH_ENGINES[vector_storage],
+            "parameters": {"ef_construction": 512, "m": 16},
+        },
+    }
+
+    if vector_storage == VectorStorage.HALF:
+        ret_value["method"]["parameters"]["ef_search"] = EF_SEARCH
+        ret_value["method"]["parameters"]["encoder"] = {
+            "name": "sq",
+            "parameters": {"type": "fp16"},
+        }
+    elif vector_storage == VectorStorage.BYTE:
+        ret_value["data_type"] = "byte"
+
+    return ret_value
@@ -1,6 +1,7 @@
 import os
 import boto3
 from .client import get_open_search_client
+import genai_core.deduplication
 import genai_core.utils.delete_files_with_prefix
 
 
@@ -30,6 +31,8 @@ def delete_open_search_workspace(workspace: dict):
         client.indices.delete(index=index_name)
         print(f"Index {index_name} deleted.")
 
+    genai_core.deduplication.delete_workspace_signatures(workspace_id)
+
     workspaces_table = dynamodb.Table(WORKSPACES_TABLE_NAME)
     documents_table = dynamodb.Table(DOCUMENTS_TABLE_NAME)
 
@@ -1,12 +1,25 @@
+import numpy as np
 import genai_core.embeddings
 import genai_core.cross_encoder
-from typing import List
+import genai_core.document_centroids
+from typing import List, Optional
 from .client import get_open_search_client
 from aws_lambda_powertools import Logger
-from genai_core.types import CommonError, Task
+from genai_core.types import CommonError, RetrievalMode, Task
+from genai_core.vector_storage import (
+    OPEN_SEARCH_ENGINES,
+    get_vector_storage,
+    prepare_embeddings,
+)
 
 logger = Logger()
 
+# Engines that apply a filter during the k-NN search instead of after it
+EFFICIENT_FILTER_ENGINES = ["lucene", "faiss"]
+# A document can have several representative vectors, this many times the
+# documents are fetched to find enough distinct ones
+DOCUMENT_SEARCH_FACTOR = 2
+
 
 def query_workspace_open_search(
     workspace_id: str,
@@ -15,7 +28,13 @@ def query_workspace_open_search(
     limit: int,
     full_response: bool,
     threshold: float = 0.0,
+    filters: Optional[dict] = None,
+    retrieval_mode: Optional[str] = None,
+    retrieval_documents: Optional[int] = None,
 ):
+    """In the documents retrieval mode the closest documents are found by
+    their representative vectors first, the vector search then only ranks
+    their chunks. The keyword search always covers the whole workspace."""
     index_name = workspace_id.replace("-", "")
 
     embeddings_model_provider = workspace["embeddings_model_provider"]
@@ -46,20 +65,53 @@ def query_workspace_open_search(
 
     query_embeddings = genai_core.embeddings.generate_embeddings(
         selected_model, [query], Task.RETRIEVE
-    )[0]
+    )
+    query_embeddings = prepare_embeddings(workspace, query_embeddings)[0]
 
     items = []
 
+    filter_clauses = _get_filter_clauses(filters)
+    efficient_filter = (
+        OPEN_SEARCH_ENGINES.get(get_vector_storage(workspace))
+        in EFFICIENT_FILTER_ENGINES
+    )
+
     client = get_open_search_client()
+    mode, documents_limit = genai_core.document_centroids.get_retrieval_options(
+        workspace, retrieval_mode, retrieval_documents
+    )
+    vector_filter_clauses = filter_clauses
+    if mode == RetrievalMode.DOCUMENTS:
+        document_ids = document_query(
+            client, index_name, query_embeddings, documents_limit, filters
+        )
+        if document_ids:
+            vector_filter_clauses = _get_filter_clauses(
+                genai_core.document_centroids.restrict_filters(filters, document_ids)
+            )
+        else:
+            # nothing to select from, the chunks are searched instead
+            mode = RetrievalMode.CHUNKS
+
     vector_search_records = vector_query(
-        client, index_name, query_embeddings, vector_search_limit
+        client,
+        index_name,
+        query_embeddings,
+        vector_search_limit,
+        filter_clauses=vector_filter_clauses,
+        efficient_filter=efficient_filter,
+        exact=mode == RetrievalMode.DOCUMENTS and not efficient_filter,
     )
     vector_search_records = _convert_records("vector_search", vector_search_records)
     items.extend(vector_search_records)
 
     if hybrid_search:
         keyword_search_records = keyword_query(
-            client, index_name, query, keyword_search_limit
+            client,
+            index_name,
+            query,
+            keyword_search_limit,
+            filter_clauses=filter_clauses,
         )
 
         keyword_search_records = _convert_records(
@@ -121,6 +173,7 @@ def query_workspace_open_search(
             "supported_languages": languages,
             "items": unique_items,
             "vector_search_metric": "l2",
+            "retrieval_mode": mode.value,
             "vector_search_items": vector_search_records,
             "keyword_search_items": keyword_search_records,
         }
@@ -152,6 +205,34 @@ def query_workspace_open_search(
     return ret_value
 
 
+def _get_filter_clauses(filters: Optional[dict]) -> List[dict]:
+    if not filters:
+        return []
+
+    ret_value = []
+    for key, field in [
+        ("document_id", "document_id"),
+        ("document_type", "document_type"),
+        ("document_sub_type", "document_sub_type"),
+        ("rss_feed_id", "metadata.rss_feed_id"),
+    ]:
+        if key in filters:
+            ret_value.append({"terms": {field: filters[key]}})
+
+    if "path_prefix" in filters:
+        ret_value.append({"prefix": {"path.keyword": filters["path_prefix"]}})
+
+    date_range = {}
+    if "created_after" in filters:
+        date_range["gte"] = filters["created_after"]
+    if "created_before" in filters:
+        date_range["lte"] = filters["created_before"]
+    if date_range:
+        ret_value.append({"range": {"created_at": date_range}})
+
+    return ret_value
+
+
 def _convert_records(source: str, records: List[dict]):
     converted_records = []
 
@@ -190,8 +271,48 @@ def _convert_records(source: str, records: List[dict]):
     return converted_records
 
 
-def vector_query(client, index_name: str, vector: List[float], size: int = 25):
-    query = {"query": {"knn": {"content_embeddings": {"vector": vector, "k": 5}}}}
+def vector_query(
+    client,
+    index_name: str,
+    vector: np.ndarray,
+    size: int = 25,
+    filter_clauses: Optional[List[dict]] = None,
+    efficient_filter: bool = False,
+    exact: bool = False,
+):
+    """With exact the filtered chunks are scored by a script instead of the
+    graph, for filters too selective to apply after an approximate search."""
+    knn = {"vector": vector.tolist(), "k": 5}
+    query = {"query": {"knn": {"content_embeddings": knn}}}
+
+    if filter_clauses and exact:
+        query = {
+            "query": {
+                "script_score": {
+                    "query": {"bool": {"filter": filter_clauses}},
+                    "script": {
+                        "source": "knn_score",
+                        "lang": "knn",
+                        "params": {
+                            "field": "content_embeddings",
+                            "query_value": vector.tolist(),
+                            "space_type": "l2",
+                        },
+                    },
+                }
+            }
+        }
+    elif filter_clauses:
+        knn["k"] = size
+        if efficient_filter:
+            # filtered while the graph is searched, k matches are returned
+            knn["filter"] = {"bool": {"filter": filter_clauses}}
+        else:
+            query = {
+                "query": {
+                    "bool": {"must": [query["query"]], "filter": filter_clauses}
+                }
+            }
 
     response = client.search(index=index_name, body=query, size=size)
 
@@ -201,9 +322,56 @@ def vector_query(client, index_name: str, vector: List[float], size: int = 25):
     return ret_value
 
 
-def keyword_query(client, index_name: str, text: str, size: int = 25):
+def document_query(
+    client,
+    index_name: str,
+    vector: np.ndarray,
+    size: int,
+    filters: Optional[dict] = None,
+) -> List[str]:
+    """The documents with the closest representative vectors, in order."""
+    knn = {"vector": vector.tolist(), "k": size * DOCUMENT_SEARCH_FACTOR}
+    query = {
+        "query": {"knn": {"document_embeddings": knn}},
+        "_source": ["document_id"],
+    }
+
+    # the other filters are chunk fields, the chunk search applies them
+    if filters and "document_id" in filters:
+        query["query"] = {
+            "bool": {
+                "must": [query["query"]],
+                "filter": [{"terms": {"document_id": filters["document_id"]}}],
+            }
+        }
+
+    response = client.search(
+        index=index_name, body=query, size=size * DOCUMENT_SEARCH_FACTOR
+    )
+
+    ret_value = []
+    for hit in response["hits"]["hits"] or []:
+        document_id = hit["_source"].get("document_id")
+        if document_id and document_id not in ret_value:
+            ret_value.append(document_id)
+
+    return ret_value[:size]
+
+
+def keyword_query(
+    client,
+    index_name: str,
+    text: str,
+    size: int = 25,
+    filter_clauses: Optional[List[dict]] = None,
+):
     query = {"query": {"match": {"content": text}}}
 
+    if filter_clauses:
+        query = {
+            "query": {"bool": {"must": [query["query"]], "filter": filter_clauses}}
+        }
+
     response = client.search(index=index_name, body=query, size=size)
 
     ret_value = response["hits"]["hits"]
@@ -0,0 +1,313 @@
+import os
+import json
+import time
+import random
+import bisect
+import threading
+import botocore
+import genai_core.clients
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from genai_core.types import CommonError
+
+SAGEMAKER_RAG_MODELS_ENDPOINT = os.environ.get("SAGEMAKER_RAG_MODELS_ENDPOINT")
+SAGEMAKER_MAX_ATTEMPTS = int(os.environ.get("SAGEMAKER_MAX_ATTEMPTS", "3"))
+SAGEMAKER_HEDGE_ENABLED = os.environ.get("SAGEMAKER_HEDGE_ENABLED", "true") == "true"
+SAGEMAKER_HEDGE_PERCENTILE = 0.95
+SAGEMAKER_HEDGE_DEFAULT_DELAY = 1.0
+SAGEMAKER_HEDGE_MIN_DELAY = 0.05
+SAGEMAKER_HEDGE_MIN_SAMPLES = 20
+SAGEMAKER_CIRCUIT_FAILURE_THRESHOLD = 5
+SAGEMAKER_CIRCUIT_RESET_TIMEOUT = 30.0
+
+RETRYABLE_ERROR_CODES = [
+    "ServiceUnavailableException",
+    "InternalServerError",
+    "InternalFailure",
+    "ThrottlingException",
+    "ModelNotReadyException",
+]
+
+# Errors of an unhealthy endpoint that are not retried, they open the circuit
+ENDPOINT_ERROR_CODES = [
+    "ModelError",
+    "ServiceUnavailable",
+]
+
+# Upper bounds in milliseconds, the last bucket is unbounded
+LATENCY_BUCKETS = [
+    10,
+    25,
+    50,
+    75,
+    100,
+    150,
+    200,
+    300,
+    500,
+    750,
+    1000,
+    1500,
+    2000,
+    3000,
+    5000,
+    10000,
+    30000,
+]
+
+_executor = ThreadPoolExecutor(max_workers=8)
+_client = None
+_client_lock = threading.Lock()
+
+
+class LatencyHistogram(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def record(self, latency_ms: float):
+        with self.lock:
+            self.counts[bisect.bisect_left(LATENCY_BUCKETS, latency_ms)] += 1
+            self.total += 1
+            self.sum += latency_ms
+
+    def percentile(self, value: float):
+        with self.lock:
+            if self.total == 0:
+                return None
+
+            threshold = value * self.total
+            seen = 0
+            for idx, count in enumerate(self.counts):
+                seen += count
+                if seen >= threshold:
+                    if idx < len(LATENCY_BUCKETS):
+                        return LATENCY_BUCKETS[idx]
+
+                    return LATENCY_BUCKETS[-1]
+
+    def snapshot(self):
+        with self.lock:
+            buckets = {
+                str(bound): count for bound, count in zip(LATENCY_BUCKETS, self.counts)
+            }
+            buckets["inf"] = self.counts[-1]
+            total = self.total
+            mean = self.sum / total if total > 0 else None
+
+        return {
+            "count": total,
+            "mean_ms": mean,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "buckets": buckets,
+        }
+
+
+class CircuitBreaker(object):
+    """Opens after consecutive failures and fails fast until the reset
+    timeout passes, then lets a single trial request through."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+
+            if self.trial_running:
+                return False
+
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.trial_running = True
+                return True
+
+            return False
+
+    def succeeded(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def failed(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    @property
+    def state(self) -> str:
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            if self.trial_running:
+                return "half-open"
+
+            return "open"
+
+
+circuit_breaker = CircuitBreaker(
+    SAGEMAKER_CIRCUIT_FAILURE_THRESHOLD, SAGEMAKER_CIRCUIT_RESET_TIMEOUT
+)
+_histograms = {}
+_histograms_lock = threading.Lock()
+_hedged_requests = {}
+
+
+def invoke_rag_models_endpoint(payload: dict):
+    """Invokes the SageMaker RAG models endpoint. A duplicate request is
+    sent when the first one is slower than the observed p95 latency, and
+    errors are raised instead of being swallowed."""
+    if not SAGEMAKER_RAG_MODELS_ENDPOINT:
+        raise CommonError("SageMaker RAG models endpoint is not configured")
+
+    request_type = payload.get("type", "unknown")
+    body = json.dumps(payload)
+    last_error = None
+
+    for attempt in range(SAGEMAKER_MAX_ATTEMPTS):
+        if not circuit_breaker.allow():
+            raise CommonError(
+                "SageMaker RAG models endpoint is unavailable, circuit breaker is open"
+            )
+
+        try:
+            ret_value = _invoke_hedged(request_type, body)
+            circuit_breaker.succeeded()
+
+            return ret_value
+        except botocore.exceptions.ClientError as error:
+            error_code = error.response.get("Error", {}).get("Code")
+            if error_code not in RETRYABLE_ERROR_CODES:
+                # a rejected request says nothing about the endpoint health
+                if _is_endpoint_error(error):
+                    circuit_breaker.failed()
+                else:
+                    circuit_breaker.succeeded()
+
+                raise CommonError(
+                    f"SageMaker RAG models endpoint error {error_code}: {error}"
+                )
+
+            circuit_breaker.failed()
+            last_error = error
+        except (
+            botocore.exceptions.ConnectionError,
+            botocore.exceptions.ReadTimeoutError,
+        ) as error:
+            circuit_breaker.failed()
+            last_error = error
+        except Exception:
+            # not retried, but a trial request still has to settle the breaker
+            circuit_breaker.failed()
+            raise
+
+        print(f"SageMaker {request_type} attempt {attempt + 1} failed: {last_error}")
+        time.sleep(random.uniform(0.1, 0.3) * (2**attempt))
+
+    raise CommonError(
+        f"SageMaker RAG models endpoint failed after {SAGEMAKER_MAX_ATTEMPTS} attempts: {last_error}"
+    )
+
+
+def get_latency_stats():
+    with _histograms_lock:
+        histograms = dict(_histograms)
+        hedged_requests = dict(_hedged_requests)
+
+    ret_value = {
+        name: {**histogram.snapshot(), "hedged": hedged_requests.get(name, 0)}
+        for name, histogram in histograms.items()
+    }
+    ret_value["circuit_breaker"] = circuit_breaker.state
+
+    return ret_value
+
+
+def _is_endpoint_error(error: botocore.exceptions.ClientError) -> bool:
+    status_code = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    error_code = error.response.get("Error", {}).get("Code")
+
+    return error_code in ENDPOINT_ERROR_CODES or (status_code or 0) >= 500
+
+
+def _invoke_hedged(request_type: str, body: str):
+    histogram = _get_histogram(request_type)
+    primary = _executor.submit(_invoke, histogram, body)
+    if not SAGEMAKER_HEDGE_ENABLED:
+        return primary.result()
+
+    done, _ = wait([primary], timeout=_get_hedge_delay(histogram))
+    if done:
+        return primary.result()
+
+    print(f"SageMaker {request_type} request is slow, sending a hedged request")
+    with _histograms_lock:
+        _hedged_requests[request_type] = _hedged_requests.get(request_type, 0) + 1
+
+    pending = {primary, _executor.submit(_invoke, histogram, body)}
+
+    # first successful response wins, the error is only raised if both fail
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+
+            error = future.exception()
+
+    raise error
+
+
+def _invoke(histogram: LatencyHistogram, body: str):
+    client = _get_client()
+
+    start = time.monotonic()
+    response = client.invoke_endpoint(
+        EndpointName=SAGEMAKER_RAG_MODELS_ENDPOINT,
+        ContentType="application/json",
+        Body=body,
+    )
+    ret_value = json.loads(response["Body"].read().decode())
+    histogram.record((time.monotonic() - start) * 1000)
+
+    return ret_value
+
+
+def _get_hedge_delay(histogram: LatencyHistogram) -> float:
+    if histogram.total < SAGEMAKER_HEDGE_MIN_SAMPLES:
+        return SAGEMAKER_HEDGE_DEFAULT_DELAY
+
+    p95 = histogram.percentile(SAGEMAKER_HEDGE_PERCENTILE)
+
+    return max(SAGEMAKER_HEDGE_MIN_DELAY, p95 / 1000)
+
+
+def _get_histogram(name: str) -> LatencyHistogram:
+    with _histograms_lock:
+        if name not in _histograms:
+            _histograms[name] = LatencyHistogram()
+
+        return _histograms[name]
+
+
+def _get_client():
+    global _client
+
+    # Retries are handled here, botocore retries would hide slow attempts
+    with _client_lock:
+        if _client is None:
+            _client = genai_core.clients.get_sagemaker_client(max_attempts=1)
+
+        return _client
@@ -0,0 +1,78 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+from genai_core.types import CommonError
+
+# Filters that match any of a list of values
+LIST_FILTERS = ["document_id", "document_type", "document_sub_type", "rss_feed_id"]
+DATE_FILTERS = ["created_after", "created_before"]
+FILTERS = LIST_FILTERS + ["path_prefix"] + DATE_FILTERS
+
+# Chunk created_at, as stored by Aurora and mapped by OpenSearch
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def validate_filters(filters: Optional[dict]) -> Optional[dict]:
+    """Normalized copy of a search filter, None when nothing is filtered.
+    All keys must match, list values match any of their values."""
+    if not filters:
+        return None
+
+    unknown = [key for key in filters if key not in FILTERS]
+    if unknown:
+        raise CommonError(f"Unknown filters: {', '.join(sorted(unknown))}")
+
+    ret_value = {}
+    for key in LIST_FILTERS:
+        value = filters.get(key)
+        if value is None:
+            continue
+
+        values = [value] if isinstance(value, str) else list(value)
+        if not values or not all(isinstance(item, str) and item for item in values):
+            raise CommonError(f"Invalid {key} filter")
+        if key == "document_id":
+            values = [_parse_uuid(key, item) for item in values]
+        ret_value[key] = values
+
+    path_prefix = filters.get("path_prefix")
+    if path_prefix:
+        ret_value["path_prefix"] = str(path_prefix)
+
+    for key in DATE_FILTERS:
+        value = filters.get(key)
+        if value:
+            ret_value[key] = _parse_date(key, value)
+
+    return ret_value if ret_value else None
+
+
+def get_chunk_metadata(document: dict) -> dict:
+    """Structured metadata stored with every chunk of the document, for the
+    filters that are not chunk columns."""
+    ret_value = {}
+    if document.get("rss_feed_id"):
+        ret_value["rss_feed_id"] = document["rss_feed_id"]
+
+    return ret_value
+
+
+def _parse_uuid(key: str, value: str) -> str:
+    # Aurora casts the values to uuid, a bad one would fail the whole query
+    try:
+        return str(uuid.UUID(value))
+    except ValueError:
+        raise CommonError(f"Invalid {key} filter")
+
+
+def _parse_date(key: str, value: str) -> str:
+    try:
+        # chunk timestamps are UTC without an offset
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        raise CommonError(f"Invalid {key} filter")
+
+    if parsed.utcoffset() is not None:
+        parsed = parsed.replace(tzinfo=None) - parsed.utcoffset()
+
+    return parsed.strftime(DATE_FORMAT)
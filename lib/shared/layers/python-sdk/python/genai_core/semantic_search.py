@@ -1,14 +1,29 @@
 import genai_core.types
 import genai_core.workspaces
 import genai_core.embeddings
+import genai_core.search_filters
 from genai_core.aurora import query_workspace_aurora
 from genai_core.opensearch import query_workspace_open_search
 from genai_core.kendra import query_workspace_kendra
+from typing import Optional
 
 
 def semantic_search(
-    workspace_id: str, query: str, limit: int = 5, full_response: bool = False
+    workspace_id: str,
+    query: str,
+    limit: int = 5,
+    full_response: bool = False,
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+    filters: Optional[dict] = None,
+    retrieval_mode: Optional[str] = None,
+    retrieval_documents: Optional[int] = None,
 ):
+    """ef_search and probes override the recall settings of an Aurora
+    workspace index for this search. filters restricts the search to
+    matching chunks inside the engine, see genai_core.search_filters.
+    retrieval_mode and retrieval_documents override the workspace
+    options, see genai_core.document_centroids."""
     workspace = genai_core.workspaces.get_workspace(workspace_id)
 
     if not workspace:
@@ -17,15 +32,43 @@ def semantic_search(
     if workspace["status"] != "ready":
         raise genai_core.types.CommonError("Workspace is not ready")
 
+    filters = genai_core.search_filters.validate_filters(filters)
+
     if workspace["engine"] == "aurora":
         return query_workspace_aurora(
-            workspace_id, workspace, query, limit, full_response
+            workspace_id,
+            workspace,
+            query,
+            limit,
+            full_response,
+            ef_search=ef_search,
+            probes=probes,
+            filters=filters,
+            retrieval_mode=retrieval_mode,
+            retrieval_documents=retrieval_documents,
         )
     elif workspace["engine"] == "opensearch":
         return query_workspace_open_search(
-            workspace_id, workspace, query, limit, full_response
+            workspace_id,
+            workspace,
+            query,
+            limit,
+            full_response,
+            filters=filters,
+            retrieval_mode=retrieval_mode,
+            retrieval_documents=retrieval_documents,
         )
     elif workspace["engine"] == "kendra":
+        if filters:
+            raise genai_core.types.CommonError(
+                "Search filters are not supported by Kendra workspaces"
+            )
+
+        if retrieval_mode == genai_core.types.RetrievalMode.DOCUMENTS.value:
+            raise genai_core.types.CommonError(
+                "The documents retrieval mode is not supported by Kendra workspaces"
+            )
+
         return query_workspace_kendra(
             workspace_id, workspace, query, limit, full_response
         )
@@ -0,0 +1,121 @@
+import re
+import threading
+import genai_core.onnx_embeddings
+from genai_core.types import EmbeddingsModel, Provider
+from typing import List, Tuple
+
+try:
+    from tokenizers import Tokenizer
+except ImportError:
+    Tokenizer = None
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Hugging Face tokenizers of models that are not served from the hub name
+HF_TOKENIZERS = {
+    "cohere.embed-english-v3": "Cohere/Cohere-embed-english-v3.0",
+    "cohere.embed-multilingual-v3": "Cohere/Cohere-embed-multilingual-v3.0",
+}
+
+# Roughly three characters per token, as in embeddings_packer
+APPROXIMATE_TOKEN_REGEX = re.compile(r"\w{1,3}|[^\w\s]")
+
+_lock = threading.Lock()
+_tokenizers = {}
+
+
+class ModelTokenizer(object):
+    """Token offsets of a text for the embeddings model of a workspace."""
+
+    def __init__(self, name: str, encoding=None, hf_tokenizer=None):
+        self.name = name
+        self.encoding = encoding
+        self.hf_tokenizer = hf_tokenizer
+
+    def get_offsets(self, text: str) -> List[Tuple[int, int]]:
+        if self.hf_tokenizer is not None:
+            encoded = self.hf_tokenizer.encode(text, add_special_tokens=False)
+
+            return [offset for offset in encoded.offsets if offset[1] > offset[0]]
+
+        if self.encoding is not None:
+            return _get_tiktoken_offsets(self.encoding, text)
+
+        return [match.span() for match in APPROXIMATE_TOKEN_REGEX.finditer(text)]
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+
+        return len(self.get_offsets(text))
+
+
+def get_tokenizer(model: EmbeddingsModel) -> ModelTokenizer:
+    """Loads the tokenizer once per process. Models without a public
+    tokenizer, like Titan, fall back to an approximate one."""
+    key = f"{model.provider}/{model.name}"
+
+    with _lock:
+        if key not in _tokenizers:
+            _tokenizers[key] = _load_tokenizer(model)
+
+        return _tokenizers[key]
+
+
+def _load_tokenizer(model: EmbeddingsModel) -> ModelTokenizer:
+    try:
+        if model.provider == Provider.OPENAI.value and tiktoken is not None:
+            encoding = tiktoken.encoding_for_model(model.name)
+
+            return ModelTokenizer(model.name, encoding=encoding)
+
+        if Tokenizer is None:
+            raise ImportError("tokenizers is not installed")
+
+        if model.provider == Provider.ONNX.value:
+            hf_tokenizer = genai_core.onnx_embeddings.load_tokenizer(model.name)
+
+            return ModelTokenizer(model.name, hf_tokenizer=hf_tokenizer)
+
+        if model.provider == Provider.SAGEMAKER.value or model.name in HF_TOKENIZERS:
+            hf_tokenizer = Tokenizer.from_pretrained(
+                HF_TOKENIZERS.get(model.name, model.name)
+            )
+            hf_tokenizer.no_truncation()
+            hf_tokenizer.no_padding()
+
+            return ModelTokenizer(model.name, hf_tokenizer=hf_tokenizer)
+    except Exception as error:
+        print(f"Failed to load the {model.name} tokenizer: {error}")
+
+    print(f"Using an approximate tokenizer for {model.name}")
+
+    return ModelTokenizer(model.name)
+
+
+def _get_tiktoken_offsets(encoding, text: str) -> List[Tuple[int, int]]:
+    # tiktoken tokens are bytes, map their boundaries back to characters
+    tokens = encoding.encode(text, disallowed_special=())
+    data = text.encode("utf-8")
+    char_offsets = [0] * (len(data) + 1)
+    position = 0
+    for idx, char in enumerate(text):
+        for _ in range(len(char.encode("utf-8"))):
+            char_offsets[position] = idx
+            position += 1
+    char_offsets[position] = len(text)
+
+    ret_value = []
+    start = 0
+    for token in tokens:
+        end = start + len(encoding.decode_single_token_bytes(token))
+        char_start = char_offsets[start]
+        char_end = char_offsets[end]
+        if char_end > char_start:
+            ret_value.append((char_start, char_end))
+        start = end
+
+    return ret_value
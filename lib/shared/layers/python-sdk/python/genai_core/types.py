@@ -32,6 +32,7 @@ class Provider(Enum):
     OPENAI = "openai"
     AZURE_OPENAI = "azure.openai"
     SAGEMAKER = "sagemaker"
+    ONNX = "onnx"
     AMAZON = "amazon"
     COHERE = "cohere"
 
@@ -77,8 +78,48 @@ class ChatbotMessageType(Enum):
     Human = "human"
     AI = "ai"
 
+
 class Task(Enum):
     STORE = "store"
     RETRIEVE = "retrieve"
     SEARCH_QUERY = "search_query"
-    SEARCH_DOCUMENT = "search_document"
\ No newline at end of file
+    SEARCH_DOCUMENT = "search_document"
+
+
+class EmbeddingsOverflow(Enum):
+    TRUNCATE = "truncate"
+    SPLIT = "split"
+    ERROR = "error"
+
+
+class ChunkingStrategy(Enum):
+    RECURSIVE = "recursive"
+    TOKEN = "token"
+    SENTENCE = "sentence"
+
+
+class VectorStorage(Enum):
+    FULL = "full"
+    HALF = "half"
+    BINARY = "binary"
+    BYTE = "byte"
+
+
+class AuroraIndexType(Enum):
+    IVFFLAT = "ivfflat"
+    HNSW = "hnsw"
+
+
+class HybridFusion(Enum):
+    RRF = "rrf"
+    WEIGHTED = "weighted"
+
+
+class AuroraTableLayout(Enum):
+    TABLE = "table"
+    PARTITIONED = "partitioned"
+
+
+class RetrievalMode(Enum):
+    CHUNKS = "chunks"
+    DOCUMENTS = "documents"
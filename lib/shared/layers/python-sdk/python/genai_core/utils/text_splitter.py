@@ -0,0 +1,217 @@
+import re
+import bisect
+from typing import Iterator, List, Optional, Tuple
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", " ", ""]
+
+# Whitespace after sentence punctuation, or a blank line
+SENTENCE_BOUNDARY_REGEX = re.compile(r"(?<=[.!?\u3002\uff01\uff1f])\s+|\n\s*\n")
+
+
+def split_text(
+    text: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    separators: Optional[List[str]] = None,
+) -> List[str]:
+    return list(iter_split_text(text, chunk_size, chunk_overlap, separators))
+
+
+def iter_split_text(
+    text: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    separators: Optional[List[str]] = None,
+) -> Iterator[str]:
+    """Same output as LangChain's RecursiveCharacterTextSplitter with
+    length_function=len and the separators kept. Splits are (start, end)
+    offsets into text, consecutive splits are adjacent so a merged chunk is
+    a single slice, and every level of recursion only scans its own span."""
+    separators = separators or DEFAULT_SEPARATORS
+
+    yield from _split(text, 0, len(text), separators, chunk_size, chunk_overlap)
+
+
+def _split(
+    text: str,
+    start: int,
+    end: int,
+    separators: List[str],
+    chunk_size: int,
+    chunk_overlap: int,
+) -> Iterator[str]:
+    separator = separators[-1]
+    new_separators = []
+    for idx, value in enumerate(separators):
+        if value == "":
+            separator = value
+            break
+
+        if text.find(value, start, end) != -1:
+            separator = value
+            new_separators = separators[idx + 1 :]
+            break
+
+    good_splits = []
+    for split_start, split_end in _get_splits(text, start, end, separator):
+        if split_end - split_start < chunk_size:
+            good_splits.append((split_start, split_end))
+            continue
+
+        if good_splits:
+            yield from _merge(text, good_splits, chunk_size, chunk_overlap)
+            good_splits = []
+
+        if not new_separators:
+            yield text[split_start:split_end]
+        else:
+            yield from _split(
+                text, split_start, split_end, new_separators, chunk_size, chunk_overlap
+            )
+
+    if good_splits:
+        yield from _merge(text, good_splits, chunk_size, chunk_overlap)
+
+
+def _get_splits(
+    text: str, start: int, end: int, separator: str
+) -> Iterator[Tuple[int, int]]:
+    if separator == "":
+        for idx in range(start, end):
+            yield idx, idx + 1
+        return
+
+    # every split after the first one starts with the separator
+    split_start = start
+    position = text.find(separator, start, end)
+    while position != -1:
+        if position > split_start:
+            yield split_start, position
+        split_start = position
+        position = text.find(separator, position + len(separator), end)
+
+    if end > split_start:
+        yield split_start, end
+
+
+def _merge(
+    text: str,
+    splits: List[Tuple[int, int]],
+    chunk_size: int,
+    chunk_overlap: int,
+) -> Iterator[str]:
+    # the window of splits is splits[head:idx], they are adjacent in text
+    head = 0
+    total = 0
+    for idx, (split_start, split_end) in enumerate(splits):
+        length = split_end - split_start
+        if total + length > chunk_size and idx > head:
+            chunk = _get_chunk(text, splits[head][0], splits[idx - 1][1])
+            if chunk is not None:
+                yield chunk
+
+            while total > chunk_overlap or (total + length > chunk_size and total > 0):
+                total -= splits[head][1] - splits[head][0]
+                head += 1
+
+        total += length
+
+    if head < len(splits):
+        chunk = _get_chunk(text, splits[head][0], splits[-1][1])
+        if chunk is not None:
+            yield chunk
+
+
+def _get_chunk(text: str, start: int, end: int) -> Optional[str]:
+    chunk = text[start:end].strip()
+
+    return chunk if chunk else None
+
+
+def split_text_by_tokens(
+    text: str,
+    offsets: List[Tuple[int, int]],
+    chunk_size: int,
+    chunk_overlap: int,
+) -> List[str]:
+    """Windows of chunk_size tokens, consecutive windows share chunk_overlap
+    tokens. offsets are the (start, end) characters of every token."""
+    ret_value = []
+    step = max(1, chunk_size - chunk_overlap)
+    for start in range(0, len(offsets), step):
+        end = min(start + chunk_size, len(offsets))
+        chunk = _get_chunk(text, offsets[start][0], offsets[end - 1][1])
+        if chunk is not None:
+            ret_value.append(chunk)
+
+        if end == len(offsets):
+            break
+
+    return ret_value
+
+
+def split_text_by_sentences(
+    text: str,
+    offsets: List[Tuple[int, int]],
+    chunk_size: int,
+    chunk_overlap: int,
+) -> List[str]:
+    """Packs whole sentences into chunks of at most chunk_size tokens, the
+    trailing sentences of a chunk that fit in chunk_overlap tokens start the
+    next one. Sentences longer than a chunk are split by tokens."""
+    token_starts = [start for start, _ in offsets]
+    sentences = []
+    for start, end in _get_sentences(text):
+        tokens = bisect.bisect_left(token_starts, end) - bisect.bisect_left(
+            token_starts, start
+        )
+        sentences.append((start, end, tokens))
+
+    ret_value = []
+    head = 0
+    total = 0
+    for idx, (start, end, tokens) in enumerate(sentences):
+        if tokens > chunk_size:
+            if idx > head:
+                chunk = _get_chunk(text, sentences[head][0], sentences[idx - 1][1])
+                if chunk is not None:
+                    ret_value.append(chunk)
+
+            first = bisect.bisect_left(token_starts, start)
+            ret_value.extend(
+                split_text_by_tokens(
+                    text, offsets[first : first + tokens], chunk_size, chunk_overlap
+                )
+            )
+            head = idx + 1
+            total = 0
+            continue
+
+        if total + tokens > chunk_size and idx > head:
+            chunk = _get_chunk(text, sentences[head][0], sentences[idx - 1][1])
+            if chunk is not None:
+                ret_value.append(chunk)
+
+            while idx > head and (total > chunk_overlap or total + tokens > chunk_size):
+                total -= sentences[head][2]
+                head += 1
+
+        total += tokens
+
+    if head < len(sentences):
+        chunk = _get_chunk(text, sentences[head][0], sentences[-1][1])
+        if chunk is not None:
+            ret_value.append(chunk)
+
+    return ret_value
+
+
+def _get_sentences(text: str) -> Iterator[Tuple[int, int]]:
+    start = 0
+    for match in SENTENCE_BOUNDARY_REGEX.finditer(text):
+        if match.start() > start:
+            yield start, match.start()
+        start = match.end()
+
+    if len(text) > start:
+        yield start, len(text)
@@ -0,0 +1,100 @@
+import numpy as np
+from genai_core.types import CommonError, EmbeddingsModel, VectorStorage
+from typing import Optional
+
+# Models trained so that a prefix of the vector is itself a usable embedding
+MATRYOSHKA_MODELS = [
+    "amazon.titan-embed-text-v2",
+    "text-embedding-3-small",
+    "text-embedding-3-large",
+    "nomic-embed-text",
+]
+
+MIN_VECTOR_DIMENSIONS = 64
+
+ENGINE_VECTOR_STORAGE = {
+    "aurora": [VectorStorage.FULL, VectorStorage.HALF, VectorStorage.BINARY],
+    "opensearch": [VectorStorage.FULL, VectorStorage.HALF, VectorStorage.BYTE],
+}
+
+# nmslib has no compact encodings, fp16 needs faiss and byte vectors lucene
+OPEN_SEARCH_ENGINES = {
+    VectorStorage.FULL: "nmslib",
+    VectorStorage.HALF: "faiss",
+    VectorStorage.BYTE: "lucene",
+}
+
+# Candidates fetched by hamming distance for every result rescored with the
+# full precision vector
+BINARY_RESCORE_FACTOR = 4
+
+BYTE_SCALE = 127
+# Components of a unit vector are roughly N(0, 1/d), values beyond this many
+# standard deviations are clipped
+BYTE_CLIP_SIGMA = 4
+
+
+def supports_truncation(model: EmbeddingsModel) -> bool:
+    return any(model.name.startswith(name) for name in MATRYOSHKA_MODELS)
+
+
+def validate_vector_storage(
+    engine: str,
+    model: EmbeddingsModel,
+    vector_storage: str,
+    vector_dimensions: Optional[int],
+):
+    try:
+        storage = VectorStorage(vector_storage)
+    except ValueError:
+        raise CommonError("Invalid vector storage")
+
+    if storage not in ENGINE_VECTOR_STORAGE.get(engine, []):
+        raise CommonError(f"Vector storage {vector_storage} not supported by {engine}")
+
+    if vector_dimensions is None or vector_dimensions == model.dimensions:
+        return
+
+    if not supports_truncation(model):
+        raise CommonError(f"Model {model.name} does not support truncated dimensions")
+
+    if vector_dimensions < MIN_VECTOR_DIMENSIONS or vector_dimensions > model.dimensions:
+        raise CommonError("Invalid vector dimensions")
+
+
+def get_vector_storage(workspace: dict) -> VectorStorage:
+    return VectorStorage(workspace.get("vector_storage", VectorStorage.FULL.value))
+
+
+def get_vector_dimensions(workspace: dict) -> int:
+    vector_dimensions = workspace.get("vector_dimensions")
+    if vector_dimensions:
+        return int(vector_dimensions)
+
+    return int(workspace["embeddings_model_dimensions"])
+
+
+def prepare_embeddings(workspace: dict, embeddings: np.ndarray) -> np.ndarray:
+    """Converts model output to what the workspace stores, used for both
+    chunks and queries so the two always match."""
+    vector_dimensions = get_vector_dimensions(workspace)
+    storage = get_vector_storage(workspace)
+
+    if embeddings.shape[1] > vector_dimensions:
+        embeddings = _normalize(embeddings[:, :vector_dimensions])
+
+    if storage == VectorStorage.BYTE:
+        # every vector is normalized and scaled by the same factor, l2 ranking
+        # then matches the cosine ranking of the original vectors
+        scale = BYTE_SCALE * np.sqrt(embeddings.shape[1]) / BYTE_CLIP_SIGMA
+        embeddings = np.rint(_normalize(embeddings) * scale)
+
+        return np.clip(embeddings, -BYTE_SCALE - 1, BYTE_SCALE).astype(np.int8)
+
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+    return embeddings / np.clip(norms, 1e-12, None)
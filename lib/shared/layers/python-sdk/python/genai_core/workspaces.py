@@ -4,11 +4,27 @@ import uuid
 import boto3
 from genai_core import kendra
 import genai_core.embeddings
+import genai_core.vector_storage
+import genai_core.embeddings_packer
+import genai_core.document_centroids
+import genai_core.aurora.index
+import genai_core.aurora.extension
 from datetime import datetime
-from genai_core.types import Task
+from decimal import Decimal
+from genai_core.types import (
+    AuroraIndexType,
+    AuroraTableLayout,
+    ChunkingStrategy,
+    HybridFusion,
+    RetrievalMode,
+    Task,
+    VectorStorage,
+)
+from typing import Optional
 
 dynamodb = boto3.resource("dynamodb")
 sfn_client = boto3.client("stepfunctions")
+lambda_client = boto3.client("lambda")
 
 WORKSPACES_TABLE_NAME = os.environ.get("WORKSPACES_TABLE_NAME")
 WORKSPACES_BY_OBJECT_TYPE_INDEX_NAME = os.environ.get(
@@ -23,6 +39,9 @@ CREATE_OPEN_SEARCH_WORKSPACE_WORKFLOW_ARN = os.environ.get(
 CREATE_KENDRA_WORKSPACE_WORKFLOW_ARN = os.environ.get(
     "CREATE_KENDRA_WORKSPACE_WORKFLOW_ARN"
 )
+AURORA_INDEX_MAINTENANCE_FUNCTION = os.environ.get(
+    "AURORA_INDEX_MAINTENANCE_FUNCTION", ""
+)
 DELETE_WORKSPACE_WORKFLOW_ARN = os.environ.get("DELETE_WORKSPACE_WORKFLOW_ARN")
 
 WORKSPACE_OBJECT_TYPE = "workspace"
@@ -69,6 +88,28 @@ def list_workspaces(username: str):
     return all_items
 
 
+def list_engine_workspaces(engine: str):
+    all_items = []
+    query_args = {
+        "IndexName": WORKSPACES_BY_OBJECT_TYPE_INDEX_NAME,
+        "KeyConditionExpression": boto3.dynamodb.conditions.Key("object_type").eq(
+            WORKSPACE_OBJECT_TYPE
+        ),
+        "FilterExpression": boto3.dynamodb.conditions.Attr("engine").eq(engine),
+    }
+
+    while True:
+        response = table.query(**query_args)
+        all_items.extend(response["Items"])
+
+        last_evaluated_key = response.get("LastEvaluatedKey")
+        if not last_evaluated_key:
+            break
+        query_args["ExclusiveStartKey"] = last_evaluated_key
+
+    return all_items
+
+
 def get_workspace(workspace_id: str):
     response = table.get_item(
         Key={"workspace_id": workspace_id, "object_type": WORKSPACE_OBJECT_TYPE}
@@ -111,6 +152,20 @@ def create_workspace_aurora(
     chunk_size: int,
     chunk_overlap: int,
     created_by: str,
+    vector_storage: str = VectorStorage.FULL.value,
+    vector_dimensions: Optional[int] = None,
+    deduplication: bool = False,
+    index_type: str = AuroraIndexType.IVFFLAT.value,
+    index_lists: int = genai_core.aurora.index.DEFAULT_INDEX_LISTS,
+    index_probes: int = genai_core.aurora.index.DEFAULT_INDEX_PROBES,
+    index_m: int = genai_core.aurora.index.DEFAULT_INDEX_M,
+    index_ef_construction: int = genai_core.aurora.index.DEFAULT_INDEX_EF_CONSTRUCTION,
+    index_ef_search: int = genai_core.aurora.index.DEFAULT_INDEX_EF_SEARCH,
+    hybrid_fusion: str = HybridFusion.RRF.value,
+    hybrid_fusion_weight: float = 0.5,
+    table_layout: str = AuroraTableLayout.TABLE.value,
+    retrieval_mode: str = RetrievalMode.CHUNKS.value,
+    retrieval_documents: int = genai_core.document_centroids.DEFAULT_RETRIEVAL_DOCUMENTS,
 ):
     workspace_id = str(uuid.uuid4())
     timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
@@ -120,6 +175,38 @@ def create_workspace_aurora(
     )
     if not embeddings_model:
         raise genai_core.types.CommonError("Invalid embeddings model")
+    genai_core.vector_storage.validate_vector_storage(
+        "aurora", embeddings_model, vector_storage, vector_dimensions
+    )
+    if vector_storage != VectorStorage.FULL.value:
+        genai_core.aurora.extension.validate_vector_version(
+            f"The {vector_storage} vector storage",
+            genai_core.aurora.extension.VECTOR_STORAGE_VERSION,
+        )
+    _validate_chunking_strategy(embeddings_model, chunking_strategy, chunk_size)
+    genai_core.aurora.index.validate_index_options(
+        index_type,
+        index_lists,
+        index_m,
+        index_ef_construction,
+        index_ef_search,
+        index_probes,
+    )
+    if has_index and index_type == AuroraIndexType.HNSW.value:
+        genai_core.aurora.extension.validate_vector_version(
+            "An hnsw index", genai_core.aurora.extension.HNSW_VECTOR_VERSION
+        )
+    if hybrid_fusion not in [value.value for value in HybridFusion]:
+        raise genai_core.types.CommonError("Invalid hybrid fusion")
+    if hybrid_fusion_weight < 0 or hybrid_fusion_weight > 1:
+        raise genai_core.types.CommonError(
+            "Hybrid fusion weight must be between 0 and 1"
+        )
+    if table_layout not in [value.value for value in AuroraTableLayout]:
+        raise genai_core.types.CommonError("Invalid table layout")
+    genai_core.document_centroids.validate_retrieval_options(
+        retrieval_mode, retrieval_documents
+    )
     # Verify that the embeddings model
     genai_core.embeddings.generate_embeddings(embeddings_model, ["test"], Task.STORE)
 
@@ -138,10 +225,28 @@ def create_workspace_aurora(
         "languages": languages,
         "metric": metric,
         "has_index": has_index,
+        "index_type": index_type,
+        "index_lists": index_lists,
+        "index_probes": index_probes,
+        "index_m": index_m,
+        "index_ef_construction": index_ef_construction,
+        "index_ef_search": index_ef_search,
         "hybrid_search": hybrid_search,
+        "hybrid_fusion": hybrid_fusion,
+        "hybrid_fusion_weight": Decimal(str(hybrid_fusion_weight)),
+        "table_layout": table_layout,
+        # the shared tables search through to_tsvector expression indexes
+        "tsvector_columns": table_layout == AuroraTableLayout.TABLE.value,
+        "filter_indexes": True,
+        "retrieval_mode": retrieval_mode,
+        "retrieval_documents": retrieval_documents,
+        "document_centroids": True,
         "chunking_strategy": chunking_strategy,
         "chunk_size": chunk_size,
         "chunk_overlap": chunk_overlap,
+        "vector_storage": vector_storage,
+        "vector_dimensions": vector_dimensions or embeddings_model_dimensions,
+        "deduplication": deduplication,
         "documents": 0,
         "vectors": 0,
         "size_in_bytes": 0,
@@ -180,6 +285,11 @@ def create_workspace_open_search(
     chunk_size: int,
     chunk_overlap: int,
     created_by: str,
+    vector_storage: str = VectorStorage.FULL.value,
+    vector_dimensions: Optional[int] = None,
+    deduplication: bool = False,
+    retrieval_mode: str = RetrievalMode.CHUNKS.value,
+    retrieval_documents: int = genai_core.document_centroids.DEFAULT_RETRIEVAL_DOCUMENTS,
 ):
     workspace_id = str(uuid.uuid4())
     timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
@@ -189,6 +299,13 @@ def create_workspace_open_search(
     )
     if not embeddings_model:
         raise genai_core.types.CommonError("Invalid embeddings model")
+    genai_core.vector_storage.validate_vector_storage(
+        "opensearch", embeddings_model, vector_storage, vector_dimensions
+    )
+    _validate_chunking_strategy(embeddings_model, chunking_strategy, chunk_size)
+    genai_core.document_centroids.validate_retrieval_options(
+        retrieval_mode, retrieval_documents
+    )
     # Verify that the embeddings model
     genai_core.embeddings.generate_embeddings(embeddings_model, ["test"], Task.STORE)
 
@@ -207,11 +324,19 @@ def create_workspace_open_search(
         "cross_encoder_model_name": cross_encoder_model_name,
         "languages": languages,
         "metric": "l2",
-        "aoss_engine": "nmslib",
+        "aoss_engine": genai_core.vector_storage.OPEN_SEARCH_ENGINES[
+            VectorStorage(vector_storage)
+        ],
         "hybrid_search": hybrid_search,
+        "retrieval_mode": retrieval_mode,
+        "retrieval_documents": retrieval_documents,
+        "document_centroids": True,
         "chunking_strategy": chunking_strategy,
         "chunk_size": chunk_size,
         "chunk_overlap": chunk_overlap,
+        "vector_storage": vector_storage,
+        "vector_dimensions": vector_dimensions or embeddings_model_dimensions,
+        "deduplication": deduplication,
         "documents": 0,
         "vectors": 0,
         "size_in_bytes": 0,
@@ -281,6 +406,127 @@ def create_workspace_kendra(
     return item
 
 
+def update_workspace_index(
+    workspace_id: str,
+    index_type: Optional[str] = None,
+    index_lists: Optional[int] = None,
+    index_probes: Optional[int] = None,
+    index_m: Optional[int] = None,
+    index_ef_construction: Optional[int] = None,
+    index_ef_search: Optional[int] = None,
+):
+    """Updates the index options of an Aurora workspace. Search settings
+    apply to the next query. Changed build options rebuild the index in the
+    maintenance function, the workspace keeps its index_status "updating"
+    and its current options until the new index is built."""
+    workspace = get_workspace(workspace_id)
+
+    if not workspace:
+        raise genai_core.types.CommonError("Workspace not found")
+
+    if workspace["engine"] != "aurora":
+        raise genai_core.types.CommonError("Index options are only supported by Aurora")
+
+    if workspace["status"] != "ready":
+        raise genai_core.types.CommonError("Workspace is not ready")
+
+    if workspace.get("index_status") == "updating":
+        raise genai_core.types.CommonError("The index is being rebuilt")
+
+    current = genai_core.aurora.index.get_index_options(workspace)
+    updates = {
+        "index_type": index_type,
+        "index_lists": index_lists,
+        "index_probes": index_probes,
+        "index_m": index_m,
+        "index_ef_construction": index_ef_construction,
+        "index_ef_search": index_ef_search,
+    }
+    options = {
+        key: current[key] if value is None else value for key, value in updates.items()
+    }
+
+    genai_core.aurora.index.validate_index_options(
+        options["index_type"],
+        options["index_lists"],
+        options["index_m"],
+        options["index_ef_construction"],
+        options["index_ef_search"],
+        options["index_probes"],
+    )
+    if (
+        options["index_type"] == AuroraIndexType.HNSW.value
+        and current["index_type"] != AuroraIndexType.HNSW.value
+    ):
+        genai_core.aurora.extension.validate_vector_version(
+            "An hnsw index", genai_core.aurora.extension.HNSW_VECTOR_VERSION
+        )
+
+    # the item only changes once the index matches it
+    rebuild = any(
+        options[key] != current[key] for key in genai_core.aurora.index.BUILD_OPTIONS
+    )
+    if rebuild and workspace.get("has_index"):
+        return _start_index_rebuild(workspace_id, options)
+
+    timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    response = table.update_item(
+        Key={"workspace_id": workspace_id, "object_type": WORKSPACE_OBJECT_TYPE},
+        UpdateExpression="SET "
+        + ", ".join(f"{key}=:{key}" for key in options)
+        + ", updated_at=:timestampValue",
+        ExpressionAttributeValues={
+            **{f":{key}": value for key, value in options.items()},
+            ":timestampValue": timestamp,
+        },
+        ReturnValues="ALL_NEW",
+    )
+    print(response)
+
+    return response["Attributes"]
+
+
+def _start_index_rebuild(workspace_id: str, options: dict):
+    # CREATE INDEX CONCURRENTLY can outlast the API timeout and leave an
+    # INVALID index behind, the current index serves searches meanwhile
+    timestamp = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    response = table.update_item(
+        Key={"workspace_id": workspace_id, "object_type": WORKSPACE_OBJECT_TYPE},
+        UpdateExpression="SET index_status=:status, index_update=:options, "
+        + "updated_at=:timestampValue",
+        ExpressionAttributeValues={
+            ":status": "updating",
+            ":options": options,
+            ":timestampValue": timestamp,
+        },
+        ReturnValues="ALL_NEW",
+    )
+    print(response)
+
+    # the hourly maintenance run picks it up if the invocation is lost
+    if AURORA_INDEX_MAINTENANCE_FUNCTION:
+        print(
+            lambda_client.invoke(
+                FunctionName=AURORA_INDEX_MAINTENANCE_FUNCTION,
+                InvocationType="Event",
+                Payload=json.dumps({"workspace_id": workspace_id}),
+            )
+        )
+
+    return response["Attributes"]
+
+
+def set_maintenance(workspace_id: str, values: dict):
+    """Records the results of a maintenance run on the workspace item."""
+    table.update_item(
+        Key={"workspace_id": workspace_id, "object_type": WORKSPACE_OBJECT_TYPE},
+        UpdateExpression="SET " + ", ".join(f"{key}=:{key}" for key in values),
+        ExpressionAttributeValues={f":{key}": value for key, value in values.items()},
+        # the workspace can be deleted while it is maintained
+        ConditionExpression="attribute_exists(workspace_id)",
+    )
+
+
 def delete_workspace(workspace_id: str):
     response = table.get_item(
         Key={"workspace_id": workspace_id, "object_type": WORKSPACE_OBJECT_TYPE}
@@ -305,3 +551,19 @@ def delete_workspace(workspace_id: str):
 
     print(response)
 
+
+def _validate_chunking_strategy(
+    embeddings_model: genai_core.types.EmbeddingsModel,
+    chunking_strategy: str,
+    chunk_size: int,
+):
+    if chunking_strategy not in [value.value for value in ChunkingStrategy]:
+        raise genai_core.types.CommonError("Invalid chunking strategy")
+
+    # token based chunks are sized to fit the model input
+    if chunking_strategy != ChunkingStrategy.RECURSIVE.value:
+        limits = genai_core.embeddings_packer.get_limits(embeddings_model)
+        if chunk_size > limits["max_item_tokens"]:
+            raise genai_core.types.CommonError(
+                f"Chunk size exceeds the {limits['max_item_tokens']} token limit of {embeddings_model.name}"
+            )
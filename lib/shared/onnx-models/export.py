@@ -0,0 +1,85 @@
+"""
+Exports the SageMaker RAG embeddings models to ONNX with dynamic int8
+quantization for the in-process "onnx" embeddings provider.
+
+python export.py --model sentence-transformers/all-MiniLM-L6-v2 --bucket <processing-bucket>
+
+The model and tokenizer are uploaded to s3://<bucket>/onnx-models/<model_id>/,
+which is where genai_core.onnx_embeddings looks for them when
+ONNX_MODELS_BUCKET_NAME is set.
+"""
+
+import os
+import argparse
+import boto3
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from transformers import AutoModel, AutoTokenizer
+
+ONNX_MODELS_PREFIX = "onnx-models"
+
+
+def export_model(model_name: str, output_dir: str):
+    model_id = model_name.split("/")[-1]
+    model_dir = os.path.join(output_dir, model_id)
+    os.makedirs(model_dir, exist_ok=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+
+    sample = tokenizer(["export"], padding=True, return_tensors="pt")
+    input_names = [
+        name
+        for name in ["input_ids", "attention_mask", "token_type_ids"]
+        if name in sample
+    ]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    fp32_path = os.path.join(model_dir, "model-fp32.onnx")
+    with torch.inference_mode():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+
+    quantize_dynamic(
+        fp32_path,
+        os.path.join(model_dir, "model.onnx"),
+        weight_type=QuantType.QInt8,
+    )
+    os.remove(fp32_path)
+
+    # tokenizer.json is all the runtime needs from the tokenizer
+    tokenizer.backend_tokenizer.save(os.path.join(model_dir, "tokenizer.json"))
+
+    return model_id, model_dir
+
+
+def upload_model(bucket_name: str, model_id: str, model_dir: str):
+    s3_client = boto3.client("s3")
+    for file_name in ["model.onnx", "tokenizer.json"]:
+        key = f"{ONNX_MODELS_PREFIX}/{model_id}/{file_name}"
+        s3_client.upload_file(os.path.join(model_dir, file_name), bucket_name, key)
+        print(f"Uploaded s3://{bucket_name}/{key}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", action="append", required=True)
+    parser.add_argument("--output-dir", default="./onnx-models")
+    parser.add_argument("--bucket")
+    args = parser.parse_args()
+
+    for model_name in args.model:
+        model_id, model_dir = export_model(model_name, args.output_dir)
+        print(f"Exported {model_name} to {model_dir}")
+
+        if args.bucket:
+            upload_model(args.bucket, model_id, model_dir)
@@ -1,6 +1,6 @@
 import * as sagemaker from "aws-cdk-lib/aws-sagemaker";
 
-export type ModelProvider = "sagemaker" | "bedrock" | "openai";
+export type ModelProvider = "sagemaker" | "bedrock" | "openai" | "onnx";
 
 export enum SupportedSageMakerModels {
   FalconLite = "FalconLite [ml.g5.12xlarge]",
@@ -104,6 +104,8 @@ export interface SystemConfig {
     engines: {
       aurora: {
         enabled: boolean;
+        // Serverless v2 readers that take the searches off the writer
+        readers?: number;
       };
       opensearch: {
         enabled: boolean;
@@ -3,6 +3,9 @@ import json
 import boto3
 import genai_core.utils.json
 import genai_core.websites.crawler
+import genai_core.deduplication
+import genai_core.embeddings_cache
+import genai_core.sagemaker_endpoint
 
 PROCESSING_BUCKET_NAME = os.environ["INPUT_BUCKET_NAME"]
 WORKSPACE_ID = os.environ["WORKSPACE_ID"]
@@ -24,7 +27,7 @@ def main():
     follow_links = data["follow_links"]
     limit = data["limit"]
 
-    return genai_core.websites.crawler.crawl_urls(
+    ret_value = genai_core.websites.crawler.crawl_urls(
         workspace=workspace,
         document=document,
         priority_queue=priority_queue,
@@ -32,6 +35,11 @@ def main():
         follow_links=follow_links,
         limit=limit,
     )
+    print(f"Embeddings cache: {genai_core.embeddings_cache.get_stats()}")
+    print(f"Near duplicates: {genai_core.deduplication.get_stats()}")
+    print(f"SageMaker latency: {genai_core.sagemaker_endpoint.get_latency_stats()}")
+
+    return ret_value
 
 if __name__ == "__main__":
     main()
\ No newline at end of file